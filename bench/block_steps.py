@@ -0,0 +1,86 @@
+#### BLOCK_STEPS
+####
+#### Cross-check of the merged kicks of the block time steps
+#### (integrator/block_timesteps.py).  For every --eta a Plummer sphere
+#### of point-particle potentials is run to -t with steps of --dt twice:
+#### with PotentialSystem.evolve_model, whose top-level steps hold back
+#### their closing kick and merge it with the next opening kick
+#### (BlockSteps), and with block_step, which kicks at both ends of
+#### every step.  The positions and velocities have to agree bit for
+#### bit, or the script exits with status 1; the force evaluations of
+#### both show what the merging saves.
+####
+#### run from the top directory:
+####   python -m bench.block_steps -N 100 --eta 0.3 --eta 0.03
+####
+
+import sys
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from integrator.potential_system import PotentialSystem
+from integrator.block_timesteps import block_step
+from potentials.point_particle_potential import PointParticlePotential
+
+def merged(particles, converter, dt, t_end, eta):
+    system = PotentialSystem(converter, PointParticlePotential(), eta=eta)
+    system.add_particles(particles)
+    system.timestep = dt
+    system.evolve_model(t_end)
+    return system
+
+def unmerged(particles, converter, dt, t_end, eta):
+    # the same steps as evolve_model, each one a complete block_step
+    system = PotentialSystem(converter, PointParticlePotential(), eta=eta)
+    system.add_particles(particles)
+    time = 0.
+    tend = converter.to_nbody(t_end).value_in(nbody_system.time)
+    dt = converter.to_nbody(dt).value_in(nbody_system.time)
+    while time < (tend - dt/2.):
+        block_step(system, np.arange(len(system.mass)), dt, eta)
+        time += dt
+    return system
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", type="int",
+                      dest="N",
+                      default = 100,
+                      help="number of stars [%default]")
+    result.add_option("-t", type="float", unit=units.Myr,
+                      dest="t_end",
+                      default = 1|units.Myr,
+                      help="run time [%default]")
+    result.add_option("--dt", type="float", unit=units.Myr,
+                      dest="dt",
+                      default = 0.01|units.Myr,
+                      help="top-level time step [%default]")
+    result.add_option("--eta", action="append", type="float",
+                      dest="eta",
+                      help="block time step parameter (repeatable) [0.3, 0.03]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.eta is None:
+        o.eta = [0.3, 0.03]
+    np.random.seed(1)
+    particles = new_PlummerModel(o.N, 1|units.pc)
+    converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.pc)
+
+    failed = 0
+    print("eta        merged evaluations  unmerged evaluations")
+    for eta in o.eta:
+        a = merged(particles, converter, o.dt, o.t_end, eta)
+        b = unmerged(particles, converter, o.dt, o.t_end, eta)
+        line = f"{eta:<10.4g} {a.force_evaluations:<19d} {b.force_evaluations}"
+        if not (np.array_equal(a.pos, b.pos) and np.array_equal(a.vel, b.vel)):
+            failed += 1
+            line += "  DIFFERENT"
+        print(line)
+        a.stop()
+        b.stop()
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,92 @@
+#### ENCOUNTERS
+####
+#### Cross-check and cost of the encounter detection
+#### (integrator/encounters.py).  For every -N a Plummer cluster of
+#### Salpeter stars, scaled to --Rvir so that a few pairs overlap, with an
+#### SMBH of --smbh_mass at its centre, is checked with the grid and with
+#### the all-pairs scan (up to --max_direct stars); the pairs have to
+#### agree, or the script exits with status 1.  The time of both shows
+#### the O(N) cost of the grid against the O(N^2) of the scan.
+####
+#### run from the top directory:
+####   python -m bench.encounters -N 1000 -N 10000 -N 100000 -N 1000000
+####
+
+import sys
+import time
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from integrator.encounters import EncounterDetector
+
+def all_pairs(detector, pos, mass, radius):
+    N = len(pos)
+    pairs_i, pairs_j = [], []
+    for first in range(0, N, 1024):
+        i, j = np.nonzero(np.triu(np.ones((min(1024, N-first), N),
+                                          dtype=bool), first+1))
+        i += first
+        d2 = ((pos[i] - pos[j])**2).sum(axis=1)
+        close = d2 < detector.interaction_distance(mass, radius, i, j)**2
+        pairs_i.append(i[close])
+        pairs_j.append(j[close])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", action="append", type="int",
+                      dest="N",
+                      help="number of stars (repeatable) [1000, 10000, 100000]")
+    result.add_option("--Rvir", type="float", unit=units.AU,
+                      dest="Rvir",
+                      default = 100|units.AU,
+                      help="virial radius of the cluster [%default]")
+    result.add_option("--smbh_mass", type="float", unit=units.MSun,
+                      dest="smbh_mass",
+                      default = 4.154e+6|units.MSun,
+                      help="mass of the central SMBH [%default]")
+    result.add_option("--max_direct", type="int",
+                      dest="max_direct",
+                      default = 20000,
+                      help="largest N for the all-pairs scan [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.N is None:
+        o.N = [1000, 10000, 100000]
+    np.random.seed(1)
+
+    failed = 0
+    detector = EncounterDetector()
+    print("N          pairs    grid [s]     all pairs [s]")
+    for N in o.N:
+        stars = new_PlummerModel(N, o.Rvir)
+        smbh = Particles(1)
+        smbh.mass = o.smbh_mass
+        smbh.radius = 2*constants.G*o.smbh_mass/constants.c**2
+        smbh.position = (0, 0, 0)|units.AU
+        smbh.velocity = (0, 0, 0)|units.kms
+        stars.add_particles(smbh)
+        pos = stars.position.value_in(units.AU)
+        mass = stars.mass.value_in(units.MSun)
+        radius = stars.radius.value_in(units.AU)
+
+        t0 = time.perf_counter()
+        i, j = detector.detect(pos, mass, radius)
+        t_grid = time.perf_counter()-t0
+        line = f"{N:<10d} {len(i):<8d} {t_grid:<12.4e}"
+        if N <= o.max_direct:
+            t0 = time.perf_counter()
+            i0, j0 = all_pairs(detector, pos, mass, radius)
+            line += f" {time.perf_counter()-t0:.4e}"
+            order = np.lexsort((j0, i0))
+            if not (np.array_equal(i, i0[order])
+                    and np.array_equal(j, j0[order])):
+                failed += 1
+                line += "  DIFFERENT"
+        print(line)
+    if failed:
+        sys.exit(1)
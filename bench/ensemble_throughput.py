@@ -0,0 +1,60 @@
+#### ENSEMBLE_THROUGHPUT
+####
+#### Member steps per second for M realizations of a small Plummer
+#### sphere, advanced as one ensemble (integrator/ensemble_system.py)
+#### and as M separate potential systems, one after the other.
+####
+#### run from the top directory:
+####   python -m bench.ensemble_throughput -N 10 -M 1 -M 10 -M 100 -M 1000
+####
+
+import time
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from integrator.potential_system import PotentialSystem
+from integrator.ensemble_system import EnsembleSystem
+from potentials.plummer_potential import PlummerPotential
+
+def steps_per_second(systems, timestep, n_steps):
+    t0 = time.perf_counter()
+    for i in range(1, n_steps+1):
+        for si in systems:
+            si.evolve_model(i*timestep)
+    return n_steps/(time.perf_counter()-t0)
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", type="int",
+                      dest="N",
+                      default = 10,
+                      help="number of potentials per member [%default]")
+    result.add_option("-M", action="append", type="int",
+                      dest="M",
+                      help="number of members (repeatable) [1, 10, 100, 1000]")
+    result.add_option("-s", type="int",
+                      dest="n_steps",
+                      default = 20,
+                      help="number of timed steps [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.M is None:
+        o.M = [1, 10, 100, 1000]
+
+    converter = nbody_system.nbody_to_si(o.N|units.MSun, 1|units.pc)
+    timestep = converter.to_si(0.01|nbody_system.time)
+    print("M        separate [member steps/s]  ensemble [member steps/s]")
+    for M in o.M:
+        members = [new_PlummerModel(o.N, 1|units.pc) for i in range(M)]
+        separate = []
+        for mi in members:
+            separate.append(PotentialSystem(converter, PlummerPotential()))
+            separate[-1].add_particles(mi)
+        ensemble = EnsembleSystem(converter, PlummerPotential())
+        ensemble.add_members(members)
+        rate_separate = M*steps_per_second(separate, timestep, o.n_steps)
+        rate_ensemble = M*steps_per_second([ensemble], timestep, o.n_steps)
+        print(f"{M:<8d} {rate_separate:<26.4g} {rate_ensemble:.4g}")
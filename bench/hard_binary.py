@@ -0,0 +1,91 @@
+#### HARD_BINARY
+####
+#### Energy error and cost of the potential system with and without
+#### regularization (integrator/regularization.py), for a Plummer sphere
+#### of point-particle potentials in which the first two stars are
+#### replaced by a hard binary.  Without regularization the step has to
+#### resolve the binary; with it the step only has to resolve the
+#### cluster.
+####
+#### run from the top directory:
+####   python -m bench.hard_binary -N 100 -a 200 --dt 10 --dt 100 --dt 1000
+####
+
+import time
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from integrator.potential_system import PotentialSystem
+from potentials.point_particle_potential import PointParticlePotential
+
+def new_cluster_with_binary(N, a, e):
+    # the binary starts at apocentre, with the centre of mass and the
+    # velocity of the first star
+    particles = new_PlummerModel(N, 1|units.pc)
+    primary, secondary = particles[0], particles[1]
+    m = primary.mass + secondary.mass
+    r = a*(1+e)
+    v = (constants.G*m*(1-e)/r).sqrt()
+    com, vcom = primary.position, primary.velocity
+    primary.position = com + [1, 0, 0]*r*secondary.mass/m
+    secondary.position = com - [1, 0, 0]*r*primary.mass/m
+    primary.velocity = vcom + [0, 1, 0]*v*secondary.mass/m
+    secondary.velocity = vcom - [0, 1, 0]*v*primary.mass/m
+    period = 2*np.pi*(a**3/(constants.G*m)).sqrt()
+    return particles, period
+
+def run(particles, converter, dt, t_end, regularize):
+    system = PotentialSystem(converter, PointParticlePotential(),
+                             regularize=regularize)
+    system.add_particles(particles)
+    system.timestep = dt
+    E0 = system.kinetic_energy + system.potential_energy
+    t0 = time.perf_counter()
+    system.evolve_model(t_end)
+    wall = time.perf_counter()-t0
+    E = system.kinetic_energy + system.potential_energy
+    pairs = len(system.regularized_pairs)
+    system.stop()
+    return abs((E-E0)/E0), wall, pairs
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", type="int",
+                      dest="N",
+                      default = 100,
+                      help="number of stars [%default]")
+    result.add_option("-a", type="float", unit=units.AU,
+                      dest="a",
+                      default = 200|units.AU,
+                      help="semi-major axis of the binary [%default]")
+    result.add_option("-e", type="float",
+                      dest="e",
+                      default = 0.5,
+                      help="eccentricity of the binary [%default]")
+    result.add_option("-t", type="float", unit=units.Myr,
+                      dest="t_end",
+                      default = 0.2|units.Myr,
+                      help="run time [%default]")
+    result.add_option("--dt", action="append", type="float",
+                      dest="dt",
+                      help="time step in yr (repeatable) [10, 100, 1000]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.dt is None:
+        o.dt = [10., 100., 1000.]
+    np.random.seed(1)
+    particles, period = new_cluster_with_binary(o.N, o.a, o.e)
+    converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.pc)
+    print(f"binary period {period.value_in(units.yr):.4g} yr")
+
+    print("dt [yr]      regularize  |dE/E|       wall [s]   pairs")
+    for dt in o.dt:
+        for regularize in (False, True):
+            dE, wall, pairs = run(particles, converter, dt|units.yr,
+                                  o.t_end, regularize)
+            print(f"{dt:<12.4g} {regularize!s:<11s} {dE:<12.3e} "
+                  f"{wall:<10.3f} {pairs}")
@@ -0,0 +1,69 @@
+#### INTEGRATOR_ORDER
+####
+#### Energy error against the number of force evaluations for the
+#### compositions of integrator/symplectic.py, for an eccentric binary
+#### of two point-particle potentials integrated over a few orbits.  The
+#### error is the largest one found at ten points per orbit, since the
+#### error of a symplectic integrator nearly vanishes after whole orbits.
+####
+#### run from the top directory:
+####   python -m bench.integrator_order -e 0.9
+####
+
+import numpy as np
+from amuse.lab import *
+
+from integrator.potential_system import PotentialSystem
+from integrator.symplectic import methods
+from potentials.point_particle_potential import PointParticlePotential
+
+def new_eccentric_binary(e, a=1|units.au, mass=1|units.MSun):
+    # both stars at apocentre
+    particles = Particles(2)
+    particles.mass = mass
+    particles.radius = 0|units.RSun
+    v = (constants.G*2*mass*(1-e)/(a*(1+e)))**0.5
+    particles[0].position = [0.5, 0, 0]*a*(1+e)
+    particles[1].position = [-0.5, 0, 0]*a*(1+e)
+    particles[0].velocity = [0, 0.5, 0]*v
+    particles[1].velocity = [0, -0.5, 0]*v
+    period = 2*np.pi*(a**3/(constants.G*2*mass))**0.5
+    return particles, period
+
+def energy_error(particles, period, order, steps_per_orbit, n_orbits):
+    converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.au)
+    system = PotentialSystem(converter, PointParticlePotential(),
+                             timestep=period/steps_per_orbit,
+                             method=methods[order])
+    system.add_particles(particles)
+    E0 = system.kinetic_energy + system.potential_energy
+    dE = 0
+    for i in range(1, 10*n_orbits+1):
+        system.evolve_model(i*period/10.)
+        E = system.kinetic_energy + system.potential_energy
+        dE = max(dE, abs((E-E0)/E0))
+    return dE, system.force_evaluations
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-e", type="float",
+                      dest="e",
+                      default = 0.5,
+                      help="eccentricity of the binary [%default]")
+    result.add_option("-n", type="int",
+                      dest="n_orbits",
+                      default = 4,
+                      help="number of orbits [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+
+    particles, period = new_eccentric_binary(o.e)
+    print("order  steps/orbit  force evaluations  |dE/E|")
+    for order in methods:
+        for steps in (100, 200, 400, 800, 1600):
+            dE, n_force = energy_error(particles, period, order,
+                                       steps, o.n_orbits)
+            print(f"{order:<6s} {steps:<12d} {n_force:<18d} {dE:.3e}")
@@ -0,0 +1,47 @@
+#### KEPLER_POPULATION
+####
+#### Time to put N random Keplerian orbits around the SMBH (thermal
+#### eccentricities, isotropic orientations), and the largest residual
+#### of Kepler's equation of the vectorized solver.
+####
+#### run from the top directory:
+####   python -m bench.kepler_population -N 1000000
+####
+
+import time
+import numpy as np
+from amuse.lab import *
+
+from ic.orbital_elements_to_cartesian import eccentric_anomalies
+from ic.orbital_elements_to_cartesian import orbital_elements_to_cartesian
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", type="int",
+                      dest="N",
+                      default = 1000000,
+                      help="number of orbits [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+
+    rng = np.random.default_rng()
+    Mbh = 4.154e+6 | units.MSun
+    a = 10**rng.uniform(2, 4, o.N) | units.AU
+    ecc = np.sqrt(rng.uniform(0, 1, o.N))
+    inc = np.arccos(rng.uniform(-1, 1, o.N))
+    omra = rng.uniform(0, 2*np.pi, o.N)
+    omega = rng.uniform(0, 2*np.pi, o.N)
+    P = 2*np.pi*(a**3/(constants.G*Mbh)).sqrt()
+    tp = rng.uniform(0, 1, o.N)*P
+
+    t0 = time.perf_counter()
+    r, v = orbital_elements_to_cartesian(0|units.yr, a, ecc, inc, omra, omega,
+                                         tp, P, Mbh, 20|units.MSun)
+    print(f"{o.N} orbits in {time.perf_counter()-t0:.2f} s")
+
+    M = rng.uniform(0, 2*np.pi, o.N)
+    E = eccentric_anomalies(M, ecc)
+    print(f"largest residual |E - e sin E - M|: {np.abs(E-ecc*np.sin(E)-M).max():.2e}")
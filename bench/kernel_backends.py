@@ -0,0 +1,98 @@
+#### KERNEL_BACKENDS
+####
+#### Cross-check of the direct-summation kernels (potentials/kernels.py):
+#### the accelerations and potentials of the compiled one-pass kernel
+#### against those of the numpy kernels, for Plummer and point-particle
+#### potentials, with the time per force evaluation of both.  The
+#### largest difference, relative to the largest value, has to stay
+#### below --tolerance, or the script exits with status 1.  Without
+#### numba the same kernel runs interpreted, which only checks its
+#### arithmetic (keep N small).
+####
+#### run from the top directory:
+####   python -m bench.kernel_backends -N 1000 -N 10000
+####
+
+import sys
+import time
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from potentials import kernels
+from potentials.plummer_potential import PlummerPotential
+from potentials.point_particle_potential import PointParticlePotential
+
+def numpy_fields(potential, pos):
+    acc = np.empty_like(pos)
+    phi = np.empty(len(pos))
+    for first, last in kernels.blocks(len(pos)):
+        acc[first:last] = kernels.accelerations(potential, pos, first, last)
+        phi[first:last] = kernels.potentials(potential, pos, first, last)
+    return acc, phi
+
+def fused_fields(potential, pos):
+    acc = np.empty_like(pos)
+    phi = np.empty(len(pos))
+    for first, last in kernels.blocks(len(pos), fused=True):
+        acc[first:last], phi[first:last] = kernels.fields(potential, pos,
+                                                          first, last)
+    return acc, phi
+
+def timed(fields, potential, pos, repeat):
+    result = fields(potential, pos)
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        fields(potential, pos)
+    return result, (time.perf_counter()-t0)/repeat
+
+def relative_difference(a, b):
+    return abs(a-b).max()/abs(b).max()
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", action="append", type="int",
+                      dest="N",
+                      help="number of potentials (repeatable) [100, 1000, 10000; 100 without numba]")
+    result.add_option("-r", type="int",
+                      dest="repeat",
+                      default = 3,
+                      help="number of timed force evaluations [%default]")
+    result.add_option("--tolerance", type="float",
+                      dest="tolerance",
+                      default = 1.e-12,
+                      help="largest relative difference between the backends [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if kernels.numba is None:
+        print("numba is not installed: the one-pass kernel runs interpreted")
+    if o.N is None:
+        o.N = [100, 1000, 10000] if kernels.numba is not None else [100]
+    kernels.set_backend("numpy")
+
+    failed = 0
+    print("potential                N        numpy [s]    fused [s]    "
+          "speedup  d(acc)       d(phi)")
+    for N in o.N:
+        particles = new_PlummerModel(N, 1|units.pc)
+        converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.pc)
+        pos = converter.to_nbody(particles.position).value_in(nbody_system.length)
+        for potential_type in (PlummerPotential, PointParticlePotential):
+            potential = potential_type()
+            potential.set_parameters(particles.mass, particles.radius,
+                                     (0.01|units.pc)**2)
+            potential = potential.as_nbody(converter)
+            (a0, phi0), t0 = timed(numpy_fields, potential, pos, o.repeat)
+            (a1, phi1), t1 = timed(fused_fields, potential, pos, o.repeat)
+            da = relative_difference(a1, a0)
+            dphi = relative_difference(phi1, phi0)
+            bad = max(da, dphi) > o.tolerance
+            failed += bad
+            print(f"{potential_type.__name__:<24s} {N:<8d} {t0:<12.4e} "
+                  f"{t1:<12.4e} {t0/t1:<8.2f} {da:<12.3e} {dphi:.3e}"
+                  + ("  DIFFERENT" if bad else ""))
+    if failed:
+        sys.exit(1)
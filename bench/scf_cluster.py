@@ -0,0 +1,155 @@
+#### SCF_CLUSTER
+####
+#### Accuracy and cost of the SCF potential (potentials/scf_potential.py)
+#### of a Plummer cluster.  For every --nmax/--lmax the expansion of the
+#### cluster is compared with the smooth Plummer sphere it samples (scale
+#### radius 3 pi/16 of the virial radius) at --points test points between
+#### 0.1 and 10 virial radii (RMS relative error of the potential and of
+#### the gravity, which includes the sampling noise of the coefficients,
+#### of order 1/sqrt(N)); the direct sum over the stars would instead
+#### measure their graininess near the test points.  For every -N the time to
+#### build the expansion and to evaluate it shows the linear cost.  With
+#### --bodies the cluster is bridged with that many point masses of
+#### --body_mass on circular orbits at 2 to 5 virial radii, as
+#### gravity_potential.py --cluster_model scf sets it up (new_scf_system),
+#### and the wall time of one bridge step is printed for every -N.
+####
+#### run from the top directory:
+####   python -m bench.scf_cluster -N 10000 -N 100000 -N 1000000 --nmax 6 --lmax 4 --nmax 10 --lmax 6
+####
+
+import time
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from potentials.scf_potential import SCFPotential
+from gravity_potential import new_scf_system
+
+def new_test_points(n, Rvir):
+    r = Rvir*10**np.random.uniform(-1., 1., n)
+    u = np.random.uniform(-1., 1., n)
+    phi = np.random.uniform(0., 2*np.pi, n)
+    s = np.sqrt(1-u**2)
+    return r*s*np.cos(phi), r*s*np.sin(phi), r*u
+
+def plummer_field(M, Rvir, x, y, z):
+    # potential (G M/r, positive) and gravity of the Plummer sphere, in
+    # pc and Myr
+    pos = np.column_stack([c.value_in(units.pc) for c in (x, y, z)])
+    b = 3*np.pi/16*Rvir.value_in(units.pc)
+    gm = (constants.G*M).value_in(units.pc**3/units.Myr**2)
+    r2 = (pos**2).sum(axis=1) + b**2
+    return gm/np.sqrt(r2), -gm*pos/r2[:,None]**1.5
+
+def accuracy(stars, Rvir, nmax, lmax, points):
+    potential = SCFPotential(nmax, lmax)
+    potential.set_members(stars)
+    x, y, z = points
+    phi, acc = plummer_field(stars.mass.sum(), Rvir, x, y, z)
+    gravity = potential.get_gravity_at_point(0|units.pc**2, x, y, z)
+    scf_phi = potential.get_potential_at_point(0|units.pc**2, x, y, z)
+    scf_phi = scf_phi.value_in(units.pc**2/units.Myr**2)
+    scf_acc = np.column_stack([g.value_in(units.pc/units.Myr**2)
+                               for g in gravity])
+    dphi = np.sqrt((((scf_phi-phi)/phi)**2).mean())
+    dacc = np.sqrt(((((scf_acc-acc)**2).sum(axis=1)
+                     /(acc**2).sum(axis=1))).mean())
+    return dphi, dacc
+
+def cost(stars, nmax, lmax, points):
+    potential = SCFPotential(nmax, lmax)
+    t0 = time.perf_counter()
+    potential.set_members(stars)
+    t_expand = time.perf_counter()-t0
+    t0 = time.perf_counter()
+    potential.field(potential.pos)
+    t_field = time.perf_counter()-t0
+    return t_expand, t_field
+
+def new_bodies(n, mass, Rvir, M):
+    bodies = Particles(n)
+    bodies.mass = mass
+    bodies.radius = 0|units.pc
+    r = Rvir*np.linspace(2., 5., n)
+    phi = np.random.uniform(0., 2*np.pi, n)
+    v = (constants.G*M/r).sqrt()
+    bodies.x, bodies.y, bodies.z = r*np.cos(phi), r*np.sin(phi), 0*r
+    bodies.vx, bodies.vy, bodies.vz = -v*np.sin(phi), v*np.cos(phi), 0*v
+    return bodies
+
+def bridge_step(stars, bodies, converter, nmax, lmax, dt):
+    particles = stars.copy()
+    particles.add_particles(bodies)
+    field = np.arange(len(particles)) >= len(stars)
+    system, gravity, channels = new_scf_system(particles, converter, field,
+                                               nmax, lmax)
+    system.timestep = dt
+    t0 = time.perf_counter()
+    system.evolve_model(dt)
+    return time.perf_counter()-t0
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", action="append", type="int",
+                      dest="N",
+                      help="number of stars (repeatable) [10000, 100000]")
+    result.add_option("--nmax", action="append", type="int",
+                      dest="nmax",
+                      help="radial order (repeatable, with --lmax) [6]")
+    result.add_option("--lmax", action="append", type="int",
+                      dest="lmax",
+                      help="angular order (repeatable, with --nmax) [4]")
+    result.add_option("--points", type="int",
+                      dest="points",
+                      default = 1000,
+                      help="number of test points [%default]")
+    result.add_option("--bodies", type="int",
+                      dest="bodies",
+                      default = 0,
+                      help="number of point masses bridged with the cluster [%default]")
+    result.add_option("--body_mass", type="float", unit=units.MSun,
+                      dest="body_mass",
+                      default = 1000|units.MSun,
+                      help="mass of the point masses [%default]")
+    result.add_option("--dt", type="float", unit=units.Myr,
+                      dest="dt",
+                      default = 0.01|units.Myr,
+                      help="bridge time step [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.N is None:
+        o.N = [10000, 100000]
+    if o.nmax is None:
+        o.nmax = [6]
+    if o.lmax is None:
+        o.lmax = [4]*len(o.nmax)
+    orders = list(zip(o.nmax, o.lmax))
+    np.random.seed(1)
+    Rvir = 1|units.pc
+
+    stars = new_PlummerModel(max(o.N), Rvir)
+    points = new_test_points(o.points, Rvir)
+    print(f"accuracy against the Plummer sphere, N={len(stars)}, "
+          f"{o.points} points at 0.1-10 Rvir")
+    print("nmax  lmax  phi (RMS rel.)  gravity (RMS rel.)")
+    for nmax, lmax in orders:
+        dphi, dacc = accuracy(stars, Rvir, nmax, lmax, points)
+        print(f"{nmax:<5d} {lmax:<5d} {dphi:<15.3e} {dacc:.3e}")
+
+    print("N          nmax  lmax  expand [s]  field [s]  bridge step [s]")
+    for N in o.N:
+        stars = new_PlummerModel(N, Rvir)
+        converter = nbody_system.nbody_to_si(stars.mass.sum(), Rvir)
+        for nmax, lmax in orders:
+            t_expand, t_field = cost(stars, nmax, lmax, points)
+            line = (f"{N:<10d} {nmax:<5d} {lmax:<5d} {t_expand:<11.3f} "
+                    f"{t_field:<10.3f}")
+            if o.bodies:
+                bodies = new_bodies(o.bodies, o.body_mass, Rvir,
+                                    stars.mass.sum())
+                line += f" {bridge_step(stars, bodies, converter, nmax, lmax, o.dt):.3f}"
+            print(line)
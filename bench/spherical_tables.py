@@ -0,0 +1,113 @@
+#### SPHERICAL_TABLES
+####
+#### Accuracy and cost of the tabulated spherical potentials
+#### (potentials/spherical_potential.py).  The tabulated Plummer and
+#### Hernquist profiles are compared with their closed forms,
+#### G M/(r^2 + a^2)^(1/2) and G M/(r + a), at --points distances
+#### between 1e-3 and 1e3 scale lengths (largest relative error of the
+#### potential and of the gravity; the Hernquist profile is cut off at
+#### 1e4 a, which leaves 2e-4 of its mass out).  For every -N the time of
+#### a direct-summation force evaluation of the potential system
+#### (potentials/kernels.py) over N Plummer potentials is printed for
+#### PlummerPotential and for its tabulated counterpart, and the time to
+#### build a table against the time to take it from the cache.
+#### PlummerPotential is 2 G M/(r^2 + a^2)^(1/2), twice the tabulated
+#### profile, so the tabulated potentials get twice the masses, which
+#### gives both the same forces.
+####
+#### run from the top directory:
+####   python -m bench.spherical_tables -N 1000 -N 4000
+####
+
+import time
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from potentials import kernels
+from potentials import spherical_potential
+from potentials.plummer_potential import PlummerPotential
+from potentials.spherical_potential import (TabulatedPlummerPotential,
+                                            HernquistPotential,
+                                            radial_table)
+
+closed_forms = {
+    TabulatedPlummerPotential:
+        (lambda r: 1/(r**2+1)**0.5, lambda r: r/(r**2+1)**1.5),
+    HernquistPotential:
+        (lambda r: 1/(r+1), lambda r: 1/(r+1)**2),
+}
+
+def accuracy(potential_type, r):
+    # in units G = M = a = 1, along a diagonal
+    potential = potential_type()
+    potential.G = 1.0
+    potential.set_parameters(1.0, 1.0, 0.0)
+    x = r/3**0.5
+    phi = potential.get_potential_at_point(0., x, x, x)
+    g = -3**0.5*potential.get_gravity_at_point(0., x, x, x)[0]
+    phi0, g0 = closed_forms[potential_type]
+    return abs(phi/phi0(r)-1).max(), abs(g/g0(r)-1).max()
+
+def force_time(potential, pos, repeat):
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        for first, last in kernels.blocks(len(pos)):
+            kernels.accelerations(potential, pos, first, last)
+    return (time.perf_counter()-t0)/repeat
+
+def table_time():
+    t0 = time.perf_counter()
+    spherical_potential._tables.clear()
+    radial_table(HernquistPotential)
+    t_build = time.perf_counter()-t0
+    t0 = time.perf_counter()
+    radial_table(HernquistPotential)
+    return t_build, time.perf_counter()-t0
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", action="append", type="int",
+                      dest="N",
+                      help="number of potentials (repeatable) [1000]")
+    result.add_option("-r", type="int",
+                      dest="repeat",
+                      default = 3,
+                      help="number of timed force evaluations [%default]")
+    result.add_option("--points", type="int",
+                      dest="points",
+                      default = 10000,
+                      help="number of test distances [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.N is None:
+        o.N = [1000]
+    kernels.set_backend("numpy")
+
+    r = np.logspace(-3., 3., o.points)
+    print("profile                    phi (max rel.)  gravity (max rel.)")
+    for potential_type in closed_forms:
+        dphi, dg = accuracy(potential_type, r)
+        print(f"{potential_type.__name__:<26s} {dphi:<15.3e} {dg:.3e}")
+
+    t_build, t_cached = table_time()
+    print(f"table: built in {t_build:.3e} s, from the cache in {t_cached:.3e} s")
+
+    print("N        closed form [s]  tabulated [s]  ratio")
+    for N in o.N:
+        particles = new_PlummerModel(N, 1|units.pc)
+        converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.pc)
+        pos = converter.to_nbody(particles.position).value_in(nbody_system.length)
+        times = []
+        for potential_type, f in ((PlummerPotential, 1),
+                                  (TabulatedPlummerPotential, 2)):
+            potential = potential_type()
+            potential.set_parameters(f*particles.mass, particles.radius,
+                                     (0.01|units.pc)**2)
+            potential = potential.as_nbody(converter)
+            times.append(force_time(potential, pos, o.repeat))
+        print(f"{N:<8d} {times[0]:<16.4e} {times[1]:<14.4e} "
+              f"{times[1]/times[0]:.2f}")
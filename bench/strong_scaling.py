@@ -0,0 +1,61 @@
+#### STRONG_SCALING
+####
+#### Time per direct-summation force evaluation of the potential system
+#### as a function of the number of worker processes, for a range of N,
+#### with the speedup and parallel efficiency against the serial path.
+####
+#### run from the top directory:
+####   python -m bench.strong_scaling -N 1000 -N 10000 -N 50000 -w 1 -w 8 -w 64
+####
+
+import os
+import time
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from integrator.potential_system import PotentialSystem
+from potentials.plummer_potential import PlummerPotential
+
+def time_per_force_evaluation(particles, converter, workers, repeat):
+    system = PotentialSystem(converter, PlummerPotential(), workers=workers)
+    system.add_particles(particles)
+    system.direct_accelerations(system.pos)
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        system.direct_accelerations(system.pos)
+    dt = (time.perf_counter()-t0)/repeat
+    system.stop()
+    return dt
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", action="append", type="int",
+                      dest="N",
+                      help="number of potentials (repeatable) [1000, 5000, 20000]")
+    result.add_option("-w", action="append", type="int",
+                      dest="workers",
+                      help="number of workers (repeatable) [1, 2, 4, ... #cores]")
+    result.add_option("-r", type="int",
+                      dest="repeat",
+                      default = 3,
+                      help="number of timed force evaluations [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.N is None:
+        o.N = [1000, 5000, 20000]
+    if o.workers is None:
+        o.workers = [2**i for i in range(7) if 2**i <= os.cpu_count()]
+
+    print("N        workers  time [s]     speedup  efficiency")
+    for N in o.N:
+        particles = new_PlummerModel(N, 1|units.pc)
+        converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.pc)
+        t1 = time_per_force_evaluation(particles, converter, 1, o.repeat)
+        for workers in o.workers:
+            dt = time_per_force_evaluation(particles, converter, workers,
+                                           o.repeat)
+            print(f"{N:<8d} {workers:<8d} {dt:<12.4e} {t1/dt:<8.2f} "
+                  f"{t1/dt/workers:.2f}")
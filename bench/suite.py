@@ -0,0 +1,258 @@
+#### SUITE
+####
+#### Benchmark suite behind the timing table of the README.  The initial
+#### conditions (Binary, Plummer for a range of N, SStars) are generated
+#### with make_initial_conditions.py and kept in --ic_dir, so that later
+#### versions are timed on the same files.  Every integrator (potential:
+#### the potential system of gravity_potential.py, bridge: its pairwise
+#### bridge, pure: Ph4 as in gravity_pure.py) runs every case headless,
+#### in a fresh process, for the run length of the README example:
+####   Binary   50 steps of 1 Myr
+####   Plummer 100 steps of 0.1 Myr
+####   SStars  100 steps of 0.1 yr
+####
+#### Per case the wall time per step, the force evaluations per second
+#### (potential system only), the peak resident memory of the process
+#### and of its workers, and the final relative energy error are printed
+#### and written to a JSON file, together with the version of the code.
+#### With --compare the time per step is checked against an earlier
+#### result file, and the suite exits with status 1 if any case became
+#### slower by more than --tolerance.
+####
+#### run from the top directory:
+####   python -m bench.suite -N 10 -N 100 -N 1000 -o bench_v1.json
+####   python -m bench.suite -N 10 -N 100 -N 1000 -o bench_v2.json --compare bench_v1.json
+####
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import datetime
+import subprocess
+import multiprocessing
+import numpy as np
+from amuse.lab import *
+from amuse.support.literature import TrackLiteratureReferences
+
+top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# time step and number of steps of every case
+cases = {"Binary": (1.e+6|units.yr, 50),
+         "Plummer": (1.e+5|units.yr, 100),
+         "SStars": (0.1|units.yr, 100)}
+
+def initial_conditions(conditions, N, ic_dir):
+    ic_dir = os.path.abspath(ic_dir)
+    if conditions == "Plummer":
+        filename = os.path.join(ic_dir, f"plummer_{N}.amuse")
+    else:
+        filename = os.path.join(ic_dir, f"{conditions.lower()}.amuse")
+    if not os.path.exists(filename):
+        os.makedirs(ic_dir, exist_ok=True)
+        subprocess.run([sys.executable,
+                        os.path.join(top, "make_initial_conditions.py"),
+                        "-I", conditions, "-N", str(N), "-f", filename],
+                       cwd=top, check=True, stdout=subprocess.DEVNULL)
+    return filename
+
+def peak_memory(who):
+    # ru_maxrss is in kB on Linux, in bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        return rss/2.**20
+    return rss/2.**10
+
+def new_benchmark_system(integrator, particles, converter, dt):
+    # the system, the channels back to particles and a function for the
+    # total energy, as set up by gravity_potential.py and gravity_pure.py
+    if integrator == "pure":
+        from amuse.community.ph4.interface import Ph4
+        gravity = Ph4(converter)
+        gravity.particles.add_particles(particles)
+        gravity.parameters.timestep_parameter = 0.01
+        energy = lambda: gravity.kinetic_energy + gravity.potential_energy
+        return gravity, [gravity.particles.new_channel_to(particles)], energy
+
+    from gravity_potential import new_bridged_potentials
+    from gravity_potential import new_potential_system
+    from diagnostics.conserved_quantities import Diagnostics
+    if integrator == "bridge":
+        system, gravity, channels = new_bridged_potentials(particles,
+                                                           converter)
+    else:
+        system, gravity, channels = new_potential_system(particles,
+                                                         converter)
+    system.timestep = 0.25*dt
+    diagnostics = Diagnostics(converter, gravity[0].potential)
+    def energy():
+        q = diagnostics.measure(particles)
+        return q["Ek"] + q["Ep"]
+    return system, channels, energy
+
+def run_case(integrator, filename, dt, n_steps):
+    # the references are listed once, by the parent process
+    TrackLiteratureReferences.suppress_output()
+    particles = read_set_from_file(filename, close_file=True)
+    m = particles.mass.sum()
+    r = particles.position.length().sum()/len(particles)
+    converter=nbody_system.nbody_to_si(m, r)
+
+    t0 = time.perf_counter()
+    system, channels, energy = new_benchmark_system(integrator, particles,
+                                                    converter, dt)
+    setup = time.perf_counter()-t0
+    E0 = energy()
+
+    model_time = 0|units.yr
+    t0 = time.perf_counter()
+    for step in range(n_steps):
+        model_time += dt
+        system.evolve_model(model_time)
+        for ci in channels:
+            ci.copy()
+    wall = time.perf_counter()-t0
+
+    E = energy()
+    force_evaluations = getattr(system, "force_evaluations", None)
+    pair_interactions = getattr(system, "pair_interactions", None)
+    system.stop()
+    return {"N": len(particles),
+            "steps": n_steps,
+            "dt_yr": dt.value_in(units.yr),
+            "setup_s": setup,
+            "wall_s": wall,
+            "wall_per_step_s": wall/n_steps,
+            "force_evaluations": force_evaluations,
+            "force_evaluations_per_s":
+                None if force_evaluations is None else force_evaluations/wall,
+            "pair_interactions_per_s":
+                None if pair_interactions is None else pair_interactions/wall,
+            "peak_memory_MB": peak_memory(resource.RUSAGE_SELF),
+            "peak_worker_memory_MB": peak_memory(resource.RUSAGE_CHILDREN),
+            "energy_error": abs((E-E0)/E0)}
+
+def run_isolated(integrator, filename, dt, n_steps):
+    # a fresh interpreter per case, so that the peak memory is that of
+    # the case alone
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (integrator, filename, dt, n_steps))
+
+def code_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"],
+                              cwd=top, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, filename, tolerance):
+    with open(filename) as f:
+        reference = json.load(f)
+    old = {(ri["integrator"], ri["conditions"], ri["N"]): ri
+           for ri in reference["results"] if "error" not in ri}
+    print(f"against {filename} (version {reference['version']})")
+    print("integrator conditions N        time/step ratio  dE/E old     dE/E new")
+    regressions = 0
+    for ri in results:
+        key = (ri["integrator"], ri["conditions"], ri.get("N"))
+        if "error" in ri or key not in old:
+            continue
+        ratio = ri["wall_per_step_s"]/old[key]["wall_per_step_s"]
+        slower = ratio > 1+tolerance
+        regressions += slower
+        print(f"{key[0]:<10s} {key[1]:<10s} {key[2]:<8d} {ratio:<16.3f} "
+              f"{old[key]['energy_error']:<12.3e} {ri['energy_error']:.3e}"
+              + ("  SLOWER" if slower else ""))
+    return regressions
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-I", action="append", type="choice",
+                      choices=list(cases),
+                      dest="conditions",
+                      help="initial conditions (repeatable) [Binary, Plummer, SStars]")
+    result.add_option("-N", action="append", type="int",
+                      dest="N",
+                      help="number of stars of the Plummer sphere (repeatable) [10, 100, 1000]")
+    result.add_option("-i", action="append", type="choice",
+                      choices=["potential", "bridge", "pure"],
+                      dest="integrators",
+                      help="integrator (repeatable; bridge scales as N^2 codes) [potential, pure]")
+    result.add_option("-s", type="int",
+                      dest="n_steps",
+                      default = 0,
+                      help="number of steps, 0 for the README run length [%default]")
+    result.add_option("--ic_dir",
+                      dest="ic_dir",
+                      default = "bench_ics",
+                      help="directory of the initial conditions files [%default]")
+    result.add_option("-o",
+                      dest="output",
+                      default = "bench_results.json",
+                      help="result file (JSON) [%default]")
+    result.add_option("--compare",
+                      dest="reference",
+                      default = "",
+                      help="earlier result file to check against [%default]")
+    result.add_option("--tolerance", type="float",
+                      dest="tolerance",
+                      default = 0.2,
+                      help="allowed relative increase of the time per step [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.conditions is None:
+        o.conditions = list(cases)
+    if o.N is None:
+        o.N = [10, 100, 1000]
+    if o.integrators is None:
+        o.integrators = ["potential", "pure"]
+
+    runs = []
+    for conditions in o.conditions:
+        for N in (o.N if conditions == "Plummer" else [o.N[0]]):
+            filename = initial_conditions(conditions, N, o.ic_dir)
+            runs += [(integrator, conditions, filename)
+                     for integrator in o.integrators]
+
+    results = []
+    print("integrator conditions N        s/step       force evals/s  "
+          "peak MB  |dE/E|")
+    for integrator, conditions, filename in runs:
+        dt, n_steps = cases[conditions]
+        if o.n_steps > 0:
+            n_steps = o.n_steps
+        case = {"integrator": integrator, "conditions": conditions,
+                "initial_conditions": filename}
+        try:
+            case.update(run_isolated(integrator, filename, dt, n_steps))
+        except Exception as error:
+            case["error"] = repr(error)
+            print(f"{integrator:<10s} {conditions:<10s} failed: {error!r}")
+            results.append(case)
+            continue
+        results.append(case)
+        rate = case["force_evaluations_per_s"]
+        print(f"{integrator:<10s} {conditions:<10s} {case['N']:<8d} "
+              f"{case['wall_per_step_s']:<12.4e} "
+              + (f"{rate:<14.4g} " if rate is not None else f"{'-':<14s} ")
+              + f"{case['peak_memory_MB']:<8.1f} {case['energy_error']:.3e}")
+
+    with open(o.output, "w") as f:
+        json.dump({"version": code_version(),
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "python": platform.python_version(),
+                   "numpy": np.__version__,
+                   "platform": platform.platform(),
+                   "cpu_count": os.cpu_count(),
+                   "results": results}, f, indent=1)
+
+    if o.reference:
+        if compare(results, o.reference, o.tolerance) > 0:
+            sys.exit(1)
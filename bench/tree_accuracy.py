@@ -0,0 +1,70 @@
+#### TREE_ACCURACY
+####
+#### Relative force error of the Barnes-Hut tree against the direct sum,
+#### and the time per force evaluation, as a function of the opening
+#### angle theta, for a Plummer sphere of Plummer potentials.  The direct
+#### sum is taken for a random sample of targets, so that large N remain
+#### affordable.
+####
+#### run from the top directory:
+####   python -m bench.tree_accuracy -N 10000 --theta 0.3 --theta 0.5
+####
+
+import time
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from integrator.potential_system import PotentialSystem
+from potentials.plummer_potential import PlummerPotential
+
+def direct_sample(system, sample):
+    potential = system.potential.as_nbody(system.converter)
+    potential.set_parameters(system.mass, system.radius, potential.epsilon2)
+    d = system.pos[sample,None,:] - system.pos[None,:,:]
+    a = potential.get_gravity_at_point(0, d[...,0], d[...,1], d[...,2])
+    itself = sample[:,None] == np.arange(len(system.pos))[None,:]
+    return np.column_stack([np.where(itself, 0, ai).sum(axis=1) for ai in a])
+
+def force_errors(system, theta, sample):
+    system.theta = theta
+    t0 = time.perf_counter()
+    acc = system.accelerations(system.pos)
+    dt = time.perf_counter() - t0
+    reference = direct_sample(system, sample)
+    error = np.sqrt(((acc[sample]-reference)**2).sum(axis=1)
+                    / (reference**2).sum(axis=1))
+    return error, dt
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", type="int",
+                      dest="N",
+                      default = 10000,
+                      help="number of potentials [%default]")
+    result.add_option("--theta", action="append", type="float",
+                      dest="theta",
+                      help="opening angle (repeatable) [0.3, 0.5, 0.7, 1.0]")
+    result.add_option("--sample", type="int",
+                      dest="sample",
+                      default = 1000,
+                      help="number of targets checked against direct sum [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.theta is None:
+        o.theta = [0.3, 0.5, 0.7, 1.0]
+
+    particles = new_PlummerModel(o.N, 1|units.pc)
+    converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.pc)
+    system = PotentialSystem(converter, PlummerPotential())
+    system.add_particles(particles)
+    sample = np.random.choice(o.N, min(o.sample, o.N), replace=False)
+
+    print("theta  median       99%          max          time [s]")
+    for theta in o.theta:
+        error, dt = force_errors(system, theta, sample)
+        print(f"{theta:<6.2f} {np.median(error):<12.3e} "
+              f"{np.percentile(error, 99):<12.3e} {error.max():<12.3e} {dt:.3f}")
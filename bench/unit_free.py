@@ -0,0 +1,80 @@
+#### UNIT_FREE
+####
+#### Time one kick-drift-kick step of the coupled potentials, once with
+#### AMUSE quantities throughout and once on the unit-free N-body
+#### arrays of the potential system, for a range of N.
+####
+#### run from the top directory:
+####   python -m bench.unit_free -N 10 -N 100 -N 1000
+####
+
+import time
+import numpy as np
+from amuse.lab import *
+
+from make_initial_conditions import new_PlummerModel
+from integrator.potential_system import PotentialSystem
+from potentials.plummer_potential import PlummerPotential
+
+def quantity_step(particles, i, j, dt):
+    # the same pairwise evaluation as the potential system, with units
+    potential = PlummerPotential()
+    potential.set_parameters(particles.mass[j], particles.radius[j])
+    def kick(dt):
+        d = particles.position[i] - particles.position[j]
+        a = potential.get_gravity_at_point(0, d[:,0], d[:,1], d[:,2])
+        a = [ai.reshape((len(particles), -1)).sum(axis=1) for ai in a]
+        particles.vx += a[0]*dt
+        particles.vy += a[1]*dt
+        particles.vz += a[2]*dt
+    kick(dt/2)
+    particles.position += particles.velocity*dt
+    kick(dt/2)
+
+def time_per_step(step, nsteps):
+    step()
+    t0 = time.perf_counter()
+    for si in range(nsteps):
+        step()
+    return (time.perf_counter()-t0)/nsteps
+
+def benchmark(N, nsteps, dt=0.01|units.Myr):
+    particles = new_PlummerModel(N, 1|units.pc)
+    converter = nbody_system.nbody_to_si(particles.mass.sum(), 1|units.pc)
+
+    i, j = np.nonzero(~np.eye(N, dtype=bool))
+    with_units = particles.copy()
+    t_units = time_per_step(lambda: quantity_step(with_units, i, j, dt),
+                            nsteps)
+
+    system = PotentialSystem(converter, PlummerPotential(), timestep=dt)
+    system.add_particles(particles)
+    dt_nbody = converter.to_nbody(dt).value_in(nbody_system.time)
+    def nbody_step():
+        system.kick(dt_nbody/2)
+        system.drift(dt_nbody)
+        system.kick(dt_nbody/2)
+    t_nbody = time_per_step(nbody_step, nsteps)
+    return t_units, t_nbody
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-N", action="append", type="int",
+                      dest="N",
+                      help="number of potentials (repeatable) [10, 100, 1000]")
+    result.add_option("-n", type="int",
+                      dest="nsteps",
+                      default = 10,
+                      help="number of timed steps [%default]")
+    return result
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if o.N is None:
+        o.N = [10, 100, 1000]
+
+    print("N        units [s/step]  nbody [s/step]  speedup")
+    for N in o.N:
+        t_units, t_nbody = benchmark(N, o.nsteps)
+        print(f"{N:<8d} {t_units:<15.3e} {t_nbody:<15.3e} {t_units/t_nbody:.1f}")
@@ -0,0 +1,71 @@
+#### CONSERVED_QUANTITIES
+####
+#### Kinetic energy, pairwise potential energy, linear and angular
+#### momentum of a set of potentials, taken in one pass over the
+#### particle arrays in N-body units.  The potential energy is the true
+#### interaction energy -1/2 sum_i m_i sum_j!=i phi_j(r_i), evaluated
+#### over the same blocks as the direct force sum (potentials/kernels.py).
+####
+#### The O(N^2) energy sum can cost as much as a step of the
+#### integration, so Diagnostics only measures every `every` output
+#### steps (every=0: only at the start and the end of the run).
+####
+
+import numpy as np
+from amuse.units import units
+from amuse.units import nbody_system
+
+from potentials import kernels
+
+def conserved_quantities(potential, pos, vel, mass):
+    # potential is unit-free and holds the parameters of every particle;
+    # leading axes (the members of an ensemble) are kept
+    Ek = 0.5*(mass*(vel**2).sum(axis=-1)).sum(axis=-1)
+    Ep = 0.
+    N = mass.shape[-1]
+    for first, last in kernels.blocks(N, mass.size//N,
+                                      kernels.fused(potential, pos)):
+        phi = kernels.potentials(potential, pos, first, last)
+        Ep = Ep - 0.5*(mass[...,first:last]*phi).sum(axis=-1)
+    mv = mass[...,None]*vel
+    P = mv.sum(axis=-2)
+    L = np.cross(pos, mv).sum(axis=-2)
+    return Ek, Ep, P, L
+
+class Diagnostics(object):
+    def __init__(self, converter, potential, every=1):
+        self.converter = converter
+        self.potential = potential
+        self.every = every
+        self.initial = None
+
+    def due(self, step, last=False):
+        return last or (self.every > 0 and step%self.every == 0)
+
+    def measure(self, particles):
+        c = self.converter
+        pos = c.to_nbody(particles.position).value_in(nbody_system.length)
+        vel = c.to_nbody(particles.velocity).value_in(nbody_system.speed)
+        mass = c.to_nbody(particles.mass).value_in(nbody_system.mass)
+        radius = c.to_nbody(particles.radius).value_in(nbody_system.length)
+        potential = self.potential.as_nbody(c)
+        potential.set_parameters(mass, radius, potential.epsilon2)
+        Ek, Ep, P, L = conserved_quantities(potential, pos, vel, mass)
+        # scales against which the momentum errors are measured
+        p_scale = (mass*np.sqrt((vel**2).sum(axis=1))).sum()
+        l_scale = np.sqrt((np.cross(pos, mass[:,None]*vel)**2).sum(axis=1)).sum()
+        return {"Ek": c.to_si(Ek | nbody_system.energy),
+                "Ep": c.to_si(Ep | nbody_system.energy),
+                "P": P, "L": L, "p_scale": p_scale, "l_scale": l_scale}
+
+    def report(self, particles, model_time):
+        q = self.measure(particles)
+        if self.initial is None:
+            self.initial = q
+        q0 = self.initial
+        E = q["Ek"] + q["Ep"]
+        dE = (q["Ek"]-q0["Ek"]) + (q["Ep"]-q0["Ep"])
+        dP = np.sqrt(((q["P"]-q0["P"])**2).sum())/q0["p_scale"]
+        dL = np.sqrt(((q["L"]-q0["L"])**2).sum())/q0["l_scale"]
+        print(model_time.in_(units.Myr), dE/E, dP, dL)
+        return q
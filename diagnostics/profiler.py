@@ -0,0 +1,135 @@
+#### PROFILER
+####
+#### Per-phase timers and call counts for the integration loops of
+#### gravity_potential.py and gravity_pure.py (--profile).
+####
+#### The loop wraps its phases (evolve, channels, output, diagnostics,
+#### snapshots, checkpoints, plot) in profiler.phase(name); with the
+#### output thread (output/pipeline.py) diagnostics and snapshots time
+#### the hand-off, including waits for a full queue, output the final
+#### flush, and plot the figure, drawn on the main thread.  Methods
+#### inside the integrator (the kicks and drifts of Bridge,
+#### CompositeGravityCode and PotentialSystem, and get_gravity_at_point
+#### of every potential class) are wrapped with instrument(cls, method)
+#### for the duration of the run.  Times are inclusive: a kick contains
+#### the get_gravity_at_point calls it makes.  Bridge drifts its codes
+#### in threads, so the timers are shared under a lock, and their sum
+#### can exceed the wall time.
+####
+#### At every end_step the times of that step are appended to the trace
+#### file, as CSV rows (step, model time [Myr], phase, seconds, calls), or
+#### as JSON lines if the file name ends in .json or .jsonl; close prints
+#### a summary over the whole run.  Without a file name the profiler is
+#### switched off: phase is a no-op and nothing is wrapped.
+####
+
+import json
+import time
+import threading
+import contextlib
+import functools
+from amuse.units import units
+
+class Phase(object):
+    __slots__ = ("profiler", "name", "t0")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exception):
+        self.profiler.add(self.name, time.perf_counter()-self.t0)
+
+class Profiler(object):
+    def __init__(self, filename=""):
+        self.filename = filename
+        self.enabled = len(filename) > 0
+        self.lock = threading.Lock()
+        self.step = {}
+        self.totals = {}
+        self.patched = []
+        self.trace = None
+        self.json = filename.endswith(".json") or filename.endswith(".jsonl")
+        if self.enabled:
+            self.trace = open(filename, "w")
+            if not self.json:
+                print("step,model_time_Myr,phase,seconds,calls",
+                      file=self.trace)
+        self.t_start = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return Phase(self, name)
+
+    def add(self, name, seconds):
+        with self.lock:
+            entry = self.step.setdefault(name, [0., 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def instrument(self, cls, method, name=None):
+        # time every call of cls.method (only if cls defines it itself,
+        # so that inherited methods are not counted twice)
+        if not self.enabled or method not in vars(cls):
+            return
+        if name is None:
+            name = f"{cls.__name__}.{method}"
+        original = vars(cls)[method]
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter()-t0)
+        setattr(cls, method, timed)
+        self.patched.append((cls, method, original))
+
+    def instrument_subclasses(self, cls, method):
+        self.instrument(cls, method)
+        for subclass in cls.__subclasses__():
+            self.instrument_subclasses(subclass, method)
+
+    def end_step(self, step, model_time):
+        if not self.enabled:
+            return
+        with self.lock:
+            current, self.step = self.step, {}
+        t = model_time.value_in(units.Myr)
+        if self.json:
+            print(json.dumps({"step": step, "model_time_Myr": t,
+                              "phases": current}), file=self.trace)
+        else:
+            for name, (seconds, calls) in current.items():
+                print(f"{step},{t!r},{name},{seconds!r},{calls}",
+                      file=self.trace)
+        for name, (seconds, calls) in current.items():
+            entry = self.totals.setdefault(name, [0., 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+    def summary(self):
+        wall = time.perf_counter()-self.t_start
+        print(f"profile over {wall:.3f} s wall time (inclusive times)")
+        print("phase                                     calls      "
+              "total [s]    % wall   per call [s]")
+        for name, (seconds, calls) in sorted(self.totals.items(),
+                                             key=lambda entry: -entry[1][0]):
+            print(f"{name:<41s} {calls:<10d} {seconds:<12.4e} "
+                  f"{100*seconds/wall:<8.2f} {seconds/calls:.3e}")
+
+    def close(self, model_time):
+        # phases after the last step (e.g. plot) go into a row of step -1
+        if not self.enabled:
+            return
+        for cls, method, original in reversed(self.patched):
+            setattr(cls, method, original)
+        self.patched = []
+        if self.step:
+            self.end_step(-1, model_time)
+        self.trace.close()
+        self.summary()
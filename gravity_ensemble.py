@@ -0,0 +1,99 @@
+#### GRAVITY_ENSEMBLE
+####
+#### Run the potential integrator on an ensemble of initial conditions
+#### (equal numbers of particles) in one process, advancing all members
+#### together (integrator/ensemble_system.py).  Every member keeps its
+#### own snapshot file, <initial conditions>_snapshots.h5, and every
+#### diagnostics line prints the time and the energy error per member,
+#### in the order of the files on the command line.
+####
+#### python gravity_ensemble.py -t 10 --dt 0.1 plummer_*.amuse
+####
+
+import os
+import numpy as np
+from amuse.units import units
+from amuse.units import nbody_system
+
+from ic.chunked_plummer import read_initial_conditions
+from output.snapshots import SnapshotWriter
+from potentials.plummer_potential import PlummerPotential
+from integrator.ensemble_system import EnsembleSystem
+from integrator.symplectic import methods
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser(usage="%prog [options] file1.amuse file2.amuse ...")
+    result.add_option("-t", type="float", unit=units.yr,
+                      dest="t_end",
+                      default = 10|units.yr,
+                      help="end time of the simulation [%default]")
+    result.add_option("--dt", type="float", unit=units.yr,
+                      dest="dt",
+                      default = 0.25|units.yr,
+                      help="time step [%default]")
+    result.add_option("--order", type="choice",
+                      choices=["2", "4", "6"],
+                      dest="order",
+                      default = "2",
+                      help="order of the integrator [%default]")
+    result.add_option("--snap_every", type="int",
+                      dest="snap_every",
+                      default = 1,
+                      help="write a snapshot every so many steps [%default]")
+    result.add_option("--diag_every", type="int",
+                      dest="diag_every",
+                      default = 1,
+                      help="energy check every so many steps, 0 for the end only [%default]")
+    return result
+
+def snapshot_filename(filename):
+    return os.path.splitext(filename)[0] + "_snapshots.h5"
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    if len(arguments) == 0:
+        new_option_parser().error("no initial conditions files given")
+
+    members = [read_initial_conditions(fi) for fi in arguments]
+    m = np.mean([mi.mass.sum().value_in(units.MSun) for mi in members])
+    r = np.mean([mi.position.lengths().value_in(units.pc).mean()
+                 for mi in members])
+    converter=nbody_system.nbody_to_si(m|units.MSun, r|units.pc)
+
+    potential = PlummerPotential()
+    system = EnsembleSystem(converter, potential, method=methods[o.order])
+    system.add_members(members)
+
+    model_time = 0|units.Myr
+    snapshots = [SnapshotWriter(snapshot_filename(fi), mi, o.snap_every)
+                 for fi, mi in zip(arguments, members)]
+    for si, mi in zip(snapshots, members):
+        si.write(mi, model_time)
+
+    dt = o.dt
+    system.timestep = 0.25*dt
+
+    Ek0 = system.kinetic_energy
+    Ep0 = system.potential_energy
+
+    t_end = o.t_end
+    step = 0
+    while model_time<t_end:
+        model_time += dt
+        step += 1
+        system.evolve_model(model_time)
+        last = model_time>=t_end
+        if last or (o.diag_every > 0 and step%o.diag_every == 0):
+            Ek = system.kinetic_energy
+            Ep = system.potential_energy
+            dE = ((Ek-Ek0) + (Ep-Ep0))/(Ek+Ep)
+            print(model_time.in_(units.Myr), *dE)
+        if snapshots[0].due(step, last):
+            system.synchronize_members()
+            for si, mi in zip(snapshots, members):
+                si.write(mi, model_time)
+
+    system.stop()
+    for si in snapshots:
+        si.close()
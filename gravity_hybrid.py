@@ -0,0 +1,211 @@
+#### GRAVITY_HYBRID
+####
+#### Stars as particles, dominant or background bodies as potentials.
+#### The particles of the initial conditions are split (classify, in
+#### gravity_potential.py) into
+#### a direct set, integrated by Ph4 as in gravity_pure.py, and a field
+#### set: the particles of at least --field_mass, those named in
+#### --field_names, or else the most massive one (for the S-stars the
+#### SMBH).  Every field body is a potential (--field_potential) centred
+#### on its row of one ParticleStore, as in the bridge of
+#### gravity_potential.py; with --cluster_mass an extended nuclear
+#### cluster (--cluster_potential, scale --cluster_radius) is added as
+#### one more field body at the centre of mass of the field.  One Bridge
+#### kicks Ph4 with all field potentials, and every field body with Ph4
+#### and the other field potentials, so that Ph4 only resolves the
+#### stars, without the mass ratio of the SMBH, and there are no pairs
+#### of potentials among the stars.  The cluster sits on the field
+#### bodies, where their point-mass fields diverge, so it takes their
+#### pull as the reaction to its own force on them (ReactionCode).
+####
+#### The energy (hybrid_energy) is that of the coupled system: Ph4
+#### among the stars, the field potentials at the stars, and the field
+#### bodies among themselves (with the potential of the later one, the
+#### cluster if it is in the pair, at the earlier one).
+####
+#### python gravity_hybrid.py -f SStars.amuse -t 10 --dt 0.1
+####
+
+import numpy as np
+from amuse.datamodel import Particles
+from amuse.units import units
+from amuse.units import nbody_system
+from amuse.couple import bridge
+from amuse.community.ph4.interface import Ph4
+
+from plot.plot_cluster import plot_snapshots
+from ic.chunked_plummer import read_initial_conditions
+from output.snapshots import SnapshotWriter
+from output.pipeline import OutputPipeline
+from read_parameters import new_option_parser
+from diagnostics.profiler import Profiler
+from integrator.encounters import EncounterDetector
+
+from potentials.point_particle_potential import PointParticlePotential
+from potentials.spherical_potential import (HernquistPotential,
+                                            TabulatedPlummerPotential)
+from integrator.particle_store import ParticleStore
+from integrator.symplectic import methods
+from gravity_potential import CompositeGravityCode, classify
+
+# normalized to G M, so that the mass of a field body or of the cluster
+# is its mass whatever the profile (PlummerPotential is 2 G M/r)
+field_potentials = {"point": PointParticlePotential,
+                    "plummer": TabulatedPlummerPotential,
+                    "hernquist": HernquistPotential}
+
+def new_cluster(field, mass, radius):
+    cluster = Particles(1)
+    cluster.mass = mass
+    cluster.radius = radius
+    cluster.position = field.center_of_mass()
+    cluster.velocity = field.center_of_mass_velocity()
+    return cluster
+
+class ReactionCode(object):
+    # the pull of a field body on the (one particle of the) extended
+    # code: minus m_body/M times the gravity of the extended code at the
+    # body
+    def __init__(self, body, extended):
+        self.body = body
+        self.extended = extended
+
+    def get_gravity_at_point(self, eps, x, y, z):
+        body, extended = self.body, self.extended
+        bx, by, bz = body.store.position[body.index]
+        f = -body.store.mass[body.index]/extended.store.mass[extended.index]
+        a = extended.get_gravity_at_point(eps, bx, by, bz)
+        return tuple(f*ai for ai in a)
+
+def new_hybrid_system(particles, converter, field, order="2",
+                      field_potential="point", cluster=None,
+                      cluster_potential="plummer", begin_time=0|units.Myr):
+    # Ph4 for the direct set, one CompositeGravityCode per field body
+    # (and the cluster), in one Bridge
+    direct = particles[~field]
+    bodies = particles[field]
+
+    gravity = Ph4(converter)
+    gravity.parameters.begin_time = begin_time
+    gravity.particles.add_particles(direct)
+    gravity.parameters.timestep_parameter = 0.01
+
+    store = ParticleStore(bodies)
+    potential = field_potentials[field_potential]()
+    codes = [CompositeGravityCode(converter, potential, store, i)
+             for i in range(len(store))]
+    for ci in codes:
+        ci.model_time = begin_time
+    channels = [gravity.particles.new_channel_to(direct),
+                store.new_channel_to(bodies)]
+    partners = {ci: [gravity] + [cj for cj in codes if cj is not ci]
+                for ci in codes}
+    if cluster is not None:
+        code = CompositeGravityCode(converter,
+                                    field_potentials[cluster_potential]())
+        code.add_particle(cluster)
+        code.model_time = begin_time
+        for ci in codes:
+            partners[ci].append(code)
+        partners[code] = [gravity] + [ReactionCode(ci, code) for ci in codes]
+        codes.append(code)
+        channels.append(code.store.new_channel_to(cluster))
+
+    if order == "2":
+        system = bridge.Bridge(verbose=False)
+    elif order == "4g":
+        raise ValueError("bridge does not support the force-gradient integrator")
+    else:
+        system = bridge.Bridge(verbose=False, method=methods[order])
+    system.time = begin_time
+    system.add_system(gravity, codes)
+    for ci in codes:
+        system.add_system(ci, partners[ci])
+    return system, gravity, codes, channels
+
+def hybrid_energy(gravity, codes):
+    stars = gravity.particles
+    eps = 0|units.pc**2
+    Ek = gravity.kinetic_energy + sum([ci.kinetic_energy for ci in codes],
+                                      0|units.erg)
+    Ep = gravity.potential_energy
+    for i, ci in enumerate(codes):
+        Ep -= (stars.mass*ci.get_potential_at_point(eps, stars.x, stars.y,
+                                                    stars.z)).sum()
+        x, y, z = ci.store.position[ci.index]
+        for cj in codes[i+1:]:
+            Ep -= ci.store.mass[ci.index]*cj.get_potential_at_point(eps,
+                                                                    x, y, z)
+    return Ek, Ep
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    # the block steps of Ph4 are not in a checkpoint, so a resumed run
+    # would not continue the same integration
+    if o.restart or o.checkpoint_every > 0|units.yr or o.checkpoint_wall > 0:
+        raise ValueError("Ph4 runs cannot be checkpointed or restarted")
+    profiler = Profiler(o.profile)
+    encounters = None
+    if o.encounters:
+        encounters = EncounterDetector(tidal_factor=o.tidal_factor)
+
+    particles = read_initial_conditions(o.filename)
+    m = particles.mass.sum()
+    r = particles.position.length().sum()/len(particles)
+    converter=nbody_system.nbody_to_si(m, r)
+
+    model_time = 0|units.Myr
+    field_names = [ni for ni in o.field_names.split(",") if ni]
+    field = classify(particles, o.field_mass, field_names)
+    print(f"{field.sum()} field potentials, {(~field).sum()} stars in Ph4")
+    cluster = None
+    if o.cluster_mass > 0|units.MSun:
+        cluster = new_cluster(particles[field], o.cluster_mass,
+                              o.cluster_radius)
+    system, gravity, codes, channels = new_hybrid_system(
+        particles, converter, field, o.order, o.field_potential, cluster,
+        o.cluster_potential, model_time)
+    system.timestep = 0.25*o.dt
+
+    Ek0, Ep0 = hybrid_energy(gravity, codes)
+    step = 0
+    snapshots = SnapshotWriter(o.snapshots, particles, o.snap_every)
+    snapshots.write(particles, model_time)
+    output = OutputPipeline(o.output_queue)
+
+    dt = o.dt
+    t_end = o.t_end
+    profiler.end_step(step, model_time)
+    while model_time<t_end:
+        model_time += dt
+        step += 1
+        with profiler.phase("evolve"):
+            system.evolve_model(model_time)
+        with profiler.phase("channels"):
+            for ci in channels:
+                ci.copy()
+        last = model_time>=t_end
+        if encounters is not None:
+            with profiler.phase("encounters"):
+                if encounters.check(particles):
+                    encounters.report(particles, model_time)
+                    last = True
+        if o.diag_every > 0 and step%o.diag_every == 0 or last:
+            with profiler.phase("diagnostics"):
+                Ek, Ep = hybrid_energy(gravity, codes)
+                dE = (Ek-Ek0) + (Ep-Ep0)
+                output.submit(print, model_time.in_(units.Myr), dE/(Ek+Ep))
+        if snapshots.due(step, last):
+            with profiler.phase("snapshots"):
+                output.submit(snapshots.write, particles.copy(), model_time)
+        profiler.end_step(step, model_time)
+        if encounters is not None and encounters.is_set():
+            break
+    system.stop()
+    output.submit(snapshots.close)
+    with profiler.phase("output"):
+        output.close()
+    # matplotlib (its GUI backends) only on the main thread
+    with profiler.phase("plot"):
+        plot_snapshots(o.snapshots, o.figname)
+    profiler.close(model_time)
@@ -1,3 +1,4 @@
+import copy
 import numpy as np
 from amuse.datamodel import Particles
 from amuse.units import units, quantities
@@ -8,126 +9,358 @@ from amuse.community.ph4.interface import Ph4
 from matplotlib import pyplot as plt
 from amuse.ic.plummer import new_plummer_model
 from amuse.ic.salpeter import new_salpeter_mass_distribution
-from amuse.lab import read_set_from_file
 
-from plot.plot_cluster import plot_cluster
+from plot.plot_cluster import plot_snapshots
+from ic.chunked_plummer import read_initial_conditions
+from output.snapshots import SnapshotWriter
+from output.checkpoint import Checkpointer, read_checkpoint
+from output.pipeline import OutputPipeline
 from read_parameters import new_option_parser
 
 from potentials.point_particle_potential import PointParticlePotential
 from potentials.plummer_potential import PlummerPotential
+from potentials.scf_potential import SCFPotential
+from potentials.spherical_potential import TabulatedPlummerPotential
+from potentials import kernels
+from integrator.potential_system import PotentialSystem
+from integrator.particle_store import ParticleStore
+from integrator.symplectic import methods
+from diagnostics.conserved_quantities import Diagnostics
+from diagnostics.profiler import Profiler
+from integrator.encounters import EncounterDetector
+from potentials.potential import Potential
+
+# quantities are never changed in place, so all codes can start from
+# the same zero time
+zero_time = 0 | units.Myr
 
 class CompositeGravityCode(object):
-    def __init__(self, converter, potential=PointParticlePotential()):
-        self.model_time = 0 | units.Myr
-        self.particles = Particles()
+    # a potential centred on one row of a ParticleStore; the code holds
+    # no particle data of its own
+    __slots__ = ("model_time", "converter", "potential", "store", "index",
+                 "row_potential")
+
+    def __init__(self, converter, potential=PointParticlePotential(),
+                 store=None, index=0):
+        self.model_time = zero_time
         self.converter = converter
         self.potential = potential
+        self.store = store
+        self.index = index
+        self.row_potential = None
+
+    @property
+    def particles(self):
+        return self.store.view(self.index)
 
     def evolve_model(self, model_time, verbose=False):
+        i = self.index
         if verbose:
-            print(f"evolve_plummer to t={model_time.in_(units.Myr)}: x={self.particles.x}")
+            print(f"evolve_plummer to t={model_time.in_(units.Myr)}: x={self.store.position[i][0]}")
         dt = model_time - self.model_time
-        self.particles.position += self.particles.velocity*dt
+        self.store.position[i] += self.store.velocity[i]*dt
+        self.potential.evolve(dt)
+        self.row_potential = None
         self.model_time = model_time
 
     def add_particle(self, particle):
-        self.particles.add_particle(particle)
-        self.potential.set_parameters(particle.mass, particle.radius)
+        self.store = ParticleStore(particle)
+        self.index = 0
+        self.row_potential = None
+
+    def _particle_potential(self):
+        # the potential with the parameters of this particle (and the
+        # state of the template, such as the coefficients of an SCF
+        # expansion), copied once and kept until the template evolves or
+        # the parameters of the row change
+        mass = self.store.mass[self.index]
+        radius = self.store.radius[self.index]
+        potential = self.row_potential
+        if (potential is None or potential.mass != mass
+                or potential.radius != radius):
+            potential = copy.copy(self.potential)
+            potential.set_parameters(mass, radius, self.potential.epsilon2)
+            self.row_potential = potential
+        return potential
         
-    @property
-    def potential_energy(self):
-        m = self.particles[0].mass
-        x = self.particles[0].x
-        y = self.particles[0].y
-        z = self.particles[0].z
-        eps = self.potential.epsilon2
-        return m*self.potential.get_potential_at_point(eps,x,y,z)[0]
-    
     @property 
     def kinetic_energy(self):
-        return (0.5*self.particles.mass \
-                   *self.particles.velocity.lengths()**2).sum()
+        return 0.5*self.store.mass[self.index] \
+                  *self.store.velocity[self.index].length()**2
 
     def get_potential_at_point(self,eps,x,y,z):
-        x = x - self.particles[0].x
-        y = y - self.particles[0].y
-        z = z - self.particles[0].z
-        plummer_potential = self.potential.get_potential_at_point(eps,x,y,z)
+        position = self.store.position[self.index]
+        x = x - position[0]
+        y = y - position[1]
+        z = z - position[2]
+        potential = self._particle_potential()
+        plummer_potential = potential.get_potential_at_point(eps,x,y,z)
         return plummer_potential
 
     def get_gravity_at_point(self, eps, x,y,z):
-        x = x - self.particles[0].x
-        y = y - self.particles[0].y
-        z = z - self.particles[0].z
-        phi_dx, phi_dy, phi_dz = self.potential.get_gravity_at_point(eps, x,y,z)
+        position = self.store.position[self.index]
+        x = x - position[0]
+        y = y - position[1]
+        z = z - position[2]
+        potential = self._particle_potential()
+        phi_dx, phi_dy, phi_dz = potential.get_gravity_at_point(eps, x,y,z)
         return phi_dx, phi_dy, phi_dz
 
     def stop(self):
         self.potential.stop()                
         return
 
-def get_kinetic_energy(gravity):
-    Ek = 0 | units.erg
-    for gi in gravity:
-        Ek += gi.kinetic_energy
-    return Ek
-        
-def get_potential_energy(gravity):
-    Ep = 0 | units.erg
-    for gi in gravity:
-        Ep += gi.potential_energy
-    return Ep
-    
-if __name__ == "__main__":
-    o, arguments = new_option_parser().parse_args()
+def new_scf_code(members, converter, nmax=6, lmax=4, timestep=0.02):
+    # one code for a whole cluster: its particle is the centre of mass,
+    # with the scale length of the expansion as radius, and the members
+    # move in the SCF expansion of their own field
+    potential = SCFPotential(nmax, lmax, timestep)
+    potential.set_members(members)
+    cluster = Particles(1)
+    cluster.mass = potential.mass
+    cluster.radius = potential.radius
+    cluster.position = members.center_of_mass()
+    cluster.velocity = members.center_of_mass_velocity()
+    code = CompositeGravityCode(converter, potential)
+    code.add_particle(cluster)
+    return code
 
-    particles = read_set_from_file(o.filename, close_file=True)
-    m = particles.mass.sum()
-    r = particles.position.length().sum()/len(particles)
-    converter=nbody_system.nbody_to_si(m, r)
+class MembersChannel(object):
+    # copy of the members of an SCF code, around the particle of the
+    # code, to the particles they were made from (in the same order)
+    def __init__(self, code, particles):
+        self.code = code
+        self.particles = particles
 
-    gravity = []
-    channel = {"to_gr":[],
-               "from_gr":[]}
-    for pi in range(len(particles)):
-        #potential = PointParticlePotential()
-        potential = PlummerPotential()
-        gravity.append(CompositeGravityCode(converter, potential))    
-        gravity[-1].add_particle(particles[pi].as_set())
-        channel["to_gr"].append(particles.new_channel_to(gravity[-1].particles))
-        channel["from_gr"].append(gravity[-1].particles.new_channel_to(particles))
+    def copy(self):
+        i = self.code.index
+        position, velocity = self.code.potential.get_members(
+            self.code.store.position[i], self.code.store.velocity[i])
+        self.particles.position = position
+        self.particles.velocity = velocity
 
-        
-    system=bridge.Bridge(verbose=False)
+def classify(particles, field_mass=0|units.MSun, field_names=(), rule=None):
+    # mask of the particles that become potentials: rule(particles), if
+    # given, or the particles of at least field_mass and those named in
+    # field_names, or else the most massive particle
+    if rule is not None:
+        return np.asarray(rule(particles), dtype=bool)
+    field = np.zeros(len(particles), dtype=bool)
+    if field_mass > 0|units.MSun:
+        field |= particles.mass >= field_mass
+    if len(field_names) > 0:
+        field |= np.isin(particles.name, list(field_names))
+    if not field.any():
+        field[particles.mass.value_in(units.MSun).argmax()] = True
+    return field
+
+def new_scf_system(particles, converter, field, nmax=6, lmax=4, order="2"):
+    # the members (~field) as one SCF code, and every field body as a
+    # potential on its row of a ParticleStore, all bridged with each
+    # other; the field bodies are normalized to G M, as the expansion,
+    # so that the forces are the same both ways (PlummerPotential is
+    # 2 G M/r)
+    members = particles[~field]
+    bodies = particles[field]
+    cluster = new_scf_code(members, converter, nmax, lmax)
+    store = ParticleStore(bodies)
+    potential = TabulatedPlummerPotential()
+    codes = [CompositeGravityCode(converter, potential, store, i)
+             for i in range(len(store))]
+
+    if order == "2":
+        system = bridge.Bridge(verbose=False)
+    elif order == "4g":
+        raise ValueError("bridge does not support the force-gradient integrator")
+    else:
+        system = bridge.Bridge(verbose=False, method=methods[order])
+    system.add_system(cluster, codes)
+    for ci in codes:
+        system.add_system(ci, [cluster] + [cj for cj in codes if cj is not ci])
+    channels = [MembersChannel(cluster, members), store.new_channel_to(bodies)]
+    return system, [cluster] + codes, channels
+
+def new_bridged_potentials(particles, converter, order="2"):
+    # the codes are views of one particle store, which is copied back to
+    # the particles in bulk
+    store = ParticleStore(particles)
+    #potential = PointParticlePotential()
+    potential = PlummerPotential()
+    gravity = [CompositeGravityCode(converter, potential, store, pi)
+               for pi in range(len(store))]
+
+    if order == "2":
+        system=bridge.Bridge(verbose=False)
+    elif order == "4g":
+        raise ValueError("bridge does not support the force-gradient integrator")
+    else:
+        system=bridge.Bridge(verbose=False, method=methods[order])
     for gi in range(len(gravity)):
         for gj in range(len(gravity)):
             if gi != gj:
                 print(f"add_system({gi}, ({gj},))")
                 system.add_system(gravity[gi], (gravity[gj],))
-    #print("")
+    return system, gravity, [store.new_channel_to(particles)]
+
+def new_potential_system(particles, converter, theta=0, order="2", eta=0,
+                         workers=1, kepler=False, regularize=False):
+    #potential = PointParticlePotential()
+    potential = PlummerPotential()
+    system = PotentialSystem(converter, potential, theta=theta,
+                             method=methods[order], eta=eta, workers=workers,
+                             kepler=kepler, regularize=regularize)
+    system.add_particles(particles)
+    return system, [system], [system.particles.new_channel_to(particles)]
+
+def instrument(profiler):
+    for method in ["kick_codes", "drift_codes"]:
+        profiler.instrument(bridge.Bridge, method, f"bridge.{method}")
+    profiler.instrument(CompositeGravityCode, "evolve_model")
+    for method in ["kick", "drift", "accelerations", "force_gradient"]:
+        profiler.instrument(PotentialSystem, method)
+    profiler.instrument(CompositeGravityCode, "get_gravity_at_point")
+    profiler.instrument(PotentialSystem, "get_gravity_at_point")
+    profiler.instrument_subclasses(Potential, "get_gravity_at_point")
+    
+def _stores(gravity):
+    # the particle stores of the codes, each once, in order
+    return list({id(gi.store): gi.store for gi in gravity}.values())
+
+def get_system_state(system, gravity):
+    if isinstance(system, PotentialSystem):
+        return system.get_state()
+    stores = _stores(gravity)
+    state = {"time": system.time,
+             "model_time": [gi.model_time for gi in gravity],
+             "position": [si.position.copy() for si in stores],
+             "velocity": [si.velocity.copy() for si in stores]}
+    potential = gravity[0].potential
+    if isinstance(potential, SCFPotential):
+        state["members"] = (potential.pos.copy(), potential.vel.copy())
+    return state
+
+def set_system_state(system, gravity, state):
+    if isinstance(system, PotentialSystem):
+        system.set_state(state)
+        return
+    system.time = state["time"]
+    for i, gi in enumerate(gravity):
+        gi.model_time = state["model_time"][i]
+    for si, position, velocity in zip(_stores(gravity), state["position"],
+                                      state["velocity"]):
+        si.position[:] = position
+        si.velocity[:] = velocity
+    if "members" in state:
+        potential = gravity[0].potential
+        potential.pos, potential.vel = (a.copy() for a in state["members"])
+        potential.expand()
+
+if __name__ == "__main__":
+    o, arguments = new_option_parser().parse_args()
+    profiler = Profiler(o.profile)
+    encounters = None
+    if o.encounters:
+        encounters = EncounterDetector(tidal_factor=o.tidal_factor)
+    instrument(profiler)
+    kernels.set_backend(o.kernels)
+
+    particles = read_initial_conditions(o.filename)
+    m = particles.mass.sum()
+    r = particles.position.length().sum()/len(particles)
+    converter=nbody_system.nbody_to_si(m, r)
 
-    model_time = 0|units.Myr
-    ax = plot_cluster(particles, model_time)
+    if o.cluster_model == "scf":
+        field_names = [ni for ni in o.field_names.split(",") if ni]
+        field = classify(particles, o.field_mass, field_names)
+        print(f"{(~field).sum()} stars in the SCF cluster, "
+              f"{field.sum()} field potentials")
+        system, gravity, channels = new_scf_system(particles, converter,
+                                                   field, o.nmax, o.lmax,
+                                                   o.order)
+    elif o.bridge:
+        system, gravity, channels = new_bridged_potentials(particles,
+                                                           converter,
+                                                           o.order)
+    else:
+        system, gravity, channels = new_potential_system(particles, converter,
+                                                         o.theta, o.order,
+                                                         o.eta, o.workers,
+                                                         o.kepler,
+                                                         o.regularize)
 
     dt = o.dt
     system.timestep = 0.25*dt
+    # the energy of the members of an SCF cluster is that of the stars
+    # as point masses, not of their expansion
+    potential = gravity[0].potential
+    if isinstance(potential, SCFPotential):
+        potential = PointParticlePotential()
+    diagnostics = Diagnostics(converter, potential, o.diag_every)
 
-    Ek0 = get_kinetic_energy(gravity)
-    Ep0 = get_potential_energy(gravity)
+    if o.restart:
+        checkpoint = read_checkpoint(o.checkpoint)
+        set_system_state(system, gravity, checkpoint["system"])
+        for fi in channels:
+            fi.copy()
+        model_time = checkpoint["model_time"]
+        step = checkpoint["step"]
+        diagnostics.initial = checkpoint["diagnostics"]
+        snapshots = SnapshotWriter(o.snapshots, particles, o.snap_every,
+                                   restart_time=model_time)
+    else:
+        model_time = 0|units.Myr
+        step = 0
+        snapshots = SnapshotWriter(o.snapshots, particles, o.snap_every)
+        snapshots.write(particles, model_time)
+        diagnostics.report(particles, model_time)
+    checkpoints = Checkpointer(o.checkpoint, o.checkpoint_every,
+                               o.checkpoint_wall, model_time)
+    output = OutputPipeline(o.output_queue)
     
     t_end = o.t_end
+    profiler.end_step(step, model_time)
     while model_time<t_end:
         model_time += dt
-        system.evolve_model(model_time)
-        for fi in channel["from_gr"]:
-            fi.copy()
-        Ek = get_kinetic_energy(gravity)
-        Ep = get_potential_energy(gravity)
-        dE = (Ek-Ek0) + (Ep-Ep0)
-        print(model_time.in_(units.Myr), dE/(Ek+Ep))
-        plot_cluster(particles, model_time, ax)
+        step += 1
+        with profiler.phase("evolve"):
+            system.evolve_model(model_time)
+        with profiler.phase("channels"):
+            for fi in channels:
+                fi.copy()
+        last = model_time>=t_end
+        if encounters is not None:
+            with profiler.phase("encounters"):
+                if encounters.check(particles):
+                    encounters.report(particles, model_time)
+                    last = True
+        report = diagnostics.due(step, last)
+        write = snapshots.due(step, last)
+        if report or write:
+            with profiler.phase("output"):
+                state = particles.copy()
+        if report:
+            with profiler.phase("diagnostics"):
+                output.submit(diagnostics.report, state, model_time)
+        if write:
+            with profiler.phase("snapshots"):
+                output.submit(snapshots.write, state, model_time)
+        if checkpoints.due(model_time):
+            with profiler.phase("checkpoints"):
+                output.wait()
+                checkpoints.write({"model_time": model_time, "step": step,
+                                   "system": get_system_state(system, gravity),
+                                   "diagnostics": diagnostics.initial},
+                                  model_time)
+        profiler.end_step(step, model_time)
+        if encounters is not None and encounters.is_set():
+            break
         
     system.stop()
-    plot_cluster(particles, model_time, ax, o.figname)
-
-
+    checkpoints.close()
+    output.submit(snapshots.close)
+    with profiler.phase("output"):
+        output.close()
+    # matplotlib (its GUI backends) only on the main thread
+    with profiler.phase("plot"):
+        plot_snapshots(o.snapshots, o.figname)
+    profiler.close(model_time)
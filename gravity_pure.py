@@ -9,15 +9,27 @@ from amuse.community.ph4.interface import Ph4
 from matplotlib import pyplot as plt
 from amuse.ic.plummer import new_plummer_model
 from amuse.ic.salpeter import new_salpeter_mass_distribution
-from amuse.lab import read_set_from_file
 
-from plot.plot_cluster import plot_cluster
+from plot.plot_cluster import plot_snapshots
+from ic.chunked_plummer import read_initial_conditions
+from output.snapshots import SnapshotWriter
+from output.pipeline import OutputPipeline
 from read_parameters import new_option_parser
+from diagnostics.profiler import Profiler
+from integrator.encounters import EncounterDetector
 
 if __name__ == "__main__":
     o, arguments = new_option_parser().parse_args()
+    # the block steps of Ph4 are not in a checkpoint, so a resumed run
+    # would not continue the same integration
+    if o.restart or o.checkpoint_every > 0|units.yr or o.checkpoint_wall > 0:
+        raise ValueError("Ph4 runs cannot be checkpointed or restarted")
+    profiler = Profiler(o.profile)
+    encounters = None
+    if o.encounters:
+        encounters = EncounterDetector(tidal_factor=o.tidal_factor)
 
-    particles = read_set_from_file(o.filename, close_file=True)
+    particles = read_initial_conditions(o.filename)
     m = particles.mass.sum()
     r = particles.position.length().sum()/len(particles)
     converter=nbody_system.nbody_to_si(m, r)
@@ -28,24 +40,49 @@ if __name__ == "__main__":
     c2gry=particles.new_channel_to(gravity.particles)
     c2fr=gravity.particles.new_channel_to(particles)
 
+    #ax = plot_cluster(potentials)
     Ek0 = gravity.kinetic_energy
     Ep0 = gravity.potential_energy
-    
-    #ax = plot_cluster(potentials)
     model_time = 0|units.Myr
-    ax = plot_cluster(particles, model_time)
+    step = 0
+    snapshots = SnapshotWriter(o.snapshots, particles, o.snap_every)
+    snapshots.write(particles, model_time)
+    output = OutputPipeline(o.output_queue)
 
     dt = o.dt
     t_end = o.t_end
+    profiler.end_step(step, model_time)
     while model_time<t_end:
         model_time += dt
-        gravity.evolve_model(model_time)
-        c2fr.copy()
-        Ek = gravity.kinetic_energy
-        Ep = gravity.potential_energy
-        dE = (Ek-Ek0) + (Ep-Ep0)
-        print(model_time.in_(units.Myr), dE/(Ek+Ep))
-        plot_cluster(particles, model_time, ax)
+        step += 1
+        with profiler.phase("evolve"):
+            gravity.evolve_model(model_time)
+        with profiler.phase("channels"):
+            c2fr.copy()
+        last = model_time>=t_end
+        if encounters is not None:
+            with profiler.phase("encounters"):
+                if encounters.check(particles):
+                    encounters.report(particles, model_time)
+                    last = True
+        if o.diag_every > 0 and step%o.diag_every == 0 or last:
+            with profiler.phase("diagnostics"):
+                Ek = gravity.kinetic_energy
+                Ep = gravity.potential_energy
+                dE = (Ek-Ek0) + (Ep-Ep0)
+                output.submit(print, model_time.in_(units.Myr), dE/(Ek+Ep))
+        if snapshots.due(step, last):
+            with profiler.phase("snapshots"):
+                output.submit(snapshots.write, particles.copy(), model_time)
+        profiler.end_step(step, model_time)
+        if encounters is not None and encounters.is_set():
+            break
     gravity.stop()
-    plot_cluster(particles, model_time, ax, o.figname)
+    output.submit(snapshots.close)
+    with profiler.phase("output"):
+        output.close()
+    # matplotlib (its GUI backends) only on the main thread
+    with profiler.phase("plot"):
+        plot_snapshots(o.snapshots, o.figname)
+    profiler.close(model_time)
 
@@ -0,0 +1,277 @@
+#### GRAVITY_SWEEP
+####
+#### Choose the time step and integrator of gravity_potential.py for a
+#### model.  The grid of settings (every --dt with every --order and
+#### --eta, where the block steps of --eta > 0 are second order only,
+#### and with --kepler also the Kepler drift) runs on the same
+#### initial conditions, concurrently on --processes local cores, along
+#### with a reference run: by default (--reference potential) the
+#### potential integrator itself at order 6 and a quarter of the
+#### smallest --dt (with the Kepler drift if --kepler is given), so that
+#### the error is that of the time integration alone, or with
+#### --reference pure Ph4 as in gravity_pure.py, whose point masses
+#### differ from the Plummer potentials (2 G M/r) by far more than the
+#### time-integration error, which is then not what the sweep ranks.
+####
+#### Every run advances in steps of its --dt, exactly as
+#### gravity_potential.py does, and is compared with the reference at
+#### multiples of --dt_out (which every --dt has to divide).  The error
+#### of a run is the largest RMS phase-space distance to the reference,
+####   sqrt(<|x - x_ref|^2 + |v - v_ref|^2>)   in N-body units,
+#### over these times; its cost is the wall time of the run (which is
+#### only comparable between runs if --processes does not exceed the
+#### number of free cores), or with --cost pairs the number of pair
+#### interactions, which does not count the Kepler solver nor the
+#### bookkeeping of block steps.  The table lists the runs by cost,
+#### marks the accuracy-versus-cost Pareto front with *, and is written
+#### to a CSV file; with --target the cheapest setting within that error
+#### is printed as a command line for gravity_potential.py.
+####
+#### python gravity_sweep.py -f plummer.amuse -t 1.e+6 --dt 1.e+5 --dt 5.e+4 --dt 2.5e+4 --order 2 --order 4 --target 1.e-3
+####
+
+import os
+import csv
+import time
+import multiprocessing
+import numpy as np
+from amuse.units import units
+from amuse.units import nbody_system
+
+from ic.chunked_plummer import read_initial_conditions
+from gravity_potential import new_potential_system
+
+def read_model(filename):
+    particles = read_initial_conditions(filename)
+    m = particles.mass.sum()
+    r = particles.position.length().sum()/len(particles)
+    converter=nbody_system.nbody_to_si(m, r)
+    return particles, converter
+
+def phase_space(particles, converter):
+    pos = converter.to_nbody(particles.position).value_in(nbody_system.length)
+    vel = converter.to_nbody(particles.velocity).value_in(nbody_system.speed)
+    return np.hstack([pos, vel])
+
+def run_potential(filename, t_end, dt_out, setting):
+    particles, converter = read_model(filename)
+    system, gravity, channels = new_potential_system(particles, converter,
+                                                     order=setting["order"],
+                                                     eta=setting["eta"],
+                                                     kepler=setting["kepler"])
+    dt = setting["dt"]
+    system.timestep = 0.25*dt
+    E0 = system.kinetic_energy + system.potential_energy
+
+    states = []
+    model_time = 0|units.yr
+    t_out = dt_out
+    t0 = time.perf_counter()
+    while t_out <= t_end*(1+1.e-9):
+        while model_time < t_out - dt/2:
+            model_time += dt
+            system.evolve_model(model_time)
+        for fi in channels:
+            fi.copy()
+        states.append(phase_space(particles, converter))
+        t_out += dt_out
+    wall = time.perf_counter()-t0
+
+    E = system.kinetic_energy + system.potential_energy
+    result = dict(setting, wall=wall, energy_error=abs((E-E0)/E0),
+                  force_evaluations=system.force_evaluations,
+                  pair_interactions=system.pair_interactions,
+                  states=np.array(states))
+    system.stop()
+    return result
+
+def run_pure(filename, t_end, dt_out):
+    from amuse.community.ph4.interface import Ph4
+    particles, converter = read_model(filename)
+    gravity = Ph4(converter)
+    gravity.particles.add_particles(particles)
+    gravity.parameters.timestep_parameter = 0.01
+    channel = gravity.particles.new_channel_to(particles)
+    E0 = gravity.kinetic_energy + gravity.potential_energy
+
+    states = []
+    t_out = dt_out
+    t0 = time.perf_counter()
+    while t_out <= t_end*(1+1.e-9):
+        gravity.evolve_model(t_out)
+        channel.copy()
+        states.append(phase_space(particles, converter))
+        t_out += dt_out
+    wall = time.perf_counter()-t0
+
+    E = gravity.kinetic_energy + gravity.potential_energy
+    gravity.stop()
+    return {"wall": wall, "energy_error": abs((E-E0)/E0),
+            "states": np.array(states)}
+
+def run(job):
+    if job[0] == "pure":
+        return job, run_pure(*job[1:])
+    return job, run_potential(*job[1:])
+
+def divergence(states, reference):
+    # largest RMS phase-space distance over the output times
+    d2 = ((states-reference)**2).sum(axis=-1).mean(axis=-1)
+    return np.sqrt(d2.max())
+
+def pareto_front(runs):
+    # runs sorted by cost; a run is on the front if no cheaper run is
+    # at least as accurate
+    best = np.inf
+    for ri in runs:
+        ri["pareto"] = ri["error"] < best
+        best = min(best, ri["error"])
+
+def new_settings(o):
+    # block time steps are always second order
+    settings = []
+    for dt in o.dt:
+        for eta in o.eta:
+            for order in (o.order if eta == 0 else ["2"]):
+                settings.append({"dt": dt, "order": order, "eta": eta,
+                                 "kepler": False})
+                if o.kepler and eta == 0 and order != "4g":
+                    settings.append({"dt": dt, "order": order, "eta": eta,
+                                     "kepler": True})
+    return settings
+
+def command_line(o, setting):
+    line = (f"python gravity_potential.py -f {o.filename} "
+            f"-t {o.t_end.value_in(units.yr):g} "
+            f"--dt {setting['dt'].value_in(units.yr):g} "
+            f"--order {setting['order']}")
+    if setting["eta"] > 0:
+        line += f" --eta {setting['eta']:g}"
+    if setting["kepler"]:
+        line += " --kepler"
+    return line
+
+def new_option_parser():
+    from amuse.units.optparse import OptionParser
+    result = OptionParser()
+    result.add_option("-f",
+                      dest="filename",
+                      default = "binary.amuse",
+                      help="initial conditions datafile [%default]")
+    result.add_option("-t", type="float", unit=units.yr,
+                      dest="t_end",
+                      default = 10|units.yr,
+                      help="end time of the runs [%default]")
+    result.add_option("--dt", action="append", type="float",
+                      dest="dt",
+                      help="time step in yr, as in gravity_potential.py (repeatable) [0.25]")
+    result.add_option("--order", action="append", type="choice",
+                      choices=["2", "4", "6", "4g"],
+                      dest="order",
+                      help="order of the integrator (repeatable) [2]")
+    result.add_option("--eta", action="append", type="float",
+                      dest="eta",
+                      help="block time step parameter, 0 for a shared time step (repeatable) [0]")
+    result.add_option("--kepler", action="store_true",
+                      dest="kepler",
+                      default = False,
+                      help="also run the shared-step settings (but 4g) with the Kepler drift [%default]")
+    result.add_option("--dt_out", type="float", unit=units.yr,
+                      dest="dt_out",
+                      default = 0|units.yr,
+                      help="interval of the comparisons, 0 for the largest dt [%default]")
+    result.add_option("--reference", type="choice",
+                      choices=["pure", "potential"],
+                      dest="reference",
+                      default = "potential",
+                      help="reference run: the finest setting (potential) or Ph4 (pure), which measures the model difference too [%default]")
+    result.add_option("--cost", type="choice",
+                      choices=["wall", "pairs"],
+                      dest="cost",
+                      default = "wall",
+                      help="cost of a run: wall time or pair interactions [%default]")
+    result.add_option("--processes", type="int",
+                      dest="processes",
+                      default = os.cpu_count(),
+                      help="number of concurrent runs [%default]")
+    result.add_option("--target", type="float",
+                      dest="target",
+                      default = 0,
+                      help="largest acceptable error, 0 for none [%default]")
+    result.add_option("-o",
+                      dest="output",
+                      default = "sweep.csv",
+                      help="result table (CSV) [%default]")
+    return result
+
+if __name__ == "__main__":
+    parser = new_option_parser()
+    o, arguments = parser.parse_args()
+    if o.dt is None:
+        o.dt = [0.25]
+    o.dt = [dt|units.yr for dt in o.dt]
+    if o.order is None:
+        o.order = ["2"]
+    if o.eta is None:
+        o.eta = [0.]
+    dt_out = o.dt_out
+    if dt_out.number <= 0:
+        dt_out = max(o.dt)
+    for dt in o.dt:
+        ratio = dt_out/dt
+        if abs(ratio - round(ratio)) > 1.e-6*ratio:
+            parser.error(f"--dt {dt} does not divide the output interval "
+                         f"{dt_out}")
+
+    settings = new_settings(o)
+    jobs = [("potential", o.filename, o.t_end, dt_out, si) for si in settings]
+    if o.reference == "pure":
+        print("warning: the errors against Ph4 are mostly the difference "
+              "between its point masses and the Plummer potentials, not "
+              "the time-integration error")
+        jobs.insert(0, ("pure", o.filename, o.t_end, dt_out))
+    else:
+        finest = {"dt": min(o.dt)/4, "order": "6", "eta": 0.,
+                  "kepler": o.kepler}
+        jobs.insert(0, ("reference", o.filename, o.t_end, dt_out, finest))
+
+    runs = []
+    reference = None
+    with multiprocessing.Pool(o.processes) as pool:
+        for job, result in pool.imap_unordered(run, jobs):
+            if job[0] == "potential":
+                runs.append(result)
+                continue
+            reference = result
+            print(f"reference ({o.reference}) in {result['wall']:.3f} s, "
+                  f"dE/E={result['energy_error']:.3e}")
+
+    for ri in runs:
+        ri["error"] = divergence(ri["states"], reference["states"])
+    cost = {"wall": "wall", "pairs": "pair_interactions"}[o.cost]
+    runs.sort(key=lambda ri: ri[cost])
+    pareto_front(runs)
+
+    columns = ["dt", "order", "eta", "kepler", "pair_interactions",
+               "force_evaluations", "wall", "energy_error", "error",
+               "pareto"]
+    print("  dt [yr]      order  eta      kepler  pair interactions  "
+          "wall [s]   |dE/E|      error")
+    with open(o.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["dt_yr"] + columns[1:])
+        for ri in runs:
+            dt = ri["dt"].value_in(units.yr)
+            writer.writerow([dt] + [ri[k] for k in columns[1:]])
+            print(f"{'*' if ri['pareto'] else ' '} {dt:<12.4g} "
+                  f"{ri['order']:<6s} {ri['eta']:<8.3g} {ri['kepler']!s:<7s} "
+                  f"{ri['pair_interactions']:<18d} {ri['wall']:<10.3f} "
+                  f"{ri['energy_error']:<11.3e} {ri['error']:.3e}")
+
+    if o.target > 0:
+        good = [ri for ri in runs if ri["error"] <= o.target]
+        if good:
+            print("cheapest setting within the target error:")
+            print(command_line(o, good[0]))
+        else:
+            print(f"no setting reaches an error of {o.target:g}")
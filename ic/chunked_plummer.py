@@ -0,0 +1,147 @@
+#### CHUNKED_PLUMMER
+####
+#### Plummer spheres of many millions of stars, generated in chunks of
+#### chunk_size stars, so that the memory does not grow with N.
+####
+#### Every chunk is drawn from its own random stream (spawned from one
+#### seed), as new_PlummerModel in make_initial_conditions.py draws the
+#### whole set: Salpeter masses, radii of 0.78 RSun per MSun, and
+#### Plummer positions and velocities (Aarseth, Henon & Wielen 1974) in
+#### units G = M = a = 1.  The first pass accumulates the moments the
+#### scaling needs: total mass, sum of m^2, centre of mass and of
+#### velocity, kinetic energy and the mean-field potential energy
+####   W = 1/2 sum_i m_i Phi(r_i) (1 - sum_i m_i^2/M^2)
+#### with Phi the potential of the Plummer sphere (the expectation of the
+#### pair sum, which would cost O(N^2)).  The second pass draws the same
+#### chunks again, moves them to the centre of mass, scales them to
+#### standard N-body units (W = -1/2, kinetic energy 1/4, as
+#### scale_to_standard) and writes them to a chunked HDF5 file:
+####   mass      (N,)     MSun
+####   radius    (N,)     RSun
+####   position  (N, 3)   pc
+####   velocity  (N, 3)   km/s
+#### read_initial_conditions reads such a file into a particle set one
+#### chunk at a time, and any other file with read_set_from_file; h5py
+#### is imported only for the chunked files.
+####
+
+import numpy as np
+from amuse.datamodel import Particles
+from amuse.units import units
+from amuse.units import nbody_system
+from amuse.lab import read_set_from_file
+
+chunk_size = 2**16
+mass_cutoff = 0.999
+
+def salpeter_masses(rng, n, mass_min=0.1, mass_max=125., alpha=-2.35):
+    # in MSun, as new_salpeter_mass_distribution
+    alpha1 = alpha + 1
+    factor = (mass_max/mass_min)**alpha1 - 1.
+    return mass_min*(1. + factor*rng.random(n))**(1./alpha1)
+
+def isotropic(rng, n):
+    cos_theta = rng.uniform(-1., 1., n)
+    sin_theta = np.sqrt(1 - cos_theta**2)
+    phi = rng.uniform(0., 2*np.pi, n)
+    return np.column_stack([sin_theta*np.cos(phi), sin_theta*np.sin(phi),
+                            cos_theta])
+
+def velocity_ratios(rng, n):
+    # v/v_escape from q^2 (1-q^2)^(7/2), by rejection
+    q = np.empty(0)
+    while len(q) < n:
+        x = rng.uniform(0., 1., n-len(q))
+        y = rng.uniform(0., 0.1, n-len(q))
+        q = np.concatenate([q, x[y < x**2*(1-x**2)**3.5]])
+    return q
+
+def new_chunk(seed, n):
+    rng = np.random.default_rng(seed)
+    mass = salpeter_masses(rng, n)
+    with np.errstate(divide="ignore"):
+        r = 1/np.sqrt(rng.uniform(0., mass_cutoff, n)**(-2./3.) - 1)
+    position = r[:,None]*isotropic(rng, n)
+    v = velocity_ratios(rng, n)*np.sqrt(2.)*(1 + r**2)**(-0.25)
+    velocity = v[:,None]*isotropic(rng, n)
+    return mass, position, velocity
+
+def chunk_seeds(seed, N, size=chunk_size):
+    return np.random.SeedSequence(seed).spawn(-(-N//size))
+
+def moments(seeds, N, size=chunk_size):
+    M = M2 = mx = mv = mv2 = S = 0.
+    for k, seed in enumerate(seeds):
+        mass, position, velocity = new_chunk(seed, min(size, N - k*size))
+        M += mass.sum()
+        M2 += (mass**2).sum()
+        mx = mx + mass @ position
+        mv = mv + mass @ velocity
+        mv2 += mass @ (velocity**2).sum(axis=1)
+        S += mass @ (1/np.sqrt((position**2).sum(axis=1) + 1))
+    return M, M2, mx, mv, mv2, S
+
+def write_plummer_model(filename, N, Rvir, seed=None, size=chunk_size):
+    sequence = np.random.SeedSequence(seed)
+    seeds = sequence.spawn(-(-N//size))
+    M, M2, mx, mv, mv2, S = moments(seeds, N, size)
+
+    # scaling to standard units: masses to a total of 1, positions to a
+    # potential energy of -1/2, velocities to a kinetic energy of 1/4
+    com, vcom = mx/M, mv/M
+    W = -0.5*(S/M)*(1 - M2/M**2)
+    length = W/-0.5
+    T = 0.5*(mv2/M - (vcom**2).sum())
+    speed = np.sqrt(0.25/T)
+
+    converter = nbody_system.nbody_to_si(N|units.MSun, Rvir)
+    pc = converter.to_si(length|nbody_system.length).value_in(units.pc)
+    kms = converter.to_si(speed|nbody_system.speed).value_in(units.kms)
+    import h5py
+    with h5py.File(filename, "w") as f:
+        f.attrs["format"] = "chunked initial conditions"
+        f.attrs["seed"] = str(sequence.entropy)
+        f.attrs["Rvir_pc"] = Rvir.value_in(units.pc)
+        for name, shape, unit in (("mass", (N,), "MSun"),
+                                  ("radius", (N,), "RSun"),
+                                  ("position", (N, 3), "pc"),
+                                  ("velocity", (N, 3), "km/s")):
+            f.create_dataset(name, shape, dtype="f8",
+                             chunks=(min(size, N),) + shape[1:])
+            f[name].attrs["unit"] = unit
+        for k, seed in enumerate(seeds):
+            first = k*size
+            last = min(first + size, N)
+            mass, position, velocity = new_chunk(seed, last-first)
+            f["mass"][first:last] = mass*N/M
+            f["radius"][first:last] = 0.78*mass
+            f["position"][first:last] = (position - com)*pc
+            f["velocity"][first:last] = (velocity - vcom)*kms
+    return N
+
+def is_chunked(filename):
+    try:
+        import h5py
+    except ImportError:
+        return False
+    if not h5py.is_hdf5(filename):
+        return False
+    with h5py.File(filename, "r") as f:
+        return f.attrs.get("format") == "chunked initial conditions"
+
+def read_initial_conditions(filename):
+    if not is_chunked(filename):
+        return read_set_from_file(filename, close_file=True)
+    import h5py
+    with h5py.File(filename, "r") as f:
+        N = len(f["mass"])
+        size = f["mass"].chunks[0] if f["mass"].chunks else chunk_size
+        particles = Particles(N)
+        for first in range(0, N, size):
+            last = min(first + size, N)
+            chunk = particles[first:last]
+            chunk.mass = f["mass"][first:last] | units.MSun
+            chunk.radius = f["radius"][first:last] | units.RSun
+            chunk.position = f["position"][first:last] | units.pc
+            chunk.velocity = f["velocity"][first:last] | units.kms
+    return particles
@@ -10,8 +10,11 @@
 #### Dec 2022, Simon Portegies Zwart
 ####
 
+import numpy
 from amuse.lab import *
 
+from ic.orbital_elements_to_cartesian import orbital_elements_to_cartesian
+
 S_name = ["S1","S2","S4","S5","S6","S8","S9","S12","S13","S14","S17","S18","S19","S21","S24","S27","S29","S31","S33","S38","S66","S67","S71","S83","S87","S96","S97"]
 S_a_arcsec = [0.508,0.123,0.298,0.250,0.436,0.411,0.293,0.308,0.297,0.256,0.311,0.265,0.798,0.213,1.060,0.454,0.397,0.298,0.410,0.139,1.210,1.095,1.061,2.785,1.260,1.545,2.186]
 S_ecc = [0.496,0.880,0.406,0.842,0.886,0.824,0.825,0.900,0.490,0.963,0.364,0.759,0.844,0.784,0.933,0.952,0.916,0.934,0.731,0.802,0.178,0.368,0.844,0.657,0.423,0.131,0.302]
@@ -31,21 +34,17 @@ def initialize_sstars(time, name, a_arcsec, ecc, inc, omra, Omega, tperi, Period
     BH.velocity = (0,0,0) | (units.AU / units.yr)
 
     stars = Particles(len(name))
-    stars.name = "BH    " # reserve space to store the stellar names
-    for si in range(len(name)):
-        S = stars[si]
-        S.name = name[si]
-        S.mass = 20.0 | units.MSun
-        S.radius = 0 |units.RSun
-        a = Rgc * a_arcsec[si] * (1 |units.AU)/(1 | units.parsec)
-        print("a=", a.in_(units.au))
-        from ic.orbital_elements_to_cartesian import orbital_elements_to_pos_and_vel
-        S.position, S.velocity = orbital_elements_to_pos_and_vel(time, a, ecc[si], inc[si], omra[si], Omega[si], tperi[si], Period[si], BH[0].mass, S.mass)
+    stars.name = name
+    stars.mass = 20.0 | units.MSun
+    stars.radius = 0 |units.RSun
+    a = Rgc * numpy.asarray(a_arcsec) * (1 |units.AU)/(1 | units.parsec)
+    print("a=", a.in_(units.au))
+    # the observed angles are in degrees
+    inc, omra, Omega = [numpy.radians(x) for x in (inc, omra, Omega)]
+    stars.position, stars.velocity = orbital_elements_to_cartesian(time, a, ecc, inc, omra, Omega, tperi, Period, BH[0].mass, stars.mass)
     if reverse_time:
-        for i in range(len(Sstars)):
-            stars[i].velocity = -1 * stars[i].velocity
-        for i in range(len(black_hole)):
-            BH[i].velocity = -1 * BH[i].velocity
+        stars.velocity *= -1
+        BH.velocity *= -1
 
     return BH, stars
 
@@ -6,50 +6,73 @@
 ####
 
 from amuse.lab import *
-from math import pi, sin, cos, sqrt, atan2
+from math import pi
 import numpy
 
-#Solve Kepler equation by iterating: M = E - e sin E
-#Lit.: Sterne, T.E., 1960, An introduction to Celestial Mechanics, p. 13-14
+#Solve Kepler equation M = E - e sin E for arrays of mean anomalies
+#and eccentricities (0 <= e < 1) with Halley's method.  The starting
+#guess E = M + 0.85 e sign(sin M) (Danby 1988, Fundamentals of Celestial
+#Mechanics, p. 199) converges in a few iterations up to e -> 1.
+def eccentric_anomalies(mean_anomaly, e, tolerance=1.e-14,
+                        max_iterations=50):
+    mean_anomaly, e = numpy.broadcast_arrays(numpy.asarray(mean_anomaly, float),
+                                             numpy.asarray(e, float))
+    M = numpy.mod(mean_anomaly, 2*pi)
+    E = M + 0.85*e*numpy.sign(numpy.sin(M))
+    active = numpy.arange(E.size)
+    E, M, e = E.ravel(), M.ravel(), e.ravel()
+    for iteration in range(max_iterations):
+        Ea, Ma, ea = E[active], M[active], e[active]
+        esin, ecos = ea*numpy.sin(Ea), ea*numpy.cos(Ea)
+        f = Ea - esin - Ma
+        df = 1 - ecos
+        dE = -f/(df - 0.5*f*esin/df)
+        E[active] = Ea + dE
+        active = active[numpy.abs(dE) > tolerance*(1+numpy.abs(Ea))]
+        if len(active) == 0:
+            break
+    return E.reshape(mean_anomaly.shape)
+
 def eccentric_anomaly(mean_anomaly, e) :
-    ecc_anomaly = mean_anomaly + 2*pi*(e * sin(mean_anomaly) + 0.5*e*e*sin(2*mean_anomaly))
-    m = ecc_anomaly - e*sin(ecc_anomaly)
-    de = (mean_anomaly-m) / (1 - e*cos(ecc_anomaly))
-    ecc_anomaly += de;
-    while de >= 0.001 :
-        m = ecc_anomaly - e*sin(ecc_anomaly)
-        de = (mean_anomaly-m) / (1 - e*cos(ecc_anomaly))
-        ecc_anomaly += de
-    return ecc_anomaly
+    return float(eccentric_anomalies(mean_anomaly, e))
 
-def orbital_elements_to_pos_and_vel(time, a, ecc, inc, omra, omega, tp, P, Mbh, mstar):
+#Cartesian positions and velocities relative to the central mass for
+#arrays of orbital elements (angles in radians, omra the longitude of
+#the ascending node and omega the argument of pericentre)
+def orbital_elements_to_cartesian(time, a, ecc, inc, omra, omega, tp, P,
+                                  Mbh, mstar):
+    mu = (constants.G*(Mbh+mstar)).value_in(units.AU**3/units.yr**2)
+    a = a.value_in(units.AU)
+    MA = 2.*pi*(time-tp).value_in(units.yr)/P.value_in(units.yr)
+    ecc, inc = numpy.asarray(ecc, float), numpy.asarray(inc, float)
+    omra, omega = numpy.asarray(omra, float), numpy.asarray(omega, float)
 
-    mu = constants.G*(Mbh+mstar)   
-    MA = 2.*pi*(time-tp)/P
-    while (MA<0) and (MA>2.*pi): 
-        if MA<0: time = time+P
-        else: time = time-P
-        MA = 2.*pi*(time-tp)/P
-  
-    EA = eccentric_anomaly(MA,ecc)  # eccentric anomaly
-    # true anomaly in the correct quadrant     
-    ta    = 2.*atan2(sqrt(1.+ecc)*sin(EA/2.),sqrt(1.-ecc)*cos(EA/2.))
-    radius = a * (1. - ecc*cos(EA)) # radius from EA and ecc
+    EA = eccentric_anomalies(MA, ecc)
+    # true anomaly in the correct quadrant
+    ta = 2.*numpy.arctan2(numpy.sqrt(1.+ecc)*numpy.sin(EA/2.),
+                          numpy.sqrt(1.-ecc)*numpy.cos(EA/2.))
+    radius = a*(1. - ecc*numpy.cos(EA))
+    cos_O, sin_O = numpy.cos(omra), numpy.sin(omra)
+    cos_u, sin_u = numpy.cos(omega+ta), numpy.sin(omega+ta)
+    cos_i, sin_i = numpy.cos(inc), numpy.sin(inc)
 
-    r = [] | units.AU # Cartesian position
-    r.append(radius*(cos(omra)*cos(omega+ta) - sin(omra)*sin(omega+ta)*cos(inc)))
-    r.append(radius*(sin(omra)*cos(omega+ta) + cos(omra)*sin(omega+ta)*cos(inc)))
-    r.append(radius*(sin(inc)*sin(omega+ta)))
+    r = numpy.stack([radius*(cos_O*cos_u - sin_O*sin_u*cos_i),
+                     radius*(sin_O*cos_u + cos_O*sin_u*cos_i),
+                     radius*(sin_i*sin_u)], axis=-1)
 
-    h = (mu*a*(1. - ecc*ecc)).sqrt()
+    h = numpy.sqrt(mu*a*(1. - ecc*ecc))
     pp = a*(1-ecc*ecc)
+    radial = (h*ecc/radius/pp*numpy.sin(ta))[...,None]
+    v = radial*r - (h/radius)[...,None]*numpy.stack(
+        [cos_O*sin_u + sin_O*cos_u*cos_i,
+         sin_O*sin_u - cos_O*cos_u*cos_i,
+         -sin_i*cos_u], axis=-1)
 
-    v = [] | units.kms # Cartesian velocity
-    v.append(r.x*h*ecc/radius/pp*sin(ta) - h/radius * ( cos(omra)*sin(omega+ta) +sin(omra)*cos(omega+ta)*cos(inc)))
-    v.append(r.y*h*ecc/radius/pp*sin(ta) - h/radius * ( sin(omra)*sin(omega+ta) -cos(omra)*cos(omega+ta)*cos(inc)))
-    v.append(r.z*h*ecc/radius/pp*sin(ta) + h/radius*sin(inc)*cos(omega+ta))
+    return r | units.AU, (v | units.AU/units.yr).in_(units.kms)
 
-    return r, v
+def orbital_elements_to_pos_and_vel(time, a, ecc, inc, omra, omega, tp, P, Mbh, mstar):
+    return orbital_elements_to_cartesian(time, a, ecc, inc, omra, omega,
+                                         tp, P, Mbh, mstar)
 
 def main(T, a, e, i, o, O, t, P, M, m):
     T = T |units.yr
@@ -0,0 +1,139 @@
+#### BLOCK_TIMESTEPS
+####
+#### Hierarchical power-of-two time steps for the potential system,
+#### following the HOLD scheme of Pelupessy, Jänes & Portegies Zwart
+#### (2012, New Astronomy 17, 711).
+####
+#### A step dt of a set of potentials splits the set into the slow ones,
+#### whose time step criterion allows dt, and the fast ones.  The slow
+#### potentials are kicked by the whole set and drifted with dt; the fast
+#### ones are kicked by the slow ones with dt, and are otherwise advanced
+#### recursively by two steps dt/2 of their own subsystem:
+####
+####   K_slow,cross(dt/2)  D_slow(dt) . S_fast(dt/2) S_fast(dt/2)  K_slow,cross(dt/2)
+####
+#### The step is palindromic, hence time symmetric, and only the active
+#### block is kicked at every level.  The time step criterion is taken
+#### per pair, so that a pair with a short time step ends up in the
+#### fast set as a whole and the slow-fast interactions can be kicked
+#### with dt.
+####
+#### At the top level (BlockSteps) the closing kick of a step is held
+#### back until the next step, which applies it before it splits the set
+#### (the time steps are those of the kicked velocities), and then, if
+#### the split is the same, takes its opening kick from the same
+#### accelerations, since the positions have not moved.  Without fast
+#### potentials a step then costs one force evaluation, like the
+#### leapfrog, and the result is the same, bit for bit, as that of
+#### block_step without the merging.  The criterion and the kicks run over blocks of
+#### targets (potentials/kernels.py), so that no (N, N) temporaries are
+#### built.
+####
+
+import numpy as np
+
+from potentials import kernels
+
+def pair_timesteps(system, active, eta):
+    # the smallest of the free-fall and flyby times over all pairs in
+    # the active set, per potential
+    pos = system.pos[active]
+    vel = system.vel[active]
+    mass = system.mass[active]
+    tau2 = np.empty(len(active))
+    for first, last in kernels.blocks(len(active)):
+        dr2 = ((pos[first:last,None,:] - pos[None,:,:])**2).sum(axis=2)
+        dv2 = ((vel[first:last,None,:] - vel[None,:,:])**2).sum(axis=2)
+        mu = mass[first:last,None] + mass[None,:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            free_fall2 = dr2**1.5/mu
+            flyby2 = dr2/dv2
+        block = np.minimum(free_fall2, flyby2)
+        rows = np.arange(last-first)
+        block[rows, first+rows] = np.inf
+        tau2[first:last] = block.min(axis=1)
+    return eta*np.sqrt(tau2)
+
+def _split(system, active, dt, eta, level, max_level):
+    if level < max_level:
+        fast = pair_timesteps(system, active, eta) < dt
+    else:
+        fast = np.zeros(len(active), dtype=bool)
+    return active[~fast], active[fast]
+
+def _accelerations(system, slow, fast, active):
+    # the slow potentials by the whole active set, the fast ones by the
+    # slow ones
+    acc = system.partial_accelerations(slow, active)
+    if len(fast):
+        return acc, system.partial_accelerations(fast, slow)
+    return acc, None
+
+def _kick(system, slow, fast, acc, dt):
+    system.vel[slow] += acc[0]*dt
+    if len(fast):
+        system.vel[fast] += acc[1]*dt
+
+def block_step(system, active, dt, eta, level=0, max_level=30):
+    if len(active) < 2:
+        system.drift_some(active, dt)
+        return
+    slow, fast = _split(system, active, dt, eta, level, max_level)
+
+    if len(slow) == 0:
+        block_step(system, fast, dt/2, eta, level+1, max_level)
+        block_step(system, fast, dt/2, eta, level+1, max_level)
+        return
+
+    _kick(system, slow, fast, _accelerations(system, slow, fast, active),
+          dt/2)
+    system.drift_some(slow, dt)
+    if len(fast):
+        block_step(system, fast, dt/2, eta, level+1, max_level)
+        block_step(system, fast, dt/2, eta, level+1, max_level)
+    _kick(system, slow, fast, _accelerations(system, slow, fast, active),
+          dt/2)
+
+class BlockSteps(object):
+    # top-level block steps, with the closing kick held back in pending
+    # (slow, fast, active, dt) until the next step or flush
+    def __init__(self, system, eta, max_level=30):
+        self.system = system
+        self.eta = eta
+        self.max_level = max_level
+        self.pending = None
+
+    def flush(self):
+        # apply the pending kick, and return its partition and
+        # accelerations
+        if self.pending is None:
+            return None
+        slow, fast, active, dt = self.pending
+        acc = _accelerations(self.system, slow, fast, active)
+        _kick(self.system, slow, fast, acc, dt)
+        self.pending = None
+        return slow, active, acc
+
+    def step(self, active, dt):
+        system = self.system
+        kicked = self.flush()
+        if len(active) < 2:
+            system.drift_some(active, dt)
+            return
+        slow, fast = _split(system, active, dt, self.eta, 0, self.max_level)
+        if len(slow) == 0:
+            block_step(system, fast, dt/2, self.eta, 1, self.max_level)
+            block_step(system, fast, dt/2, self.eta, 1, self.max_level)
+            return
+
+        if (kicked is not None and np.array_equal(slow, kicked[0])
+                and np.array_equal(active, kicked[1])):
+            acc = kicked[2]
+        else:
+            acc = _accelerations(system, slow, fast, active)
+        _kick(system, slow, fast, acc, dt/2)
+        system.drift_some(slow, dt)
+        if len(fast):
+            block_step(system, fast, dt/2, self.eta, 1, self.max_level)
+            block_step(system, fast, dt/2, self.eta, 1, self.max_level)
+        self.pending = (slow, fast, active, dt/2)
@@ -0,0 +1,142 @@
+#### ENCOUNTERS
+####
+#### Collisions and tidal disruptions as a stopping condition, in O(N)
+#### per check on average.  A pair (i, j) has an encounter when its
+#### separation drops below its interaction distance, the larger of
+####   collision_factor (r_i + r_j)
+####   tidal_factor r_l (m_h/m_l)^(1/3)
+#### with l the lighter and h the heavier of the two, so that stars
+#### collide and the SMBH disrupts a star at its tidal radius
+#### (tidal_factor = 0 for collisions only).
+####
+#### The particles are sorted into a uniform grid, rebuilt at every
+#### check, with cells as large as the largest interaction distance of a
+#### pair of ordinary particles; since that bound is max(2 r) or
+#### max(r m^-1/3) max(m^1/3), only the pairs in the same or adjacent
+#### cells are candidates.  The heavy particles (more than heavy_ratio
+#### times the median mass, the SMBH), whose tidal radius would blow up
+#### the cells, are instead checked against all particles, at O(N) each.
+####
+#### EncounterDetector.check(particles) sets the condition, with the
+#### indices of the pairs in i and j (i < j), for the integrators to stop
+#### on (--encounters) or to merge the pairs.
+####
+
+import numpy as np
+from amuse.units import units
+
+# the cell itself and half of its 26 neighbours, so that every pair of
+# cells is visited once
+offsets = np.array([(dx, dy, dz) for dx in (-1, 0, 1)
+                    for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                    if (dx, dy, dz) >= (0, 0, 0)], dtype=np.int64)
+
+def _cells(pos, size):
+    # cell of every particle, with an empty layer around the occupied
+    # ones, and the strides of the cell index; the cells grow until the
+    # index fits in 62 bits
+    while True:
+        cells = np.floor(pos/size).astype(np.int64)
+        cells -= cells.min(axis=0) - 1
+        n = cells.max(axis=0) + 2
+        if np.log2(n.astype(float)).sum() < 62:
+            return cells, np.array([n[1]*n[2], n[2], 1])
+        size *= 2
+
+def grid_pairs(pos, size):
+    # candidate pairs (i < j) in the same or adjacent cells of the grid;
+    # a neighbouring cell is a fixed shift of the index, so that the
+    # lookups run through the sorted indices in order
+    cells, stride = _cells(pos, size)
+    keys = cells @ stride
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    rows = np.arange(len(keys))
+    pairs_i, pairs_j = [], []
+    for offset in offsets:
+        shift = offset @ stride
+        if shift == 0:
+            first = rows + 1
+        else:
+            first = np.searchsorted(keys, keys + shift, "left")
+        count = np.searchsorted(keys, keys + shift, "right") - first
+        p = np.repeat(rows, count)
+        within = np.arange(count.sum()) - np.repeat(np.cumsum(count)-count,
+                                                    count)
+        q = np.repeat(first, count) + within
+        pairs_i.append(order[p])
+        pairs_j.append(order[q])
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+    return np.minimum(i, j), np.maximum(i, j)
+
+class EncounterDetector(object):
+    def __init__(self, collision_factor=1.0, tidal_factor=1.0,
+                 heavy_ratio=1000.):
+        self.collision_factor = collision_factor
+        self.tidal_factor = tidal_factor
+        self.heavy_ratio = heavy_ratio
+        self.i = np.zeros(0, dtype=int)
+        self.j = np.zeros(0, dtype=int)
+
+    def interaction_distance(self, mass, radius, i, j):
+        d = self.collision_factor*(radius[i] + radius[j])
+        if self.tidal_factor > 0:
+            light = np.where(mass[i] < mass[j], i, j)
+            heavy = np.where(mass[i] < mass[j], j, i)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rt = radius[light]*np.cbrt(mass[heavy]/mass[light])
+            rt = np.where(mass[light] > 0, self.tidal_factor*rt, 0.)
+            d = np.maximum(d, rt)
+        return d
+
+    def _cell_size(self, mass, radius):
+        # the largest interaction distance of a pair of these particles
+        size = 2*self.collision_factor*radius.max()
+        if self.tidal_factor > 0:
+            m = mass[mass > 0]
+            if len(m) > 0:
+                a = (radius[mass > 0]/np.cbrt(m)).max()
+                size = max(size, self.tidal_factor*a*np.cbrt(m.max()))
+        return size
+
+    def detect(self, pos, mass, radius):
+        # pairs (i, j), i < j, within their interaction distance, on
+        # unit-free arrays
+        N = len(pos)
+        if N < 2:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        heavy = mass > self.heavy_ratio*np.median(mass)
+        light = np.flatnonzero(~heavy)
+        pairs = []
+        size = self._cell_size(mass[light], radius[light]) if len(light) else 0
+        if len(light) > 1 and size > 0:
+            i, j = grid_pairs(pos[light], size)
+            pairs.append(light[i]*N + light[j])
+        for h in np.flatnonzero(heavy):
+            others = np.delete(np.arange(N), h)
+            i = np.minimum(h, others)
+            j = np.maximum(h, others)
+            pairs.append(i*N + j)
+        if len(pairs) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        code = np.unique(np.concatenate(pairs))
+        i, j = code//N, code%N
+        d2 = ((pos[i] - pos[j])**2).sum(axis=1)
+        close = d2 < self.interaction_distance(mass, radius, i, j)**2
+        return i[close], j[close]
+
+    def check(self, particles):
+        self.i, self.j = self.detect(particles.position.value_in(units.AU),
+                                     particles.mass.value_in(units.MSun),
+                                     particles.radius.value_in(units.AU))
+        return self.is_set()
+
+    def is_set(self):
+        return len(self.i) > 0
+
+    def report(self, particles, model_time):
+        for i, j in zip(self.i, self.j):
+            d = (particles[i].position - particles[j].position).length()
+            print(f"encounter at t={model_time.in_(units.Myr)}: "
+                  f"particles {i} and {j}, separation {d.in_(units.RSun)}")
@@ -0,0 +1,89 @@
+#### ENSEMBLE_SYSTEM
+####
+#### Integrate M independent realizations of a potential system (e.g.
+#### Plummer spheres from make_initial_conditions.py) together, as one
+#### stacked (M, N, 3) state.  Every kick evaluates the forces of all
+#### members in one batched pass of the direct-summation kernels
+#### (potentials/kernels.py), with the parameters of the potentials
+#### shaped (M, 1, N), so that for small N the cost per step is set by M
+#### rather than by the Python overhead per system.
+####
+#### The members share one converter, hence one unit-free time step; the
+#### time integration is that of PotentialSystem with a shared time step
+#### (no tree, block time steps or force gradient).  Energies and the
+#### state are kept per member; synchronize_members writes every
+#### member back to its own particle set.
+####
+
+import numpy as np
+from amuse.units import nbody_system
+
+from potentials import kernels
+from integrator.potential_system import PotentialSystem
+from integrator.symplectic import LEAPFROG
+from diagnostics.conserved_quantities import conserved_quantities
+
+class EnsembleSystem(PotentialSystem):
+    def __init__(self, converter, potential=None, timestep=None,
+                 method=LEAPFROG):
+        PotentialSystem.__init__(self, converter, potential, timestep,
+                                 method=method)
+        self.members = []
+
+    def add_members(self, members):
+        N = len(members[0])
+        if any(len(mi) != N for mi in members):
+            raise ValueError("the members of an ensemble need the same "
+                             "number of particles")
+        self.members = list(members)
+        self.commit_particles()
+
+    def commit_particles(self):
+        def stack(attribute, unit):
+            return np.array([self._to_nbody(getattr(mi, attribute), unit)
+                             for mi in self.members])
+        self.pos = stack("position", nbody_system.length)
+        self.vel = stack("velocity", nbody_system.speed)
+        self.mass = stack("mass", nbody_system.mass)
+        self.radius = stack("radius", nbody_system.length)
+
+        self._nbody_potential = self.potential.as_nbody(self.converter)
+        eps2 = self._nbody_potential.epsilon2
+        self._nbody_potential.set_parameters(self.mass[:,None,:],
+                                             self.radius[:,None,:], eps2)
+
+    def synchronize_particles(self):
+        # copying M particle sets at the end of every evolve_model costs
+        # more than the step of a small-N ensemble, so the members are
+        # only updated on request
+        pass
+
+    def synchronize_members(self):
+        for mi, pos, vel in zip(self.members, self.pos, self.vel):
+            mi.position = self._to_si(pos, nbody_system.length)
+            mi.velocity = self._to_si(vel, nbody_system.speed)
+
+    def accelerations(self, pos):
+        self.force_evaluations += 1
+        M, N = self.mass.shape
+        self.pair_interactions += M*N*(N-1)
+        acc = np.empty_like(pos)
+        for first, last in kernels.blocks(N, M):
+            acc[:,first:last] = kernels.accelerations(self._nbody_potential,
+                                                      pos, first, last)
+        return acc
+
+    def force_gradient(self, pos, acc):
+        raise ValueError("the ensemble has no force-gradient integrator")
+
+    @property
+    def kinetic_energy(self):
+        Ek = 0.5*(self.mass*(self.vel**2).sum(axis=-1)).sum(axis=-1)
+        return self._to_si(Ek, nbody_system.energy)
+
+    @property
+    def potential_energy(self):
+        # per member
+        Ek, Ep, P, L = conserved_quantities(self._nbody_potential,
+                                            self.pos, self.vel, self.mass)
+        return self._to_si(Ep, nbody_system.energy)
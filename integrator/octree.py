@@ -0,0 +1,191 @@
+#### OCTREE
+####
+#### Barnes-Hut force evaluation for a set of softened point-mass
+#### potentials, G m/(r^2+s^2)^(1/2) (see Potential.get_point_mass_form).
+####
+#### The tree is built from Morton keys: the particles are sorted along
+#### the key, so that every cell holds a contiguous range of particles,
+#### and the cells of one level are the runs of equal key prefix.  Each
+#### cell carries its monopole and quadrupole moment about its centre
+#### of mass.  The walk is done for all targets at once, one level at a
+#### time, on flat (target, cell) interaction lists: a cell is accepted
+#### when it does not hold the target and its distance exceeds
+#### size/theta (plus the offset of the centre of mass from the
+#### geometric centre), opened into its children otherwise, and summed
+#### directly when it is a leaf.  Build and walk
+#### cost O(N log N) in array operations.
+####
+#### The tree keeps no state between kicks; it is rebuilt for each one.
+####
+
+import numpy as np
+
+def _ranges(start, count):
+    # concatenated np.arange(s, s+c) for all (s, c), and the offsets of
+    # each range within the concatenation
+    offset = np.cumsum(count) - count
+    index = np.arange(count.sum()) - np.repeat(offset - start, count)
+    return index, offset
+
+def _sum_ranges(values, offset):
+    # sums over consecutive ranges of values starting at offset
+    return np.add.reduceat(values, offset, axis=0)
+
+class Octree(object):
+    # bits per dimension of the Morton key; 3*16 bits fit in an int64
+    max_level = 16
+    chunk_size = 1024
+
+    def __init__(self, theta=0.5, leaf_size=8):
+        self.theta = theta
+        self.leaf_size = leaf_size
+
+    def _morton_keys(self, pos):
+        self.lo = pos.min(axis=0)
+        size = (pos.max(axis=0) - self.lo).max()
+        if size == 0:
+            size = 1.
+        self.size = size * (1. + 1.e-12)
+        n = 2**self.max_level
+        cell = np.minimum((n*(pos-self.lo)/self.size).astype(np.int64), n-1)
+        keys = np.zeros(len(pos), dtype=np.int64)
+        for bit in range(self.max_level):
+            for k in range(3):
+                keys |= ((cell[:,k] >> bit) & 1) << (3*bit + 2-k)
+        return keys
+
+    def build(self, pos, gm, eps2):
+        N = len(pos)
+        keys = self._morton_keys(pos)
+        self.order = np.argsort(keys, kind="stable")
+        self.pos = pos[self.order]
+        self.gm = gm[self.order]
+        self.eps2 = np.broadcast_to(eps2, (N,))[self.order]
+        keys = keys[self.order]
+
+        # the cells, level by level; the children of a cell that holds
+        # more than leaf_size particles are the runs of equal key prefix
+        start = [np.array([0])]
+        count = [np.array([N])]
+        level = [np.zeros(1, dtype=int)]
+        parent = [np.array([-1])]
+        n_cells = 1
+        for l in range(1, self.max_level+1):
+            is_open = count[-1] > self.leaf_size
+            if not is_open.any():
+                break
+            index, _ = _ranges(start[-1][is_open], count[-1][is_open])
+            prefix = keys[index] >> (3*(self.max_level-l))
+            owner = np.repeat(np.nonzero(is_open)[0], count[-1][is_open])
+            new = np.ones(len(index), dtype=bool)
+            new[1:] = (prefix[1:] != prefix[:-1]) | (owner[1:] != owner[:-1])
+            first = np.nonzero(new)[0]
+            start.append(index[first])
+            count.append(np.diff(np.append(first, len(index))))
+            level.append(np.full(len(first), l))
+            parent.append(owner[first] + n_cells - len(is_open))
+            n_cells += len(first)
+        self.start = np.concatenate(start)
+        self.count = np.concatenate(count)
+        self.level = np.concatenate(level)
+        parent = np.concatenate(parent)
+
+        # children of a cell are contiguous, since cells are created in
+        # the order of their parents
+        self.first_child = np.full(n_cells, -1)
+        self.n_children = np.zeros(n_cells, dtype=int)
+        cells, first, number = np.unique(parent[1:], return_index=True,
+                                         return_counts=True)
+        self.first_child[cells] = first + 1
+        self.n_children[cells] = number
+        self._moments()
+        return self
+
+    def _moments(self):
+        index, offset = _ranges(self.start, self.count)
+        gm = self.gm[index]
+        x = self.pos[index]
+        self.mass = _sum_ranges(gm, offset)
+        self.com = _sum_ranges(gm[:,None]*x, offset)/self.mass[:,None]
+        self.cell_eps2 = _sum_ranges(gm*self.eps2[index], offset)/self.mass
+        d = x - np.repeat(self.com, self.count, axis=0)
+        d2 = (d**2).sum(axis=1)
+        # traceless quadrupole as (xx, yy, zz, xy, xz, yz)
+        q = np.column_stack((3*d[:,0]**2 - d2, 3*d[:,1]**2 - d2,
+                             3*d[:,2]**2 - d2, 3*d[:,0]*d[:,1],
+                             3*d[:,0]*d[:,2], 3*d[:,1]*d[:,2]))
+        self.quadrupole = _sum_ranges(gm[:,None]*q, offset)
+
+        # cell size, and the offset of the centre of mass from the centre
+        self.cell_size = self.size/2.**self.level
+        corner = np.floor((self.pos[self.start]-self.lo)
+                          / self.cell_size[:,None])
+        centre = self.lo + (corner+0.5)*self.cell_size[:,None]
+        self.delta = np.sqrt(((self.com-centre)**2).sum(axis=1))
+
+    def _accumulate(self, acc, target, a):
+        for k in range(3):
+            acc[:,k] += np.bincount(target, weights=a[:,k],
+                                    minlength=len(acc))
+
+    def _multipole(self, d, cell):
+        x, y, z = d[:,0], d[:,1], d[:,2]
+        r2 = x*x + y*y + z*z + self.cell_eps2[cell]
+        r3 = r2*np.sqrt(r2)
+        r5 = r3*r2
+        Q = self.quadrupole[cell].T
+        Qx = Q[0]*x + Q[3]*y + Q[4]*z
+        Qy = Q[3]*x + Q[1]*y + Q[5]*z
+        Qz = Q[4]*x + Q[5]*y + Q[2]*z
+        f = (-self.mass[cell] - 2.5*(x*Qx + y*Qy + z*Qz)/(r2*r2))/r3
+        a = np.empty_like(d)
+        a[:,0] = f*x + Qx/r5
+        a[:,1] = f*y + Qy/r5
+        a[:,2] = f*z + Qz/r5
+        return a
+
+    def _direct(self, target, cell):
+        index, _ = _ranges(self.start[cell], self.count[cell])
+        target = np.repeat(target, self.count[cell])
+        keep = index != target
+        target, index = target[keep], index[keep]
+        d = self.pos[target] - self.pos[index]
+        r2 = (d**2).sum(axis=1) + self.eps2[index]
+        a = (-self.gm[index]/(r2*np.sqrt(r2)))[:,None]*d
+        return target, a
+
+    def accelerations(self):
+        # accelerations of the particles the tree was built from; the
+        # targets are walked in chunks, which are compact in space since
+        # the particles are in key order, to bound the interaction lists
+        N = len(self.pos)
+        acc = np.zeros((N, 3))
+        for first in range(0, N, self.chunk_size):
+            targets = np.arange(first, min(first+self.chunk_size, N))
+            self._walk(acc, targets)
+        result = np.empty_like(acc)
+        result[self.order] = acc
+        return result
+
+    def _walk(self, acc, target):
+        cell = np.zeros(len(target), dtype=int)
+        while len(target):
+            d = self.pos[target] - self.com[cell]
+            r = np.sqrt((d**2).sum(axis=1))
+            # a cell that holds the target is always opened, or the
+            # target would pull on itself through the multipole
+            inside = ((target >= self.start[cell])
+                      & (target < self.start[cell] + self.count[cell]))
+            accept = ~inside & (r > self.cell_size[cell]/self.theta
+                                + self.delta[cell])
+            leaf = ~accept & (self.n_children[cell] == 0)
+            split = ~(accept | leaf)
+
+            self._accumulate(acc, target[accept],
+                             self._multipole(d[accept], cell[accept]))
+            self._accumulate(acc, *self._direct(target[leaf], cell[leaf]))
+
+            children = self.n_children[cell[split]]
+            index, _ = _ranges(self.first_child[cell[split]], children)
+            target = np.repeat(target[split], children)
+            cell = index
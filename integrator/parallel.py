@@ -0,0 +1,77 @@
+#### PARALLEL
+####
+#### Direct-summation forces of the potential system on a pool of
+#### worker processes.
+####
+#### Positions, masses, radii and the resulting accelerations live in
+#### shared memory (multiprocessing.shared_memory), so that a kick only
+#### copies the positions in and the accelerations out; nothing is
+#### pickled per step except the block boundaries.  The workers run the
+#### same kernel on the same blocks as the serial path (potentials/
+#### kernels.py), with the kernel backend of the parent, so the result
+#### is identical bit for bit.
+####
+
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+
+from potentials import kernels
+
+def _shared_array(shape, buffer=None):
+    size = max(8*int(np.prod(shape)), 8)
+    if buffer is None:
+        buffer = shared_memory.SharedMemory(create=True, size=size)
+    return buffer, np.ndarray(shape, dtype=np.float64, buffer=buffer.buf)
+
+# state of a worker process, attached once by _attach
+_worker = {}
+
+def _attach(names, N, potential_type, G, eps2, backend):
+    kernels.set_backend(backend)
+    for name, shape in (("pos", (N, 3)), ("acc", (N, 3)),
+                        ("mass", (N,)), ("radius", (N,))):
+        buffer = shared_memory.SharedMemory(name=names[name])
+        _worker[name+"_buffer"], _worker[name] = _shared_array(shape, buffer)
+    potential = potential_type()
+    potential.G = G
+    potential.set_parameters(_worker["mass"], _worker["radius"], eps2)
+    _worker["potential"] = potential
+
+def _accelerations(block):
+    first, last = block
+    _worker["acc"][first:last] = kernels.accelerations(_worker["potential"],
+                                                       _worker["pos"],
+                                                       first, last)
+
+class ParallelForces(object):
+    def __init__(self, workers, potential, mass, radius):
+        # potential is the unit-free potential of the system
+        N = len(mass)
+        self.buffers = {}
+        self.arrays = {}
+        for name, shape in (("pos", (N, 3)), ("acc", (N, 3)),
+                            ("mass", (N,)), ("radius", (N,))):
+            self.buffers[name], self.arrays[name] = _shared_array(shape)
+        self.arrays["mass"][:] = mass
+        self.arrays["radius"][:] = radius
+        names = {name: b.name for name, b in self.buffers.items()}
+        self.blocks = kernels.blocks(N, fused=kernels.fused(
+            potential, self.arrays["pos"]))
+        self.pool = Pool(workers, initializer=_attach,
+                         initargs=(names, N, type(potential), potential.G,
+                                   potential.epsilon2, kernels.backend))
+
+    def accelerations(self, pos):
+        self.arrays["pos"][:] = pos
+        self.pool.map(_accelerations, self.blocks, chunksize=1)
+        return self.arrays["acc"].copy()
+
+    def stop(self):
+        self.pool.close()
+        self.pool.join()
+        self.arrays = {}
+        for buffer in self.buffers.values():
+            buffer.close()
+            buffer.unlink()
+        self.buffers = {}
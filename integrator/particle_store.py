@@ -0,0 +1,124 @@
+#### PARTICLE_STORE
+####
+#### One struct-of-arrays store (position, velocity, mass, radius, with
+#### units) for the potentials that gravity_potential.py couples with
+#### bridge.  Every CompositeGravityCode refers to its row of the store
+#### by index, and its particle set is a view of that row: an AMUSE
+#### Particles on a StoreView storage, which reads and writes the shared
+#### arrays in place.  Nothing is copied between the codes and the
+#### store, and the particles of the run are brought up to date with one
+#### bulk copy per step (new_channel_to).
+####
+#### The views are made on request, so that a code only holds the store
+#### and its index.  A view has a fixed single particle: it can not add
+#### or remove particles, nor new attributes.
+####
+
+import numpy as np
+from amuse.datamodel import Particles
+from amuse.datamodel.base import AttributeStorage
+
+# attribute -> (array of the store, component)
+columns = {"x": ("position", 0), "y": ("position", 1), "z": ("position", 2),
+           "vx": ("velocity", 0), "vy": ("velocity", 1), "vz": ("velocity", 2),
+           "mass": ("mass", None), "radius": ("radius", None)}
+
+class ParticleStore(object):
+    def __init__(self, particles):
+        self.keys = particles.key.copy()
+        self.position = particles.position.copy()
+        self.velocity = particles.velocity.copy()
+        self.mass = particles.mass.copy()
+        self.radius = particles.radius.copy()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def view(self, index):
+        return Particles(storage=StoreView(self, index))
+
+    def new_channel_to(self, particles):
+        return StoreChannel(self, particles)
+
+class StoreChannel(object):
+    # bulk copy of the store to the particles it was made from (in the
+    # same order)
+    def __init__(self, store, particles):
+        self.store = store
+        self.particles = particles
+
+    def copy(self):
+        self.particles.position = self.store.position
+        self.particles.velocity = self.store.velocity
+
+class StoreView(AttributeStorage):
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def _rows(self, indices):
+        rows = np.arange(self.index, self.index+1)
+        if indices is None:
+            return rows
+        return rows[indices]
+
+    def _get(self, rows, attribute):
+        if attribute not in columns:
+            raise AttributeError(f'"{attribute}" not defined in the store')
+        name, component = columns[attribute]
+        values = getattr(self.store, name)
+        if component is None:
+            return values[rows]
+        return values[rows, component]
+
+    def get_values_in_store(self, indices, attributes):
+        rows = self._rows(indices)
+        return [self._get(rows, attribute) for attribute in attributes]
+
+    def get_value_in_store(self, index, attribute):
+        return self._get(self.index + index, attribute)
+
+    def set_values_in_store(self, indices, attributes, list_of_values_to_set):
+        rows = self._rows(indices)
+        for attribute, values in zip(attributes, list_of_values_to_set):
+            if attribute not in columns:
+                raise AttributeError(f'"{attribute}" can not be added to '
+                                     'a view of the store')
+            name, component = columns[attribute]
+            if component is None:
+                getattr(self.store, name)[rows] = values
+            else:
+                getattr(self.store, name)[rows, component] = values
+
+    def add_particles_to_store(self, keys, attributes=[], values=[]):
+        raise ValueError("a view of the store has a fixed particle")
+
+    def remove_particles_from_store(self, keys):
+        raise ValueError("a view of the store has a fixed particle")
+
+    def can_extend_attributes(self):
+        return False
+
+    def has_key_in_store(self, key):
+        return key == self.store.keys[self.index]
+
+    def get_all_keys_in_store(self):
+        return self.store.keys[self.index:self.index+1]
+
+    def get_all_indices_in_store(self):
+        return np.arange(1)
+
+    def get_indices_of(self, keys):
+        keys = np.asarray(keys)
+        if np.any(keys != self.store.keys[self.index]):
+            raise KeyError("key not in this view of the store")
+        return np.zeros(keys.shape, dtype=int)
+
+    def __len__(self):
+        return 1
+
+    def get_defined_attribute_names(self):
+        return sorted(columns)
+
+    def get_defined_settable_attribute_names(self):
+        return sorted(columns)
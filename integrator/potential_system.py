@@ -0,0 +1,307 @@
+#### POTENTIAL_SYSTEM
+####
+#### Couple N potentials into a single gravity code.
+####
+#### Rather than bridging every potential with every other potential
+#### (N(N-1) codes, each kicking a single particle), the parameters of
+#### all potentials are kept as arrays in one potential instance.  The
+#### mutual accelerations then follow from one vectorized evaluation
+#### over all ordered pairs (i, j), i != j, per kick.  By default the
+#### time integration is the same joined kick-drift-kick leapfrog as
+#### bridge.Bridge; higher-order compositions are taken from
+#### integrator/symplectic.py.  Consecutive kicks (the last of one step
+#### and the first of the next) are merged into one force evaluation.
+#### The direct sum runs over blocks of targets (potentials/kernels.py),
+#### serially or, with workers > 1, on a pool of processes that share the
+#### particle arrays (integrator/parallel.py).
+#### With eta > 0 every potential instead gets its own power-of-two time
+#### step (integrator/block_timesteps.py).  With kepler=True the orbits
+#### around the most massive potential are drifted analytically and only
+#### the other interactions are kicked (integrator/wisdom_holman.py).
+#### With regularize=True close binaries are detected at every step and
+#### advanced as Kepler orbits, so that the step need not resolve them
+#### (integrator/regularization.py).
+####
+#### With an opening angle theta > 0 the accelerations are taken from a
+#### Barnes-Hut tree (integrator/octree.py) rebuilt at every kick, which
+#### costs O(N log N) instead of O(N^2); this requires potentials of the
+#### softened point-mass form (Plummer, point particle).
+####
+#### Internally the system runs on plain float64 arrays in N-body units
+#### (G=1), obtained once from the converter in commit_particles.  Units
+#### are only attached again when the state is copied back to
+#### self.particles at the end of evolve_model, or when energies or the
+#### field at external points are requested.
+####
+
+import numpy as np
+from amuse.datamodel import Particles
+from amuse.units import units
+from amuse.units import nbody_system
+
+from potentials.plummer_potential import PlummerPotential
+from potentials import kernels
+from integrator.octree import Octree
+from integrator.symplectic import LEAPFROG
+from integrator.block_timesteps import BlockSteps
+from integrator.wisdom_holman import WisdomHolman
+from integrator.regularization import Regularization
+from integrator.parallel import ParallelForces
+from diagnostics.conserved_quantities import conserved_quantities
+
+class PotentialSystem(object):
+    def __init__(self, converter, potential=None, timestep=None, theta=0,
+                 method=LEAPFROG, eta=0, workers=1, kepler=False,
+                 regularize=False):
+        if potential is None:
+            potential = PlummerPotential()
+        self.model_time = 0 | units.Myr
+        self.particles = Particles()
+        self.converter = converter
+        self.potential = potential
+        self.timestep = timestep
+        self.theta = theta
+        self.method = method
+        self.eta = eta
+        self.workers = workers
+        self.kepler = kepler
+        self.regularize = regularize
+        if kepler and (eta > 0 or theta > 0):
+            raise ValueError("the Kepler drift runs with a shared time step "
+                             "and direct summation")
+        if regularize and (eta > 0 or theta > 0 or kepler):
+            raise ValueError("regularization runs with a shared time step "
+                             "and direct summation, without the Kepler drift")
+        if eta > 0 and (method is not LEAPFROG or theta > 0 or workers > 1):
+            raise ValueError("block time steps are second order, with "
+                             "serial direct summation")
+        self.regularized_pairs = np.zeros((0, 2), dtype=int)
+        self.parallel = None
+        self.force_evaluations = 0
+        self.pair_interactions = 0
+
+    def add_particles(self, particles):
+        self.particles.add_particles(particles)
+        self.commit_particles()
+
+    def add_particle(self, particle):
+        self.add_particles(particle.as_set())
+
+    def _to_nbody(self, quantity, unit):
+        return self.converter.to_nbody(quantity).value_in(unit)
+
+    def _to_si(self, value, unit):
+        return self.converter.to_si(value | unit)
+
+    def commit_particles(self):
+        # read the state from self.particles, once, into N-body units
+        p = self.particles
+        self.pos = self._to_nbody(p.position, nbody_system.length)
+        self.vel = self._to_nbody(p.velocity, nbody_system.speed)
+        self.mass = self._to_nbody(p.mass, nbody_system.mass)
+        self.radius = self._to_nbody(p.radius, nbody_system.length)
+
+        # one potential holding the parameters of every source
+        self._nbody_potential = self.potential.as_nbody(self.converter)
+        eps2 = self._nbody_potential.epsilon2
+        self._nbody_potential.set_parameters(self.mass, self.radius, eps2)
+        if self.parallel is not None:
+            self.parallel.stop()
+            self.parallel = None
+        if self.workers > 1:
+            self.parallel = ParallelForces(self.workers,
+                                           self._nbody_potential,
+                                           self.mass, self.radius)
+
+    def synchronize_particles(self):
+        self.particles.position = self._to_si(self.pos, nbody_system.length)
+        self.particles.velocity = self._to_si(self.vel, nbody_system.speed)
+
+    def accelerations(self, pos):
+        self.force_evaluations += 1
+        if len(pos) < 2:
+            return np.zeros_like(pos)
+        if self.theta > 0:
+            return self.tree_accelerations(pos)
+        return self.direct_accelerations(pos)
+
+    def tree_accelerations(self, pos):
+        gm, eps2 = self._nbody_potential.get_point_mass_form()
+        return Octree(self.theta).build(pos, gm, eps2).accelerations()
+
+    def direct_accelerations(self, pos):
+        N = len(pos)
+        self.pair_interactions += N*(N-1)
+        if self.parallel is not None:
+            return self.parallel.accelerations(pos)
+        acc = np.empty_like(pos)
+        for first, last in kernels.blocks(N, fused=kernels.fused(
+                self._nbody_potential, pos)):
+            acc[first:last] = kernels.accelerations(self._nbody_potential,
+                                                    pos, first, last)
+        return acc
+
+    def force_gradient(self, pos, acc):
+        # J.acc, with J the Jacobian of the accelerations: the jerk of
+        # every pair for a relative velocity acc_i - acc_j, over the same
+        # blocks of targets as the accelerations
+        if self.theta > 0 or not self.potential.analytic_gravity:
+            raise ValueError("the force gradient requires direct summation "
+                             "over potentials with an analytic gravity")
+        self.force_evaluations += 1
+        gradient = np.empty_like(pos)
+        for first, last in kernels.blocks(len(pos)):
+            gradient[first:last] = kernels.jerks(self._nbody_potential,
+                                                 pos, acc, first, last)
+        return gradient
+
+    def _nbody_source_potential(self, sources):
+        potential = type(self.potential)()
+        potential.G = self._nbody_potential.G
+        potential.set_parameters(self.mass[sources], self.radius[sources],
+                                 self._nbody_potential.epsilon2)
+        return potential
+
+    def partial_accelerations(self, targets, sources):
+        # accelerations of the targets due to the sources (index arrays
+        # without repeats), over blocks of targets
+        self.force_evaluations += 1
+        self.pair_interactions += (len(targets)*len(sources)
+                                   - len(np.intersect1d(targets, sources)))
+        potential = self._nbody_source_potential(sources)
+        acc = np.empty((len(targets), 3))
+        for first, last in kernels.blocks(len(targets),
+                                          sources=len(sources)):
+            block = targets[first:last]
+            d = self.pos[block,None,:] - self.pos[None,sources,:]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                a = potential.get_gravity_at_point(potential.epsilon2,
+                                                   d[...,0], d[...,1],
+                                                   d[...,2])
+            itself = block[:,None] == sources[None,:]
+            acc[first:last] = np.column_stack(
+                [np.where(itself, 0, ai).sum(axis=1) for ai in a])
+        return acc
+
+    def kick_some(self, targets, sources, dt):
+        self.vel[targets] += self.partial_accelerations(targets, sources)*dt
+
+    def drift_some(self, particles, dt):
+        self.pos[particles] += self.vel[particles]*dt
+
+    def kick(self, dt, gradient=0.):
+        # v += a dt + gradient J.a
+        acc = self.accelerations(self.pos)
+        self.vel += acc*dt
+        if gradient:
+            self.vel += self.force_gradient(self.pos, acc)*gradient
+
+    def drift(self, dt):
+        self.pos += self.vel*dt
+
+    def evolve_model(self, model_time):
+        timestep = self.timestep
+        if timestep is None:
+            timestep = model_time - self.model_time
+        time = self._to_nbody(self.model_time, nbody_system.time)
+        tend = self._to_nbody(model_time, nbody_system.time)
+        dt = self._to_nbody(timestep, nbody_system.time)
+
+        evolve_kick, evolve_drift = self.kick, self.drift
+        if self.kepler:
+            wisdom_holman = WisdomHolman(self)
+            wisdom_holman.enter()
+            evolve_kick, evolve_drift = wisdom_holman.kick, wisdom_holman.drift
+        if self.regularize:
+            regularization = Regularization(self)
+            evolve_kick, evolve_drift = regularization.kick, regularization.drift
+
+        # kicks are only applied when the positions are about to change,
+        # so that consecutive kicks share one force evaluation
+        pending = [0., 0.]
+        def kick(dt, gradient=0.):
+            pending[0] += dt
+            pending[1] += gradient
+        def apply_kicks():
+            if pending[0] or pending[1]:
+                evolve_kick(*pending)
+            pending[:] = [0., 0.]
+        def drift(dt):
+            apply_kicks()
+            evolve_drift(dt)
+
+        if self.eta > 0:
+            block_steps = BlockSteps(self, self.eta)
+
+        while time < (tend - dt/2.):
+            if self.regularize:
+                # a kick still pending belongs to the split of the
+                # previous pairs
+                pairs = regularization.detect(dt)
+                if not np.array_equal(pairs, regularization.pairs):
+                    apply_kicks()
+                    regularization.pairs = pairs
+            if self.eta > 0:
+                block_steps.step(np.arange(len(self.mass)), dt)
+            else:
+                self.method(kick, drift, dt)
+            time += dt
+        apply_kicks()
+        if self.eta > 0:
+            block_steps.flush()
+        if self.kepler:
+            wisdom_holman.leave()
+        if self.regularize:
+            self.regularized_pairs = regularization.pairs
+        self.model_time = self._to_si(time, nbody_system.time)
+        self.synchronize_particles()
+
+    def get_state(self):
+        # the complete state, for a checkpoint: the unit-free arrays are
+        # kept as they are, so that a restart continues bit for bit
+        return {"pos": self.pos.copy(), "vel": self.vel.copy(),
+                "model_time": self.model_time}
+
+    def set_state(self, state):
+        self.pos[:] = state["pos"]
+        self.vel[:] = state["vel"]
+        self.model_time = state["model_time"]
+        self.synchronize_particles()
+
+    @property
+    def kinetic_energy(self):
+        Ek = 0.5*(self.mass*(self.vel**2).sum(axis=1)).sum()
+        return self._to_si(Ek, nbody_system.energy)
+
+    @property
+    def potential_energy(self):
+        if len(self.mass) < 2:
+            return 0 | units.erg
+        Ek, Ep, P, L = conserved_quantities(self._nbody_potential,
+                                            self.pos, self.vel, self.mass)
+        return self._to_si(Ep, nbody_system.energy)
+
+    def _offsets(self, x, y, z):
+        # (points, sources) separations from every source to every point
+        x = self._to_nbody(x, nbody_system.length).reshape((-1, 1))
+        y = self._to_nbody(y, nbody_system.length).reshape((-1, 1))
+        z = self._to_nbody(z, nbody_system.length).reshape((-1, 1))
+        return x-self.pos[:,0], y-self.pos[:,1], z-self.pos[:,2]
+
+    def get_potential_at_point(self, eps, x, y, z):
+        dx, dy, dz = self._offsets(x, y, z)
+        phi = self._nbody_potential.get_potential_at_point(eps, dx, dy, dz)
+        return self._to_si(phi.sum(axis=1), nbody_system.potential)
+
+    def get_gravity_at_point(self, eps, x, y, z):
+        dx, dy, dz = self._offsets(x, y, z)
+        a = self._nbody_potential.get_gravity_at_point(eps, dx, dy, dz)
+        return [self._to_si(ai.sum(axis=1), nbody_system.acceleration)
+                for ai in a]
+
+    def stop(self):
+        if self.parallel is not None:
+            self.parallel.stop()
+            self.parallel = None
+        self.potential.stop()
+        return
@@ -0,0 +1,126 @@
+#### REGULARIZATION
+####
+#### Close binaries in the potential system, advanced as Kepler orbits,
+#### so that the shared time step does not have to resolve them.
+####
+#### At the start of every step the tight pairs are detected: mutual
+#### nearest neighbours on a bound orbit with a period shorter than
+#### steps_per_orbit time steps, whose nearest third potential raises a
+#### tidal perturbation, 2 (m_3/m_pair) (apocentre/d_3)^3, below
+#### max_perturbation, and whose pericentre lies well outside the
+#### softening (softening_ratio times s, so that the softened force is
+#### close to a point mass over the whole orbit).  For these pairs the
+#### Hamiltonian is split, as in the Wisdom-Holman drift
+#### (integrator/wisdom_holman.py), into
+####   H_drift  the free motion of every other potential and, per pair,
+####            that of its centre of mass plus the Kepler motion of the
+####            relative orbit (advanced exactly with kepler_drift)
+####   H_kick   all forces minus the Kepler point-mass force of every
+####            pair (which leaves the tidal forces on the pairs and the
+####            difference between the pair potentials and point masses)
+#### The other potentials feel both members of a pair as before; only
+#### the internal motion of the pair is taken out of the kicks.  Without
+#### tight pairs a step is the same as without regularization.  A pair
+#### is released as soon as it fails the criteria at the start of a step.
+####
+#### The potentials have to be of the softened point-mass form, and the
+#### system has to run with a shared time step and direct summation.
+####
+
+import numpy as np
+
+from integrator.wisdom_holman import kepler_drift
+
+steps_per_orbit = 32
+max_perturbation = 1.e-3
+softening_ratio = 10.
+
+def neighbours(pos, block_size=256):
+    # the nearest and the next-nearest neighbour of every particle, and
+    # the squared distances to them, in blocks of targets
+    N = len(pos)
+    nearest = np.empty((N, 2), dtype=int)
+    r2 = np.empty((N, 2))
+    for first in range(0, N, block_size):
+        last = min(first+block_size, N)
+        d2 = ((pos[first:last,None,:] - pos[None,:,:])**2).sum(axis=-1)
+        d2[np.arange(last-first), np.arange(first, last)] = np.inf
+        k = np.argpartition(d2, 1, axis=1)[:,:2]
+        dk = np.take_along_axis(d2, k, axis=1)
+        order = np.argsort(dk, axis=1)
+        nearest[first:last] = np.take_along_axis(k, order, axis=1)
+        r2[first:last] = np.take_along_axis(dk, order, axis=1)
+    return nearest, r2
+
+class Regularization(object):
+    def __init__(self, system):
+        self.system = system
+        N = len(system.mass)
+        gm, s2 = system._nbody_potential.get_point_mass_form()
+        self.gm = np.broadcast_to(gm, (N,)).astype(float)
+        self.s2 = np.broadcast_to(s2, (N,)).astype(float)
+        self.pairs = np.zeros((0, 2), dtype=int)
+
+    def detect(self, dt):
+        # (n, 2) array of the tight pairs (i < j)
+        s = self.system
+        N = len(s.mass)
+        if N < 2:
+            return np.zeros((0, 2), dtype=int)
+        nearest, r2 = neighbours(s.pos)
+        i = np.arange(N)
+        j = nearest[:,0]
+        mutual = (nearest[j,0] == i) & (i < j)
+        i, j = i[mutual], j[mutual]
+
+        r = s.pos[i] - s.pos[j]
+        v = s.vel[i] - s.vel[j]
+        gm = self.gm[i] + self.gm[j]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            energy = 0.5*(v**2).sum(axis=1) - gm/np.sqrt((r**2).sum(axis=1))
+            bound = energy < 0
+            a = np.where(bound, -gm/(2*energy), np.inf)
+            h2 = (np.cross(r, v)**2).sum(axis=1)
+            e = np.sqrt(np.maximum(0., 1 - h2/(gm*a)))
+            period = 2*np.pi*np.sqrt(a**3/gm)
+
+            # the nearest third potential, seen from either member
+            closer = r2[i,1] < r2[j,1]
+            k = np.where(closer, nearest[i,1], nearest[j,1])
+            d3 = np.sqrt(np.where(closer, r2[i,1], r2[j,1]))
+            perturbation = 2*self.gm[k]/gm*(a*(1+e)/d3)**3
+            tight = (bound & (period < steps_per_orbit*dt)
+                     & (perturbation < max_perturbation)
+                     & (a*(1-e) > softening_ratio
+                        *np.sqrt(np.maximum(self.s2[i], self.s2[j]))))
+        return np.column_stack([i[tight], j[tight]])
+
+    def kick(self, dt, gradient=0.):
+        s = self.system
+        if gradient:
+            raise ValueError("regularization has no force-gradient kick")
+        acc = s.accelerations(s.pos)
+        if len(self.pairs):
+            i, j = self.pairs.T
+            r = s.pos[i] - s.pos[j]
+            r3 = ((r**2).sum(axis=1)**1.5)[:,None]
+            acc[i] += self.gm[j,None]*r/r3
+            acc[j] -= self.gm[i,None]*r/r3
+        s.vel += acc*dt
+
+    def drift(self, dt):
+        s = self.system
+        if len(self.pairs) == 0:
+            s.pos += s.vel*dt
+            return
+        i, j = self.pairs.T
+        mi, mj = s.mass[i,None], s.mass[j,None]
+        M = mi + mj
+        R = (mi*s.pos[i] + mj*s.pos[j])/M
+        V = (mi*s.vel[i] + mj*s.vel[j])/M
+        r, v = kepler_drift(self.gm[i] + self.gm[j], s.pos[i] - s.pos[j],
+                            s.vel[i] - s.vel[j], dt)
+        s.pos += s.vel*dt
+        R += V*dt
+        s.pos[i], s.pos[j] = R + mj/M*r, R - mi/M*r
+        s.vel[i], s.vel[j] = V + mj/M*v, V - mi/M*v
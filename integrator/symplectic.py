@@ -0,0 +1,29 @@
+#### SYMPLECTIC
+####
+#### Time-symmetric compositions of the kick (EVOLVEA) and drift (EVOLVEB)
+#### of the potential integrator, of the form name(EVOLVEA, EVOLVEB, dt)
+#### used by amuse.ext.composition_methods and bridge.Bridge.
+####
+#### Next to the second-order leapfrog these are the optimized 4th and
+#### 6th-order compositions of Blanes & Moan (2002) and the 4th-order
+#### force-gradient scheme of Chin (1997).  The latter has only positive
+#### substeps, at the price of one kick with the modified acceleration
+#### a + dt^2/24 (J.a), J the Jacobian of the acceleration, which the
+#### potential system obtains from the analytic jerk of the potentials.
+####
+
+from amuse.ext.composition_methods import LEAPFROG
+from amuse.ext.composition_methods import SPLIT_4TH_S_M6
+from amuse.ext.composition_methods import SPLIT_6TH_SS_M13
+
+def FORCE_GRADIENT_4TH(EVOLVEA, EVOLVEB, dt):
+    EVOLVEA(dt/6.)
+    EVOLVEB(dt/2.)
+    EVOLVEA(2*dt/3., gradient=dt**3/36.)
+    EVOLVEB(dt/2.)
+    EVOLVEA(dt/6.)
+
+methods = {"2": LEAPFROG,
+           "4": SPLIT_4TH_S_M6,
+           "6": SPLIT_6TH_SS_M13,
+           "4g": FORCE_GRADIENT_4TH}
@@ -0,0 +1,183 @@
+#### WISDOM_HOLMAN
+####
+#### Kepler drift for systems dominated by one central mass (the SMBH of
+#### the S-star cluster), after Wisdom & Holman (1991, AJ 102, 1528), in
+#### the democratic heliocentric coordinates of Duncan, Levison & Lee
+#### (1998, AJ 116, 2067).
+####
+#### The Hamiltonian is split into
+####   H_kepler      Kepler motion of every potential around the central
+####                 mass, advanced analytically (kepler_drift)
+####   H_central     the linear drift of the heliocentric positions with
+####                 the total momentum of the other potentials
+####   H_interaction the mutual forces of the other potentials, plus the
+####                 difference between the central potential and the
+####                 Kepler point mass (its softening or core)
+#### The drift of the integrator is H_central(dt/2) H_kepler(dt)
+#### H_central(dt/2), the kick that of H_interaction, so that the time
+#### step only has to resolve the perturbations and the orbital periods,
+#### not the pericentre passages.  The Kepler equation in universal
+#### variables is solved by Laguerre-Conway iterations, with bisection
+#### for the orbits they leave unconverged (hyperbolic orbits over long
+#### steps).
+####
+#### While the integrator runs, the system holds the heliocentric
+#### positions and barycentric velocities of the other potentials, and
+#### the centre of mass in the row of the central mass.  The central
+#### potential has to be of the softened point-mass form.
+####
+
+import numpy as np
+
+def stumpff(z):
+    # Stumpff functions c0..c3, with series for small |z|
+    small = np.abs(z) < 1.e-2
+    zs = np.where(small, 1., z)
+    sq = np.sqrt(np.abs(zs))
+    c0 = np.where(zs > 0, np.cos(sq), np.cosh(sq))
+    c1 = np.where(zs > 0, np.sin(sq), np.sinh(sq))/sq
+    c2 = (1 - c0)/zs
+    c3 = (1 - c1)/zs
+    c2 = np.where(small, 1/2. - z/24. + z**2/720. - z**3/40320., c2)
+    c3 = np.where(small, 1/6. - z/120. + z**2/5040. - z**3/362880., c3)
+    return 1 - z*c2, 1 - z*c3, c2, c3
+
+def universal_bisection(r0, eta, gm, beta, dt, tolerance=1.e-14,
+                        max_iterations=2000):
+    # the root s of r0 G1 + eta G2 + gm G3 = dt by bisection, which always
+    # converges since the left side grows with s (its derivative is r);
+    # the bracket starts at 0 and |dt|/r0 and doubles until it holds the
+    # root.  Where the Stumpff functions overflow, far beyond the root,
+    # the sign is that of s.
+    def above(s):
+        c0, c1, c2, c3 = stumpff(beta*s**2)
+        f = r0*s*c1 + eta*s**2*c2 + gm*s**3*c3 - dt
+        return np.where(np.isfinite(f), f > 0, s > 0)
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        w = np.abs(dt)/r0
+        lo = np.where(dt > 0, 0., -w)
+        hi = np.where(dt > 0, w, 0.)
+        for iteration in range(max_iterations):
+            low, high = above(lo), ~above(hi)
+            if not (low.any() or high.any()):
+                break
+            lo = np.where(low, 2*lo, lo)
+            hi = np.where(high, 2*hi, hi)
+        for iteration in range(max_iterations):
+            s = 0.5*(lo + hi)
+            if np.all(hi - lo <= tolerance*(1 + np.abs(s))):
+                break
+            right = above(s)
+            lo = np.where(right, lo, s)
+            hi = np.where(right, s, hi)
+        else:
+            raise ValueError("the Kepler drift did not converge")
+    return s
+
+def kepler_drift(gm, pos, vel, dt, tolerance=1.e-14, max_iterations=50):
+    # advance Kepler orbits around gm (a scalar, or one per orbit) by dt,
+    # for (N, 3) arrays, in universal variables:
+    # dt = r0 G1 + eta G2 + gm G3 with G_n = s^n c_n
+    r0 = np.sqrt((pos**2).sum(axis=1))
+    gm = np.broadcast_to(gm, r0.shape)
+    eta = (pos*vel).sum(axis=1)
+    beta = 2*gm/r0 - (vel**2).sum(axis=1)
+    zeta = gm - beta*r0
+
+    # bound orbits only need dt modulo the period
+    dt = np.full(len(r0), float(dt))
+    bound = beta > 0
+    period = 2*np.pi*gm/np.where(bound, beta, 1.)**1.5
+    dt = np.where(bound, np.fmod(dt, period), dt)
+
+    # Laguerre-Conway iterations, which converge from s = dt/r0 for any
+    # eccentricity, but can overflow on hyperbolic orbits with a long dt;
+    # the orbits left unconverged are solved by bisection
+    s = dt/r0
+    n = 5.
+    active = np.arange(len(r0))
+    with np.errstate(over="ignore", invalid="ignore"):
+        for iteration in range(max_iterations):
+            sa, ba = s[active], beta[active]
+            c0, c1, c2, c3 = stumpff(ba*sa**2)
+            G1, G2, G3 = sa*c1, sa**2*c2, sa**3*c3
+            f = r0[active]*G1 + eta[active]*G2 + gm[active]*G3 - dt[active]
+            df = r0[active]*c0 + eta[active]*G1 + gm[active]*G2
+            ddf = eta[active]*c0 + zeta[active]*G1
+            root = np.sqrt(np.abs((n-1)**2*df**2 - n*(n-1)*f*ddf))
+            ds = -n*f/(df + np.sign(df)*root)
+            s[active] = sa + ds
+            active = active[~(np.abs(ds) <= tolerance*(1 + np.abs(sa)))]
+            if len(active) == 0:
+                break
+    failed = np.union1d(active, np.flatnonzero(~np.isfinite(s)))
+    if len(failed) > 0:
+        s[failed] = universal_bisection(r0[failed], eta[failed], gm[failed],
+                                        beta[failed], dt[failed], tolerance)
+
+    c0, c1, c2, c3 = stumpff(beta*s**2)
+    G1, G2, G3 = s*c1, s**2*c2, s**3*c3
+    r = r0*c0 + eta*G1 + gm*G2
+    f = 1 - gm*G2/r0
+    g = dt - gm*G3
+    df = -gm*G1/(r*r0)
+    dg = 1 - gm*G2/r
+    return (f[:,None]*pos + g[:,None]*vel,
+            df[:,None]*pos + dg[:,None]*vel)
+
+class WisdomHolman(object):
+    def __init__(self, system):
+        self.system = system
+        mass = system.mass
+        self.central = np.argmax(mass)
+        self.others = np.flatnonzero(np.arange(len(mass)) != self.central)
+        central = system._nbody_source_potential([self.central])
+        gm, s2 = central.get_point_mass_form()
+        self.gm = float(np.ravel(gm)[0])
+        self.central_potential = central
+
+    def enter(self):
+        # barycentric -> democratic heliocentric
+        s, c, o = self.system, self.central, self.others
+        M = s.mass.sum()
+        com = (s.mass[:,None]*s.pos).sum(axis=0)/M
+        vcom = (s.mass[:,None]*s.vel).sum(axis=0)/M
+        s.pos[o] -= s.pos[c]
+        s.vel[o] -= vcom
+        s.pos[c], s.vel[c] = com, vcom
+
+    def leave(self):
+        # democratic heliocentric -> barycentric
+        s, c, o = self.system, self.central, self.others
+        M = s.mass.sum()
+        com, vcom = s.pos[c].copy(), s.vel[c].copy()
+        mo = s.mass[o,None]
+        s.pos[c] = com - (mo*s.pos[o]).sum(axis=0)/M
+        s.vel[c] = vcom - (mo*s.vel[o]).sum(axis=0)/s.mass[c]
+        s.pos[o] += s.pos[c]
+        s.vel[o] += vcom
+
+    def kick(self, dt, gradient=0.):
+        s, o = self.system, self.others
+        if gradient:
+            raise ValueError("the Kepler drift has no force-gradient kick")
+        acc = s.partial_accelerations(o, o)
+        q = s.pos[o]
+        g = self.central_potential.get_gravity_at_point(
+            self.central_potential.epsilon2, q[:,0], q[:,1], q[:,2])
+        r3 = ((q**2).sum(axis=1)**1.5)[:,None]
+        acc += np.column_stack(g) + self.gm*q/r3
+        s.vel[o] += acc*dt
+
+    def central_drift(self, dt):
+        s, c, o = self.system, self.central, self.others
+        p = (s.mass[o,None]*s.vel[o]).sum(axis=0)
+        s.pos[o] += p*dt/s.mass[c]
+
+    def drift(self, dt):
+        s, c, o = self.system, self.central, self.others
+        self.central_drift(dt/2.)
+        s.pos[o], s.vel[o] = kepler_drift(self.gm, s.pos[o], s.vel[o], dt)
+        self.central_drift(dt/2.)
+        s.pos[c] += s.vel[c]*dt
@@ -4,6 +4,7 @@ from amuse.ic.plummer import new_plummer_model
 from amuse.ic.salpeter import new_salpeter_mass_distribution
 
 from ic.initialize_sstars import generate_SStar_initial_conditions
+from ic.chunked_plummer import write_plummer_model
 
 def new_PlummerModel(N, Rvir):
     converter=nbody_system.nbody_to_si(N|units.MSun, Rvir)
@@ -50,6 +51,14 @@ def new_option_parser():
                       dest="filename", 
                       default = "",
                       help="initial conditions datafile [%default]")
+    result.add_option("--chunk", type="int",
+                      dest="chunk",
+                      default = 0,
+                      help="generate the Plummer sphere in chunks of this many stars, straight to a chunked HDF5 file (plummer.h5), 0 for all at once [%default]")
+    result.add_option("--seed", type="int",
+                      dest="seed",
+                      default = None,
+                      help="random seed of the chunked generation [%default]")
     return result
 
 if __name__ == "__main__":
@@ -62,6 +71,10 @@ if __name__ == "__main__":
                           separator = " [", suffix = "]")
 
 
+    if "Plummer" in o.conditions and o.chunk > 0:
+        filename = o.filename if len(o.filename) > 0 else "plummer.h5"
+        write_plummer_model(filename, o.N, o.Rvir, o.seed, o.chunk)
+        exit(0)
     if "Plummer" in o.conditions:
         particles = new_PlummerModel(o.N, o.Rvir)
         filename = "plummer.amuse"
@@ -0,0 +1,63 @@
+#### CHECKPOINT
+####
+#### Periodic checkpoints of a run, to restart it after a crash or a
+#### wall-clock limit of a batch queue.
+####
+#### A checkpoint is a pickled dict of the state of the run (AMUSE
+#### quantities and numpy arrays, which pickle exactly, units included),
+#### so that a restarted run continues bit for bit.  The state is
+#### serialized and written by a background thread, to a temporary file
+#### that then replaces the previous checkpoint, so a crash while
+#### writing never leaves a broken checkpoint behind.  The integration
+#### loop only pays for taking copies of the arrays in the state, which
+#### must not be changed afterwards.
+####
+
+import os
+import time
+import pickle
+import threading
+
+class Checkpointer(object):
+    def __init__(self, filename, every, wall_every=0, model_time=None):
+        # every: model time between checkpoints (zero for none)
+        # wall_every: wall-clock seconds between checkpoints (0 for none)
+        self.filename = filename
+        self.every = every
+        self.wall_every = wall_every
+        self.last_time = model_time
+        self.last_wall = time.time()
+        self.thread = None
+
+    def due(self, model_time):
+        if self.every.number > 0 and model_time - self.last_time >= self.every:
+            return True
+        return self.wall_every > 0 \
+            and time.time() - self.last_wall >= self.wall_every
+
+    def write(self, state, model_time):
+        self.wait()
+        self.thread = threading.Thread(target=self._write, args=(state,))
+        self.thread.start()
+        self.last_time = model_time
+        self.last_wall = time.time()
+
+    def _write(self, state):
+        temporary = self.filename + ".tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.filename)
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.wait()
+
+def read_checkpoint(filename):
+    with open(filename, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,77 @@
+#### PIPELINE
+####
+#### Output of the main loops (snapshots, diagnostics lines) on a
+#### background thread, so that the integration does not wait for the
+#### disk or the energy sums.  The final plot is made on the main thread
+#### after close, since the GUI backends of matplotlib do not run on
+#### another thread.
+####
+#### The loop hands a copy of the particles, which it does not touch
+#### again, and the task to run on it to a bounded queue; the worker
+#### runs the tasks one by one in the order they were submitted, so the
+#### output is the same as that of the loop doing it inline.  When
+#### max_pending tasks are waiting, submit blocks until the worker has
+#### caught up (backpressure), which bounds the memory held by the
+#### copies.  wait returns when all submitted tasks are done (e.g. before
+#### a checkpoint, so that the snapshot file is complete up to it), close
+#### also stops the worker and runs at exit, so that a run that ends with
+#### an exception still flushes its output.  An exception in a task is
+#### raised again in the loop, at the next submit, wait or close.  With
+#### max_pending = 0 the tasks run inline.
+####
+
+import queue
+import atexit
+import threading
+import contextvars
+
+class OutputPipeline(object):
+    def __init__(self, max_pending=8):
+        self.error = None
+        self.thread = None
+        if max_pending > 0:
+            self.queue = queue.Queue(max_pending)
+            # numpy keeps its print options in a context variable, which
+            # a new thread does not inherit
+            context = contextvars.copy_context()
+            self.thread = threading.Thread(target=context.run,
+                                           args=(self._run,), daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                task, args = item
+                if self.error is None:
+                    task(*args)
+            except BaseException as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def _raise(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, task, *args):
+        self._raise()
+        if self.thread is None:
+            task(*args)
+        else:
+            self.queue.put((task, args))
+
+    def wait(self):
+        if self.thread is not None:
+            self.queue.join()
+        self._raise()
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self._raise()
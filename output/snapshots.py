@@ -0,0 +1,72 @@
+#### SNAPSHOTS
+####
+#### Append snapshots of a run to a chunked HDF5 file, one row per
+#### snapshot:
+####   time       (T,)       Myr
+####   position   (T, N, 3)  pc
+####   velocity   (T, N, 3)  km/s
+####   mass       (N,)       MSun, written once
+#### The datasets grow along the first axis and are chunked per snapshot
+#### (and per block of particles for large N), so that a writer only
+#### touches the end of the file and a reader can take every k-th
+#### snapshot of every l-th particle without reading the rest.
+####
+
+import numpy as np
+import h5py
+from amuse.units import units
+
+particle_chunk = 2**16
+
+class SnapshotWriter(object):
+    def __init__(self, filename, particles, every=1, restart_time=None):
+        self.every = every
+        if restart_time is not None:
+            # continue the file of a restarted run, dropping the snapshots
+            # written after its checkpoint
+            self.file = h5py.File(filename, "a")
+            T = int((self.file["time"][:]
+                     <= restart_time.value_in(units.Myr)).sum())
+            for name in ("time", "position", "velocity"):
+                self.file[name].resize(T, axis=0)
+            return
+        self.file = h5py.File(filename, "w")
+        N = len(particles)
+        chunk = (1, min(N, particle_chunk), 3)
+        self.file.create_dataset("time", (0,), maxshape=(None,),
+                                 dtype="f8", chunks=(1024,))
+        for name in ("position", "velocity"):
+            self.file.create_dataset(name, (0, N, 3), maxshape=(None, N, 3),
+                                     dtype="f8", chunks=chunk)
+        self.file["mass"] = particles.mass.value_in(units.MSun)
+        self.file["time"].attrs["unit"] = "Myr"
+        self.file["position"].attrs["unit"] = "pc"
+        self.file["velocity"].attrs["unit"] = "km/s"
+        self.file["mass"].attrs["unit"] = "MSun"
+
+    def due(self, step, last=False):
+        return last or (self.every > 0 and step%self.every == 0)
+
+    def write(self, particles, model_time):
+        f = self.file
+        T = len(f["time"])
+        for name in ("time", "position", "velocity"):
+            f[name].resize(T+1, axis=0)
+        f["time"][T] = model_time.value_in(units.Myr)
+        f["position"][T] = particles.position.value_in(units.pc)
+        f["velocity"][T] = particles.velocity.value_in(units.kms)
+        f.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_snapshots(filename, max_snapshots=1000, max_particles=1000):
+    # every k-th snapshot of every l-th particle, such that at most
+    # max_snapshots x max_particles positions are read
+    with h5py.File(filename, "r") as f:
+        T, N = f["position"].shape[:2]
+        k = max(1, -(-T//max_snapshots))
+        l = max(1, -(-N//max_particles))
+        time = f["time"][::k]
+        position = f["position"][::k, ::l, :]
+    return time, position
@@ -2,23 +2,29 @@ from amuse.lab import *
 import numpy as np
 from matplotlib import pyplot as plt
 
+from output.snapshots import read_snapshots
+
+def new_axis():
+    plt.rcParams.update({'font.size': 20})
+    fig, ax1 = plt.subplots(1, 1, figsize=(10, 10))
+    ax1.yaxis.tick_right()
+    ax1.yaxis.tick_left()
+    ax1.xaxis.tick_top()
+    ax1.xaxis.tick_bottom()
+    ax1.minorticks_on() # switch on the minor ticks
+    ax1.locator_params(nbins=3)
+    ax1.set_xlim(-10, 10)
+    ax1.set_ylim(-10, 10)
+    ax1.axis("equal")
+    return ax1
+
 def plot_cluster(particles,
                  model_time=0|units.Myr,
                  ax1=None,
                  figfile=""):
 
     if ax1==None:
-        plt.rcParams.update({'font.size': 20})
-        fig, ax1 = plt.subplots(1, 1, figsize=(10, 10))
-        ax1.yaxis.tick_right()
-        ax1.yaxis.tick_left()
-        ax1.xaxis.tick_top()
-        ax1.xaxis.tick_bottom()
-        ax1.minorticks_on() # switch on the minor ticks
-        ax1.locator_params(nbins=3)
-        ax1.set_xlim(-10, 10)
-        ax1.set_ylim(-10, 10)
-        ax1.axis("equal")
+        ax1 = new_axis()
 
     #print(f"t={potentials[0].model_time.in_(units.Myr)}, x={x}")
     s = 1 + model_time.value_in(units.Myr)
@@ -36,6 +42,22 @@ def plot_cluster(particles,
         
     return ax1
 
+def plot_snapshots(filename, figfile="",
+                   max_snapshots=1000, max_particles=1000):
+    # the orbits from a snapshot file (output/snapshots.py), decimated
+    # in time and in particles, in a single scatter collection
+    time, position = read_snapshots(filename, max_snapshots, max_particles)
+    ax1 = new_axis()
+    from matplotlib import cm
+    c = cm.rainbow(np.linspace(0, 1, position.shape[1]))
+    s = 1 + np.repeat(time, position.shape[1])
+    ax1.scatter(position[...,0].ravel(), position[...,1].ravel(),
+                s=s, c=np.tile(c, (len(time), 1)))
+    if len(figfile)>0:
+        plt.savefig(figfile)
+        plt.show()
+    return ax1
+
 def new_option_parser():
     from amuse.units.optparse import OptionParser
     result = OptionParser()
@@ -47,13 +69,29 @@ def new_option_parser():
                       dest="figname", 
                       default = "figure.pdf",
                       help="figure filename [%default]")
+    result.add_option("-s", 
+                      dest="snapshots", 
+                      default = "",
+                      help="snapshot file of a run, plotted instead [%default]")
+    result.add_option("--max_snapshots", type="int",
+                      dest="max_snapshots", 
+                      default = 1000,
+                      help="largest number of snapshots read [%default]")
+    result.add_option("--max_particles", type="int",
+                      dest="max_particles", 
+                      default = 1000,
+                      help="largest number of particles read [%default]")
     return result
 
 
 if __name__ == "__main__":
     o, arguments = new_option_parser().parse_args()
 
-    particles = read_set_from_file(o.filename, close_file=True)
-    plot_cluster(particles,
-                 figfile=o.figname)
+    if len(o.snapshots)>0:
+        plot_snapshots(o.snapshots, o.figname,
+                       o.max_snapshots, o.max_particles)
+    else:
+        particles = read_set_from_file(o.filename, close_file=True)
+        plot_cluster(particles,
+                     figfile=o.figname)
 
@@ -0,0 +1,164 @@
+#### KERNELS
+####
+#### Direct-summation kernels (accelerations, potentials and jerks) of
+#### the potential system, on unit-free arrays.  The targets are taken
+#### in blocks of consecutive particles, at most block_size long and
+#### small enough for the temporaries to hold about block_pairs pairs.
+#### The blocks only depend on N, so that they can be shared out over
+#### workers, and the serial and the parallel force evaluation
+#### (integrator/parallel.py) then run the same arithmetic on the same
+#### blocks and agree bit for bit.
+####
+#### There are two backends, chosen at run time with set_backend
+#### (--kernels).  numpy evaluates the methods of any potential class on
+#### the (targets, sources) separations of a block.  numba, if installed,
+#### runs a compiled kernel for potentials of the softened point-mass
+#### form, G m/(r^2 + s^2)^(1/2) (Plummer, point particle), which takes
+#### the acceleration and the potential of a target in one pass over the
+#### sources, without temporaries: the targets of a block are shared out
+#### over threads in tiles of target_tile, and every tile runs over the
+#### sources in tiles of source_tile, which stay in cache.  Each target
+#### still sums its sources in index order, so the result does not
+#### depend on the number of threads (NUMBA_NUM_THREADS), but it differs
+#### from numpy in the last bits.  Other potentials, and ensembles, take
+#### the numpy kernels with either backend.
+####
+
+import numpy as np
+try:
+    import numba
+    from numba import prange
+except ImportError:
+    numba = None
+    prange = range
+
+block_pairs = 2**20
+block_size = 64
+
+backend = "numpy"
+fused_block_size = 4096
+target_tile = 8
+source_tile = 512
+
+def set_backend(name):
+    global backend
+    if name == "numba" and numba is None:
+        print("numba is not installed, using the numpy kernels")
+        name = "numpy"
+    backend = name
+    return backend
+
+def fused(potential, pos):
+    # whether the compiled kernel applies: a single system (no leading
+    # axes) of potentials of the point-mass form
+    if backend != "numba" or pos.ndim != 2:
+        return False
+    try:
+        potential.get_point_mass_form()
+    except NotImplementedError:
+        return False
+    return True
+
+def blocks(N, members=1, fused=False, sources=None):
+    # blocks of N targets, each against all N (or sources) sources; the
+    # compiled kernel needs no temporaries, so it takes large blocks
+    if sources is None:
+        sources = N
+    if fused:
+        size = fused_block_size
+    else:
+        size = min(block_size, max(1, block_pairs//max(sources*members, 1)))
+    return [(first, min(first+size, N)) for first in range(0, N, size)]
+
+def _offsets(pos, first, last):
+    # (..., targets, sources, 3) separations and the self-interactions;
+    # leading axes of pos are independent systems (an ensemble), for
+    # which the parameters of the potential are shaped (..., 1, N)
+    d = pos[...,first:last,None,:] - pos[...,None,:,:]
+    N = pos.shape[-2]
+    itself = np.arange(first, last)[:,None] == np.arange(N)[None,:]
+    return d, itself
+
+def _fields_kernel(pos, gm, s2, first, last, acc, phi):
+    N = pos.shape[0]
+    n_tiles = (last-first + target_tile-1)//target_tile
+    for tile in prange(n_tiles):
+        t0 = first + tile*target_tile
+        t1 = min(t0 + target_tile, last)
+        for s0 in range(0, N, source_tile):
+            s1 = min(s0 + source_tile, N)
+            for i in range(t0, t1):
+                xi = pos[i,0]
+                yi = pos[i,1]
+                zi = pos[i,2]
+                ax = 0.
+                ay = 0.
+                az = 0.
+                p = 0.
+                for j in range(s0, s1):
+                    if j == i:
+                        continue
+                    dx = xi - pos[j,0]
+                    dy = yi - pos[j,1]
+                    dz = zi - pos[j,2]
+                    rinv = 1./np.sqrt(dx*dx + dy*dy + dz*dz + s2[j])
+                    f = gm[j]*rinv
+                    p += f
+                    f *= rinv*rinv
+                    ax -= f*dx
+                    ay -= f*dy
+                    az -= f*dz
+                acc[i-first,0] += ax
+                acc[i-first,1] += ay
+                acc[i-first,2] += az
+                phi[i-first] += p
+
+if numba is not None:
+    _fields_kernel = numba.njit(parallel=True, cache=True)(_fields_kernel)
+
+def fields(potential, pos, first, last):
+    # accelerations and potentials of particles first..last-1 due to all
+    # others, in one pass of the compiled kernel
+    N = len(pos)
+    gm, s2 = potential.get_point_mass_form()
+    gm = np.ascontiguousarray(np.broadcast_to(gm, (N,)), dtype=np.float64)
+    s2 = np.ascontiguousarray(np.broadcast_to(s2, (N,)), dtype=np.float64)
+    acc = np.zeros((last-first, 3))
+    phi = np.zeros(last-first)
+    _fields_kernel(np.ascontiguousarray(pos, dtype=np.float64), gm, s2,
+                   first, last, acc, phi)
+    return acc, phi
+
+def accelerations(potential, pos, first, last):
+    # accelerations of particles first..last-1 due to all others, where
+    # potential holds the parameters of all N particles
+    if fused(potential, pos):
+        return fields(potential, pos, first, last)[0]
+    d, itself = _offsets(pos, first, last)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = potential.get_gravity_at_point(potential.epsilon2,
+                                           d[...,0], d[...,1], d[...,2])
+    return np.stack([np.where(itself, 0, ai).sum(axis=-1) for ai in a],
+                    axis=-1)
+
+def jerks(potential, pos, vel, first, last):
+    # jerks of particles first..last-1 due to all others, for the
+    # velocities vel (the Jacobian of the accelerations applied to vel)
+    d, itself = _offsets(pos, first, last)
+    dv = vel[...,first:last,None,:] - vel[...,None,:,:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        j = potential.get_jerk_at_point(potential.epsilon2,
+                                        d[...,0], d[...,1], d[...,2],
+                                        dv[...,0], dv[...,1], dv[...,2])
+    return np.stack([np.where(itself, 0, ji).sum(axis=-1) for ji in j],
+                    axis=-1)
+
+def potentials(potential, pos, first, last):
+    # potential at particles first..last-1 due to all others
+    if fused(potential, pos):
+        return fields(potential, pos, first, last)[1]
+    d, itself = _offsets(pos, first, last)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        phi = potential.get_potential_at_point(potential.epsilon2,
+                                               d[...,0], d[...,1], d[...,2])
+    return np.where(itself, 0, phi).sum(axis=-1)
@@ -1,31 +1,29 @@
 import numpy as np
 from amuse.lab import *
 
-class PlummerPotential(object):
-    def __init__(self):
-        self.mass= 0 | units.MSun
-        self.radius = 0 | units.pc
-        self.epsilon2 = (0 | units.parsec)**2
-
-    def set_parameters(self, mass, radius, eps2=(0|units.pc)**2):
-        self.mass = mass
-        self.radius = radius
-        self.epsilon2 = eps2
-        
+from potentials.potential import Potential
+
+class PlummerPotential(Potential):
+    analytic_gravity = True
+
     def get_potential_at_point(self,eps,x,y,z):
         r=(x**2+y**2+z**2 + self.radius**2 + self.epsilon2)**0.5
-        potential = 2 * constants.G * self.mass/r
+        potential = 2 * self.G * self.mass/r
         return potential
 
     def get_gravity_at_point(self, eps, x,y,z):
-        phi_0 = self.get_potential_at_point(eps, x,y,z)
-        #grav = AdaptingVectorQuantity()
-        #dpos = 0.001*(x**2+y**2+z**2).sqrt()
-        dpos = 0.001*self.radius #0.0001*(x**2+y**2+z**2).sqrt()
-        phi_dx = self.get_potential_at_point(0,x+dpos,y,z) - phi_0
-        phi_dy = self.get_potential_at_point(0,x,y+dpos,z) - phi_0
-        phi_dz = self.get_potential_at_point(0,x,y, z+dpos) - phi_0
-        return phi_dx/dpos, phi_dy/dpos, phi_dz/dpos
+        r=(x**2+y**2+z**2 + self.radius**2 + self.epsilon2)**0.5
+        f = -2 * self.G * self.mass/r**3
+        return f*x, f*y, f*z
+
+    def get_jerk_at_point(self, eps, x,y,z, vx,vy,vz):
+        r2 = x**2+y**2+z**2 + self.radius**2 + self.epsilon2
+        f = -2 * self.G * self.mass/r2**1.5
+        rv = 3*(x*vx + y*vy + z*vz)/r2
+        return f*(vx-rv*x), f*(vy-rv*y), f*(vz-rv*z)
+
+    def get_point_mass_form(self):
+        return 2*self.G*self.mass, self.radius**2 + self.epsilon2
 
     def mass_in(self, r):
         return self.mass * r**3/(r**2 + self.radius**2)**(3./2.)
@@ -39,6 +37,3 @@ class PlummerPotential(object):
 
     def circular_velocity(self, R):
         return np.sqrt(constants.G*self.mass_in(R)/R)
-    
-    def stop(self):
-        return
@@ -0,0 +1,101 @@
+#### POTENTIAL
+####
+#### Base class for the potentials that are coupled by the integrator.
+####
+#### A potential class has to provide
+####   set_parameters(mass, radius, eps2)
+####   get_potential_at_point(eps, x, y, z)
+#### where (x, y, z) is the position relative to the centre of the
+#### potential. Following the convention of the existing potentials the
+#### potential is positive (G M/r for a point mass), and the gravity is
+#### its gradient, i.e. the acceleration of a test particle at (x, y, z).
+#### All methods have to work element-wise on arrays, including arrays
+#### of parameters.
+####
+#### A potential with a closed-form gradient overrides
+####   get_gravity_at_point(eps, x, y, z)
+####   get_jerk_at_point(eps, x, y, z, vx, vy, vz)
+#### and sets analytic_gravity = True. Otherwise the gravity and the jerk
+#### (the time derivative of the acceleration for a relative velocity
+#### (vx, vy, vz)) are obtained from central finite differences with a
+#### step that scales with the distance to the centre.
+####
+#### A potential that has the form of a softened point mass,
+#### G m/(r^2 + s^2)^(1/2), can say so by returning (G m, s^2) from
+#### get_point_mass_form(); multipole approximations (the tree) rely on it.
+####
+#### The gravitational constant is taken from self.G, so that the same
+#### expressions also evaluate on plain floats in N-body units (as_nbody).
+####
+#### A potential with an internal state (the members of an SCF cluster,
+#### scf_potential.py) advances it in evolve(dt), which the code that
+#### holds the potential calls every step; for the others it does nothing.
+####
+
+from amuse.lab import *
+
+class Potential(object):
+    analytic_gravity = False
+    G = constants.G
+
+    # relative finite-difference step, ~(machine precision)^(1/3)
+    # minimizes the truncation plus round-off error of a central stencil
+    fd_step = 1.e-5
+
+    def __init__(self):
+        self.mass= 0 | units.MSun
+        self.radius = 0 | units.pc
+        self.epsilon2 = (0 | units.parsec)**2
+
+    def set_parameters(self, mass, radius, eps2=(0|units.pc)**2):
+        self.mass = mass
+        self.radius = radius
+        self.epsilon2 = eps2
+
+    def as_nbody(self, converter):
+        # a unit-free copy, with parameters in N-body units and G=1
+        potential = type(self)()
+        potential.G = 1.0
+        potential.set_parameters(
+            converter.to_nbody(self.mass).value_in(nbody_system.mass),
+            converter.to_nbody(self.radius).value_in(nbody_system.length),
+            converter.to_nbody(self.epsilon2).value_in(nbody_system.length**2))
+        return potential
+
+    def get_potential_at_point(self, eps, x, y, z):
+        raise NotImplementedError(
+            f"{type(self).__name__} does not define a potential")
+
+    def get_point_mass_form(self):
+        raise NotImplementedError(
+            f"{type(self).__name__} is not a softened point mass")
+
+    def _fd_step(self, x, y, z):
+        return self.fd_step * (x**2+y**2+z**2 + self.radius**2
+                               + self.epsilon2)**0.5
+
+    def get_gravity_at_point(self, eps, x, y, z):
+        h = self._fd_step(x, y, z)
+        phi = self.get_potential_at_point
+        phi_dx = phi(eps, x+h, y, z) - phi(eps, x-h, y, z)
+        phi_dy = phi(eps, x, y+h, z) - phi(eps, x, y-h, z)
+        phi_dz = phi(eps, x, y, z+h) - phi(eps, x, y, z-h)
+        return phi_dx/(2*h), phi_dy/(2*h), phi_dz/(2*h)
+
+    def get_jerk_at_point(self, eps, x, y, z, vx, vy, vz):
+        # the Jacobian of the gravity, column by column, applied to v
+        h = self._fd_step(x, y, z)
+        g = self.get_gravity_at_point
+        columns = []
+        for dx, dy, dz in ((h, 0*h, 0*h), (0*h, h, 0*h), (0*h, 0*h, h)):
+            gp = g(eps, x+dx, y+dy, z+dz)
+            gm = g(eps, x-dx, y-dy, z-dz)
+            columns.append([(gp[k]-gm[k])/(2*h) for k in range(3)])
+        return tuple(columns[0][k]*vx + columns[1][k]*vy + columns[2][k]*vz
+                     for k in range(3))
+
+    def evolve(self, dt):
+        return
+
+    def stop(self):
+        return
@@ -0,0 +1,237 @@
+#### SCF_POTENTIAL
+####
+#### The potential of a whole cluster as a self-consistent-field (SCF)
+#### expansion in the Hernquist-Ostriker basis (Hernquist & Ostriker
+#### 1992, ApJ 386, 375), truncated at radial order nmax and angular
+#### order lmax.  In units G = M = a = 1, with a the scale length (the
+#### radius parameter),
+####   Phi(x) = sum_nlm Z_nlm R_nl(r) P_lm(cos theta)/sin^m theta q^m
+####   R_nl   = -r^l/(1+r)^(2l+1) C_n^(2l+3/2)((r-1)/(r+1))
+#### with q = (x + i y)/r, so that every term is smooth on the z axis,
+#### and the gravity is taken from the analytic gradient of these terms.
+#### The complex coefficients Z_nlm follow from the members in one pass,
+#### O(N n_basis), and the field at a point costs O(n_basis), so that a
+#### cluster of 10^6 stars acts on other codes at the cost of a single
+#### potential.
+####
+#### The members (set_members) are kept relative to their centre of
+#### mass, in units of a and sqrt(G M/a).  evolve(dt) advances them
+#### with leapfrog steps of at most `timestep` in the field of their own
+#### expansion, which is rebuilt after every drift, and keeps them on
+#### their centre of mass; the cluster as a whole moves with the
+#### particle of the code that holds the potential (CompositeGravityCode
+#### in gravity_potential.py), which also takes the kicks of the other
+#### codes.  The members therefore feel no external tides.
+####
+#### Not of the point-mass form: the tree, the compiled kernels and the
+#### potential system do not take an SCF potential.
+####
+
+import math
+import numpy as np
+from amuse.units import units
+from amuse.units.quantities import is_quantity
+
+from potentials.potential import Potential
+
+block_size = 4096
+
+def _number(value):
+    # a dimensionless ratio as plain floats, with or without units
+    if is_quantity(value):
+        return value.value_in(units.none)
+    return np.asarray(value, dtype=float)
+
+def gegenbauer(nmax, alpha, xi):
+    # C_n^alpha(xi) for n = 0..nmax, (nmax+1, K)
+    C = np.empty((nmax+1,) + xi.shape)
+    C[:1] = 1.
+    if nmax > 0:
+        C[1] = 2*alpha*xi
+    for n in range(2, nmax+1):
+        C[n] = (2*(n+alpha-1)*xi*C[n-1] - (n+2*alpha-2)*C[n-2])/n
+    return C
+
+class SCFPotential(Potential):
+    # the jerk is the finite-difference one of the base class, on the
+    # analytic gravity
+    analytic_gravity = True
+
+    def __init__(self, nmax=6, lmax=4, timestep=0.02):
+        Potential.__init__(self)
+        self.nmax = nmax
+        self.lmax = lmax
+        self.timestep = timestep
+        self.coefficients = np.zeros((nmax+1, lmax+1, lmax+1), dtype=complex)
+        self.pos = np.zeros((0, 3))
+        self.vel = np.zeros((0, 3))
+        self.weights = np.zeros(0)
+
+        # 1/I_nl and the normalization of the spherical harmonics
+        n = np.arange(nmax+1)[:,None]
+        l = np.arange(lmax+1)[None,:]
+        K = 0.5*n*(n+4*l+3) + (l+1)*(2*l+1)
+        lnI = np.vectorize(lambda n, l: math.lgamma(n+4*l+3)
+                           - math.lgamma(n+1) - 2*math.lgamma(2*l+1.5))(n, l)
+        I = -K/2.**(8*l+6)*np.exp(lnI)/(n+2*l+1.5)
+        N = np.zeros((lmax+1, lmax+1))
+        for li in range(lmax+1):
+            for m in range(li+1):
+                N[li,m] = ((2*li+1)/(4*np.pi)*(2-(m == 0))
+                           *math.exp(math.lgamma(li-m+1)-math.lgamma(li+m+1)))
+        self.norm = N[None,:,:]/I[:,:,None]
+
+    def set_members(self, particles):
+        # members in units of the cluster, relative to their centre of
+        # mass, and the scale length from the half-mass radius of a
+        # Hernquist sphere, r_1/2 = (1 + sqrt 2) a
+        mass = particles.mass.sum()
+        com = particles.center_of_mass()
+        vcom = particles.center_of_mass_velocity()
+        r = (particles.position - com).lengths()
+        order = np.argsort(r.number)
+        half = np.searchsorted(np.cumsum(particles.mass[order].number),
+                               0.5*mass.number)
+        a = r[order][half]/(1+np.sqrt(2.))
+        self.set_parameters(mass, a, self.epsilon2)
+        v = (self.G*mass/a)**0.5
+        self.pos = _number((particles.position - com)/a)
+        self.vel = _number((particles.velocity - vcom)/v)
+        self.weights = _number(particles.mass/mass)
+        self.expand()
+
+    def get_members(self, position, velocity):
+        # positions and velocities of the members, for the centre of mass
+        # at position with velocity
+        v = (self.G*self.mass/self.radius)**0.5
+        return position + self.pos*self.radius, velocity + self.vel*v
+
+    def _radial(self, r, derivative=True):
+        # R_nl(r) and dR_nl/dr, (nmax+1, lmax+1, K)
+        xi = (r-1)/(r+1)
+        R = np.empty((self.nmax+1, self.lmax+1) + r.shape)
+        dR = np.empty_like(R) if derivative else None
+        for l in range(self.lmax+1):
+            alpha = 2*l + 1.5
+            C = gegenbauer(self.nmax, alpha, xi)
+            f = -r**l/(1+r)**(2*l+1)
+            R[:,l] = f*C
+            if not derivative:
+                continue
+            dC = np.zeros_like(C)
+            dC[1:] = 2*alpha*gegenbauer(self.nmax-1, alpha+1, xi)
+            df = (2*l+1)*r**l/(1+r)**(2*l+2)
+            if l > 0:
+                df = df - l*r**(l-1)/(1+r)**(2*l+1)
+            dR[:,l] = df*C + f*dC*2/(1+r)**2
+        return R, dR
+
+    def _angular(self, u, q):
+        # P_lm(u)/sin^m theta q^m, its derivative to u, and
+        # m P_lm(u)/sin^m theta q^(m-1), (lmax+1, lmax+1, K)
+        L = self.lmax+1
+        P = np.zeros((L, L) + u.shape)
+        dP = np.zeros_like(P)
+        for m in range(L):
+            P[m,m] = math.prod(range(1, 2*m, 2))
+            if m+1 < L:
+                P[m+1,m] = (2*m+1)*u*P[m,m]
+                dP[m+1,m] = (2*m+1)*P[m,m]
+            for l in range(m+2, L):
+                P[l,m] = ((2*l-1)*u*P[l-1,m] - (l+m-1)*P[l-2,m])/(l-m)
+                dP[l,m] = ((2*l-1)*(P[l-1,m] + u*dP[l-1,m])
+                           - (l+m-1)*dP[l-2,m])/(l-m)
+        qm = np.ones((L,) + q.shape, dtype=complex)
+        for m in range(1, L):
+            qm[m] = qm[m-1]*q
+        m = np.arange(L)[None,:,None]
+        return (P*qm[None], dP*qm[None],
+                m*P*np.concatenate([qm[:1], qm[:-1]])[None])
+
+    def _coordinates(self, pos):
+        r = np.maximum(np.sqrt((pos**2).sum(axis=1)), 1.e-150)
+        return r, pos[:,2]/r, (pos[:,0] + 1j*pos[:,1])/r
+
+    def expand(self):
+        Z = np.zeros_like(self.coefficients)
+        for first in range(0, len(self.pos), block_size):
+            pos = self.pos[first:first+block_size]
+            r, u, q = self._coordinates(pos)
+            R, dR = self._radial(r, derivative=False)
+            A, dA, B = self._angular(u, q)
+            wR = R*self.weights[first:first+block_size]
+            for l in range(self.lmax+1):
+                Z[:,l] += (wR[:,l] @ A[l].real.T) - 1j*(wR[:,l] @ A[l].imag.T)
+        self.coefficients = Z*self.norm
+
+    def _sum_over_n(self, R):
+        # sum_n Z_nlm R_nl, (lmax+1, lmax+1, K)
+        Z = self.coefficients
+        result = np.empty(Z.shape[1:] + R.shape[2:], dtype=complex)
+        for l in range(self.lmax+1):
+            result[l] = Z[:,l].real.T @ R[:,l] + 1j*(Z[:,l].imag.T @ R[:,l])
+        return result
+
+    def field(self, pos):
+        # Phi and grad Phi in units G = M = a = 1, at (K, 3) points
+        phi = np.empty(len(pos))
+        grad = np.empty_like(pos)
+        for first in range(0, len(pos), block_size):
+            last = first + block_size
+            r, u, q = self._coordinates(pos[first:last])
+            R, dR = self._radial(r)
+            A, dA, B = self._angular(u, q)
+            a = self._sum_over_n(R)
+            b = self._sum_over_n(dR)
+            aA = (a*A).real.sum(axis=(0, 1))
+            daA = (a*dA).real.sum(axis=(0, 1))
+            aB = (a*B).sum(axis=(0, 1))
+            m = np.arange(self.lmax+1)[None,:,None]
+            maA = (m*a*A).real.sum(axis=(0, 1))
+            radial = (b*A).real.sum(axis=(0, 1)) - (u*daA + maA)/r
+            phi[first:last] = aA
+            grad[first:last] = radial[:,None]*pos[first:last]/r[:,None]
+            grad[first:last,0] += aB.real/r
+            grad[first:last,1] -= aB.imag/r
+            grad[first:last,2] += daA/r
+        return phi, grad
+
+    def evolve(self, dt):
+        if len(self.pos) == 0:
+            return
+        dt = _number(dt/(self.radius**3/(self.G*self.mass))**0.5)
+        steps = max(1, math.ceil(float(dt)/self.timestep))
+        h = dt/steps
+        grad = self.field(self.pos)[1]
+        for step in range(steps):
+            self.vel -= grad*h/2
+            self.pos += self.vel*h
+            self.pos -= self.weights @ self.pos
+            self.vel -= self.weights @ self.vel
+            self.expand()
+            grad = self.field(self.pos)[1]
+            self.vel -= grad*h/2
+
+    def _points(self, x, y, z):
+        shape = np.shape(_number(x/self.radius))
+        pos = np.column_stack([np.ravel(_number(c/self.radius))
+                               for c in (x, y, z)])
+        return shape, pos
+
+    def get_potential_at_point(self, eps, x, y, z):
+        shape, pos = self._points(x, y, z)
+        phi, grad = self.field(pos)
+        return -self.G*self.mass/self.radius*phi.reshape(shape)
+
+    def get_gravity_at_point(self, eps, x, y, z):
+        shape, pos = self._points(x, y, z)
+        phi, grad = self.field(pos)
+        f = -self.G*self.mass/self.radius**2
+        return tuple(f*grad[:,k].reshape(shape) for k in range(3))
+
+    def as_nbody(self, converter):
+        potential = Potential.as_nbody(self, converter)
+        for name in ("nmax", "lmax", "timestep", "norm", "coefficients",
+                     "pos", "vel", "weights"):
+            setattr(potential, name, getattr(self, name))
+        return potential
@@ -0,0 +1,202 @@
+#### SPHERICAL_POTENTIAL
+####
+#### A spherical potential of any profile, from tables.  A profile is a
+#### subclass of SphericalPotential that gives either its density,
+#### profile_density(s), or its enclosed mass, profile_mass(s), as a
+#### function of s = r/a, with a the scale length (the radius
+#### parameter), in any normalization; the profile is cut off at
+#### s = truncation, and the mass parameter is the mass inside it.  A
+#### measured profile (the enclosed mass around the Galactic Centre,
+#### say) is a subclass whose profile_mass interpolates the data.
+####
+#### On first use the profile is tabulated, once, on table_size points
+#### log-spaced in s between inner and truncation (radial_table): the
+#### enclosed mass fraction m(s), the potential in the form
+#### F(s) = s phi(s), with phi in units of G M/a, so that the potential
+#### is G M F/r and the gravity -G M m/r^2 toward the centre, the
+#### derivatives of m and F to ln s, and the isotropic Jeans velocity
+#### dispersion.  The tables are dimensionless, so every potential of a
+#### profile, whatever its mass and scale, shares them (thousands of
+#### stars, or the arrays of parameters of the potential system, cost
+#### one table); the potential, gravity and jerk at a point are cubic
+#### Hermite interpolations in ln s on the tables, vectorized over the
+#### points and parameters.  Inside the table m follows the power law of
+#### its innermost point and phi is flat, and beyond the truncation the
+#### potential is that of a point mass, which is also the limit a = 0.
+#### The softening enters as in the Plummer potential, r^2 -> r^2 + eps^2.
+####
+#### Not of the point-mass form: the tree and the compiled kernels do
+#### not take a spherical potential.
+####
+
+import numpy as np
+from amuse.lab import *
+from amuse.units.quantities import is_quantity
+
+from potentials.potential import Potential
+
+# tables per (profile, truncation, inner, table_size)
+_tables = {}
+
+def _ratio(r, a):
+    # r/a as plain floats, with or without units, and inf where a = 0
+    # (the point mass)
+    if is_quantity(r):
+        r, a = r.value_in(r.unit), a.value_in(r.unit)
+    r = np.asarray(r, dtype=float)
+    a = np.asarray(a, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(a == 0, np.inf, r/np.where(a == 0, 1., a))
+
+def radial_table(profile):
+    key = (profile, profile.truncation, profile.inner, profile.table_size)
+    if key not in _tables:
+        _tables[key] = _new_radial_table(profile)
+    return _tables[key]
+
+def _cumulative(f, lns):
+    # trapezoidal integral of f dln s from the first point
+    steps = 0.5*(f[1:] + f[:-1])*np.diff(lns)
+    return np.concatenate([[0.], np.cumsum(steps)])
+
+def _new_radial_table(profile, refine=8):
+    # the integrals are taken on a grid refine times finer than the table
+    n = (profile.table_size-1)*refine + 1
+    lns = np.linspace(np.log(profile.inner), np.log(profile.truncation), n)
+    s = np.exp(lns)
+    if profile.profile_density is not None:
+        rho = np.asarray(profile.profile_density(s), dtype=float)
+        dm = 4*np.pi*s**3*rho
+        # the mass inside the table, for rho ~ s^-gamma
+        gamma = min(-np.log(rho[1]/rho[0])/(lns[1]-lns[0]), 2.9)
+        m = dm[0]/(3-gamma) + _cumulative(dm, lns)
+    else:
+        m = np.asarray(profile.profile_mass(s), dtype=float)
+        dm = np.gradient(m, lns, edge_order=2)
+        rho = dm/(4*np.pi*s**3)
+    m, dm, rho = m/m[-1], dm/m[-1], rho/m[-1]
+
+    # phi = 1/s_t + int_s^s_t m/s' dln s', and rho sigma^2 the same
+    # integral of rho m/s'
+    phi = 1/s[-1] + _cumulative(m/s, lns)[-1] - _cumulative(m/s, lns)
+    p = _cumulative(rho*m/s, lns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma2 = np.where(rho > 0, (p[-1] - p)/rho, 0.)
+    F = s*phi
+
+    rows = slice(None, None, refine)
+    return {"lns": lns[rows], "h": lns[refine]-lns[0],
+            "m": m[rows], "dm": dm[rows], "F": F[rows], "dF": (F-m)[rows],
+            "rho": rho[rows], "sigma2": sigma2[rows],
+            "slope": dm[0]/m[0]}
+
+def _hermite(table, y, u):
+    # cubic Hermite interpolation of table[y] and of its derivative to
+    # ln s at u = ln s, with table["d"+y] the derivative at the points
+    lns, h = table["lns"], table["h"]
+    t = np.clip((u - lns[0])/h, 0, len(lns)-1)
+    i = np.minimum(np.nan_to_num(t).astype(int), len(lns)-2)
+    t = t - i
+    y0, y1 = table[y][i], table[y][i+1]
+    d0, d1 = table["d"+y][i]*h, table["d"+y][i+1]*h
+    t2 = t*t
+    t3 = t2*t
+    value = ((2*t3 - 3*t2 + 1)*y0 + (t3 - 2*t2 + t)*d0
+             + (-2*t3 + 3*t2)*y1 + (t3 - t2)*d1)
+    derivative = ((6*t2 - 6*t)*(y0 - y1) + (3*t2 - 4*t + 1)*d0
+                  + (3*t2 - 2*t)*d1)/h
+    return value, derivative
+
+class SphericalPotential(Potential):
+    analytic_gravity = True
+
+    # the profile, as a function of s = r/a (one of the two)
+    profile_density = None
+    profile_mass = None
+
+    truncation = 1.e4
+    inner = 1.e-4
+    table_size = 1024
+
+    def _profile_at(self, r):
+        # m, dm/dln s and F at r (a plain array of r/a)
+        table = radial_table(type(self))
+        lns = table["lns"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = np.log(r)
+        m, dm = _hermite(table, "m", u)
+        F = _hermite(table, "F", u)[0]
+        inside = u < lns[0]
+        if np.any(inside):
+            x = np.exp(u - lns[0])
+            k = table["slope"]
+            m = np.where(inside, table["m"][0]*x**k, m)
+            dm = np.where(inside, k*table["m"][0]*x**k, dm)
+            F = np.where(inside, table["F"][0]*x, F)
+        outside = u > lns[-1]
+        m = np.where(outside, 1., m)
+        dm = np.where(outside, 0., dm)
+        F = np.where(outside, 1., F)
+        return m, dm, F
+
+    def _softened(self, x, y, z):
+        r = (x**2+y**2+z**2 + self.epsilon2)**0.5
+        return r, self._profile_at(_ratio(r, self.radius))
+
+    def get_potential_at_point(self, eps, x, y, z):
+        r, (m, dm, F) = self._softened(x, y, z)
+        return self.G * self.mass*F/r
+
+    def get_gravity_at_point(self, eps, x, y, z):
+        r, (m, dm, F) = self._softened(x, y, z)
+        f = -self.G * self.mass*m/r**3
+        return f*x, f*y, f*z
+
+    def get_jerk_at_point(self, eps, x, y, z, vx, vy, vz):
+        # d/dt of -G M m(s) x/r^3, with dm/dt = dm/dln s (x.v)/r^2
+        r, (m, dm, F) = self._softened(x, y, z)
+        r2 = r**2
+        f = -self.G * self.mass/r2**1.5
+        rv = (3*m - dm)*(x*vx + y*vy + z*vz)/r2
+        return (f*(m*vx-rv*x), f*(m*vy-rv*y), f*(m*vz-rv*z))
+
+    def _interpolate(self, name, r):
+        table = radial_table(type(self))
+        s = _ratio(r, self.radius)
+        return np.interp(np.log(s), table["lns"], table[name])
+
+    def mass_in(self, r):
+        s = _ratio(r, self.radius)
+        return self.mass * self._profile_at(s)[0]
+
+    def density(self, r):
+        return self.mass/self.radius**3 * self._interpolate("rho", r)
+
+    def velocity_dispersion(self, r):
+        # isotropic, from the Jeans equation
+        return (self.G*self.mass/self.radius
+                * self._interpolate("sigma2", r))**0.5
+
+    def circular_velocity(self, r):
+        return (self.G*self.mass_in(r)/r)**0.5
+
+class HernquistPotential(SphericalPotential):
+    @staticmethod
+    def profile_density(s):
+        return 1/(2*np.pi*s*(1+s)**3)
+
+class NFWPotential(SphericalPotential):
+    # a is the scale radius r_s, and the truncation the concentration
+    truncation = 10.
+
+    @staticmethod
+    def profile_density(s):
+        return 1/(4*np.pi*s*(1+s)**2)
+
+class TabulatedPlummerPotential(SphericalPotential):
+    # G M/(r^2 + a^2)^(1/2), to check the tables against the closed
+    # form; PlummerPotential is twice this, 2 G M/(r^2 + a^2)^(1/2), so
+    # that the same mass gives half its forces
+    @staticmethod
+    def profile_mass(s):
+        return s**3/(1+s**2)**1.5
@@ -11,6 +11,34 @@ def new_option_parser():
                       dest="figname", 
                       default = "orbit.pdf",
                       help="figure filename [%default]")
+    result.add_option("--snapshots", 
+                      dest="snapshots", 
+                      default = "snapshots.h5",
+                      help="snapshot file (HDF5) [%default]")
+    result.add_option("--snap_every", type="int",
+                      dest="snap_every", 
+                      default = 1,
+                      help="write a snapshot every so many steps [%default]")
+    result.add_option("--output_queue", type="int",
+                      dest="output_queue", 
+                      default = 8,
+                      help="snapshots and diagnostics waiting for the output thread, 0 to write them inline [%default]")
+    result.add_option("--checkpoint", 
+                      dest="checkpoint", 
+                      default = "checkpoint.pkl",
+                      help="checkpoint file [%default]")
+    result.add_option("--checkpoint_every", type="float", unit=units.yr,
+                      dest="checkpoint_every", 
+                      default = 0|units.yr,
+                      help="model time between checkpoints, 0 for none [%default]")
+    result.add_option("--checkpoint_wall", type="float",
+                      dest="checkpoint_wall", 
+                      default = 0,
+                      help="wall-clock seconds between checkpoints, 0 for none [%default]")
+    result.add_option("--restart", action="store_true",
+                      dest="restart", 
+                      default = False,
+                      help="resume the run from the checkpoint file, not for the Ph4 runs [%default]")
     result.add_option("-t", type="float", unit=units.yr,
                       dest="t_end", 
                       default = 10|units.yr,
@@ -19,6 +47,95 @@ def new_option_parser():
                       dest="dt", 
                       default = 0.25|units.yr,
                       help="time stel [%default]")
+    result.add_option("--bridge", action="store_true",
+                      dest="bridge", 
+                      default = False,
+                      help="couple the potentials pairwise with bridge [%default]")
+    result.add_option("--cluster_model", type="choice",
+                      choices=["potentials", "scf"],
+                      dest="cluster_model", 
+                      default = "potentials",
+                      help="gravity_potential: one potential per particle, or the cluster as one SCF expansion of its members, bridged with the field potentials (--field_mass, --field_names) [%default]")
+    result.add_option("--nmax", type="int",
+                      dest="nmax", 
+                      default = 6,
+                      help="radial order of the SCF expansion [%default]")
+    result.add_option("--lmax", type="int",
+                      dest="lmax", 
+                      default = 4,
+                      help="angular order of the SCF expansion [%default]")
+    result.add_option("--theta", type="float",
+                      dest="theta", 
+                      default = 0,
+                      help="tree opening angle, 0 for direct summation [%default]")
+    result.add_option("--order", type="choice",
+                      choices=["2", "4", "6", "4g"],
+                      dest="order", 
+                      default = "2",
+                      help="order of the integrator, 4g for force gradient [%default]")
+    result.add_option("--eta", type="float",
+                      dest="eta", 
+                      default = 0,
+                      help="block time step parameter, 0 for a shared time step [%default]")
+    result.add_option("--kepler", action="store_true",
+                      dest="kepler", 
+                      default = False,
+                      help="drift orbits around the most massive potential analytically [%default]")
+    result.add_option("--regularize", action="store_true",
+                      dest="regularize", 
+                      default = False,
+                      help="advance close binaries as Kepler orbits [%default]")
+    result.add_option("--workers", type="int",
+                      dest="workers", 
+                      default = 1,
+                      help="number of processes for the force evaluation [%default]")
+    result.add_option("--kernels", type="choice",
+                      choices=["numpy", "numba"],
+                      dest="kernels", 
+                      default = "numpy",
+                      help="direct-summation kernels, numba compiled and multithreaded if installed [%default]")
+    result.add_option("--profile", 
+                      dest="profile", 
+                      default = "",
+                      help="per-step phase timings to this CSV (or .json) file, empty for none [%default]")
+    result.add_option("--diag_every", type="int",
+                      dest="diag_every", 
+                      default = 1,
+                      help="energy and momentum check every so many steps, 0 for start and end only [%default]")
+    result.add_option("--encounters", action="store_true",
+                      dest="encounters", 
+                      default = False,
+                      help="stop at the first collision or tidal disruption [%default]")
+    result.add_option("--tidal_factor", type="float",
+                      dest="tidal_factor", 
+                      default = 1.0,
+                      help="tidal radius r (M/m)^(1/3) in units of this, 0 for collisions only [%default]")
+    result.add_option("--field_mass", type="float", unit=units.MSun,
+                      dest="field_mass", 
+                      default = 0|units.MSun,
+                      help="gravity_hybrid and the SCF cluster: particles at least this massive become potentials, 0 for the most massive only [%default]")
+    result.add_option("--field_names", 
+                      dest="field_names", 
+                      default = "",
+                      help="gravity_hybrid and the SCF cluster: comma-separated names of particles that become potentials [%default]")
+    result.add_option("--field_potential", type="choice",
+                      choices=["point", "plummer", "hernquist"],
+                      dest="field_potential", 
+                      default = "point",
+                      help="gravity_hybrid: potential of the field bodies [%default]")
+    result.add_option("--cluster_mass", type="float", unit=units.MSun,
+                      dest="cluster_mass", 
+                      default = 0|units.MSun,
+                      help="gravity_hybrid: mass of a nuclear cluster around the field, 0 for none [%default]")
+    result.add_option("--cluster_radius", type="float", unit=units.pc,
+                      dest="cluster_radius", 
+                      default = 1|units.pc,
+                      help="gravity_hybrid: scale radius of the nuclear cluster [%default]")
+    result.add_option("--cluster_potential", type="choice",
+                      choices=["point", "plummer", "hernquist"],
+                      dest="cluster_potential", 
+                      default = "plummer",
+                      help="gravity_hybrid: potential of the nuclear cluster [%default]")
     return result
 
 if __name__ == "__main__":